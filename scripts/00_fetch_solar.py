@@ -1,5 +1,5 @@
-import requests
 import json
+import http_client
 
 # Overpass API endpoint
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
@@ -18,7 +18,7 @@ out center 50;
 
 def fetch_solar_data():
     print("Requesting data from Overpass API...")
-    response = requests.post(OVERPASS_URL, data={'data': query})
+    response = http_client.post('overpass', OVERPASS_URL, data={'data': query})
     response.raise_for_status()
     data = response.json()
     print(f"Fetched {len(data['elements'])} elements.")
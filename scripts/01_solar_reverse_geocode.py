@@ -1,7 +1,7 @@
 import json
-import requests
 import time
 import csv
+import http_client
 
 # Load your OSM data
 with open('north_holland_solar_50.json', encoding='utf-8') as f:
@@ -18,7 +18,7 @@ for el in data['elements']:
     url = f'https://nominatim.openstreetmap.org/reverse?format=jsonv2&lat={lat}&lon={lon}&addressdetails=1'
     headers = {'User-Agent': 'solar-panel-research/1.0 (your_email@example.com)'}
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = http_client.get('nominatim', url, headers=headers)
         if resp.status_code != 200:
             print(f"Failed for {osm_id}: {resp.status_code}")
             continue
@@ -1,14 +1,16 @@
 import requests
-import json
 import os
+import http_client
+import config
 import datetime
+import snapshot
 
 # Output directory and filename
-output_dir = r'C:\TJ\SolarPan2\Output'
+output_dir = config.OUTPUT_DIR
 os.makedirs(output_dir, exist_ok=True)
-filename = os.path.join(output_dir, 'north_holland_solar_1000.json')
+filename = os.path.join(output_dir, 'north_holland_solar_1000.osnap')
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_URL = config.OVERPASS_API_CONFIG['url']
 
 query = """
 [out:json][timeout:300];
@@ -24,7 +26,7 @@ out center 1000;
 def fetch_solar_data():
     print(f"\n[{datetime.datetime.now()}] Starting Overpass API request for 1,000 solar panel locations...")
     try:
-        response = requests.post(OVERPASS_URL, data={'data': query}, timeout=300)
+        response = http_client.post('overpass', OVERPASS_URL, data={'data': query})
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"[{datetime.datetime.now()}] ERROR: Failed to contact Overpass API: {e}")
@@ -54,11 +56,10 @@ def fetch_solar_data():
     if element_count < 1000:
         print(f"[{datetime.datetime.now()}] WARNING: Only {element_count} elements found (less than 1,000). This may be all available data.")
 
-    # Save file
+    # Save compressed snapshot (convert older JSON dumps with: python snapshot.py convert <file.json>)
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"[{datetime.datetime.now()}] Data saved to: {filename}")
+        snapshot.save_snapshot(data, filename, query=query)
+        print(f"[{datetime.datetime.now()}] Snapshot saved to: {filename} ({os.path.getsize(filename):,} bytes)")
     except Exception as e:
         print(f"[{datetime.datetime.now()}] ERROR: Could not save file: {e}")
 
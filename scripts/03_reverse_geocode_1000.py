@@ -1,39 +1,44 @@
-import json
-import requests
 import time
 import csv
 import os
+import http_client
+import config
+import snapshot
+from deadletter import DeadLetters
 
-output_dir = r'C:\TJ\SolarPan2\Output'
-input_file = os.path.join(output_dir, 'north_holland_solar_1000.json')
+output_dir = config.OUTPUT_DIR
+# The .osnap written by 02, or the older JSON dump when there is no snapshot yet
+input_file = snapshot.input_path(os.path.join(output_dir, 'north_holland_solar_1000.osnap'))
 output_file = os.path.join(output_dir, 'north_holland_solar_1000_filled.csv')
 
 headers = {'User-Agent': 'solar-panel-research/1.0 (your_email@example.com)'}
 
 max_retries = 5
 
-with open(input_file, encoding='utf-8') as f:
-    data = json.load(f)
-
-elements = data.get('elements', [])
-print(f"Total elements to process: {len(elements)}")
+# Snapshot (.osnap) or raw Overpass JSON both work here
+total = snapshot.read_header(input_file)['count']
+print(f"Total elements to process: {total}")
 
 results = []
-for idx, el in enumerate(elements, 1):
+# Failed lookups go to the dead-letter table instead of vanishing (see deadletter.py)
+dead_letters = DeadLetters()
+failures = 0
+for idx, el in enumerate(snapshot.iter_elements(input_file), 1):
     # Use lat/lon if present, otherwise try center
     lat = el.get('lat') or (el.get('center') or {}).get('lat')
     lon = el.get('lon') or (el.get('center') or {}).get('lon')
     osm_id = el.get('id')
     if not lat or not lon:
-        print(f"[{idx}/{len(elements)}] Skipped: Missing coordinates (OSM id {osm_id})")
+        print(f"[{idx}/{total}] Skipped: Missing coordinates (OSM id {osm_id})")
         continue
 
-    print(f"[{idx}/{len(elements)}] Querying: {lat}, {lon} (OSM id {osm_id})")
-    url = f'https://nominatim.openstreetmap.org/reverse?format=jsonv2&lat={lat}&lon={lon}&addressdetails=1'
+    print(f"[{idx}/{total}] Querying: {lat}, {lon} (OSM id {osm_id})")
+    url = f"{config.NOMINATIM_API_CONFIG['base_url']}/reverse?format=jsonv2&lat={lat}&lon={lon}&addressdetails=1"
+    failure = None
     tries = 0
     while tries < max_retries:
         try:
-            resp = requests.get(url, headers=headers, timeout=20)
+            resp = http_client.get('nominatim', url, headers=headers)
             if resp.status_code == 200:
                 addr = resp.json().get('address', {})
                 row = {
@@ -58,13 +63,24 @@ for idx, el in enumerate(elements, 1):
                 tries += 1
             else:
                 print(f"[{idx}] Failed: HTTP {resp.status_code} for {osm_id}")
+                failure = f"HTTP {resp.status_code}"
                 break
         except Exception as e:
             print(f"[{idx}] Error for {osm_id}: {e}")
+            failure = f"{type(e).__name__}: {e}"
             break
     else:
         print(f"[{idx}] Skipped after {max_retries} retries for {osm_id}")
-    time.sleep(1)  # Respect Nominatim usage policy
+        failure = f"blocked after {max_retries} retries"
+    if failure:
+        dead_letters.add(el.get('type'), osm_id, lat, lon, 'nominatim', failure)
+        failures += 1
+    time.sleep(config.NOMINATIM_API_CONFIG['sleep_interval'])  # Respect Nominatim usage policy
+
+dead_letters.conn.commit()
+dead_letters.close()
+if failures:
+    print(f"{failures} failed lookups recorded for `python deadletter.py retry`")
 
 # Save results
 if results:
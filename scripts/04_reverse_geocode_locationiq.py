@@ -1,34 +1,36 @@
-import json
-import requests
 import time
 import csv
 import os
+import config
+import http_client
+import snapshot
+from deadletter import DeadLetters
 
 # Configuration
-API_KEY = 'pk.ea26c8680b03eb94cb304ade3d7e494c'
-INPUT_FILE = r'C:\TJ\SolarPan2\Output\north_holland_solar_1000.json'
-OUTPUT_FILE = r'C:\TJ\SolarPan2\Output\north_holland_solar_1000_locationiq.csv'
+API_KEY = config.LOCATIONIQ_API_CONFIG['api_key']  # override with LOCATIONIQ_API_KEY
+INPUT_FILE = snapshot.input_path(os.path.join(config.OUTPUT_DIR, 'north_holland_solar_1000.osnap'))
+OUTPUT_FILE = os.path.join(config.OUTPUT_DIR, 'north_holland_solar_1000_locationiq.csv')
 MAX_RETRIES = 5
-BASE_URL = 'https://eu1.locationiq.com/v1/reverse'  # Europe endpoint for faster response from NL
+BASE_URL = f"{config.LOCATIONIQ_API_CONFIG['base_url']}/reverse"
 
-# Load OSM data
-with open(INPUT_FILE, encoding='utf-8') as f:
-    data = json.load(f)
-
-elements = data.get('elements', [])
-print(f"Total elements to process: {len(elements)}")
+# Load OSM data (snapshot or raw Overpass JSON)
+total = snapshot.read_header(INPUT_FILE)['count']
+print(f"Total elements to process: {total}")
 
 results = []
-for idx, el in enumerate(elements, 1):
+# Failed lookups go to the dead-letter table instead of vanishing (see deadletter.py)
+dead_letters = DeadLetters()
+failures = 0
+for idx, el in enumerate(snapshot.iter_elements(INPUT_FILE), 1):
     # Extract coordinates (lat/lon for node, center for way/relation)
     lat = el.get('lat') or (el.get('center') or {}).get('lat')
     lon = el.get('lon') or (el.get('center') or {}).get('lon')
     osm_id = el.get('id')
     if not lat or not lon:
-        print(f"[{idx}/{len(elements)}] Skipped: Missing coordinates (OSM id {osm_id})")
+        print(f"[{idx}/{total}] Skipped: Missing coordinates (OSM id {osm_id})")
         continue
 
-    print(f"[{idx}/{len(elements)}] Querying: {lat}, {lon} (OSM id {osm_id})")
+    print(f"[{idx}/{total}] Querying: {lat}, {lon} (OSM id {osm_id})")
     params = {
         'key': API_KEY,
         'lat': lat,
@@ -37,10 +39,11 @@ for idx, el in enumerate(elements, 1):
         'addressdetails': 1
     }
 
+    failure = None
     tries = 0
     while tries < MAX_RETRIES:
         try:
-            resp = requests.get(BASE_URL, params=params, timeout=20)
+            resp = http_client.get('locationiq', BASE_URL, params=params)
             if resp.status_code == 200:
                 addr = resp.json().get('address', {})
                 row = {
@@ -65,13 +68,24 @@ for idx, el in enumerate(elements, 1):
                 tries += 1
             else:
                 print(f"[{idx}] Failed: HTTP {resp.status_code} for {osm_id}")
+                failure = f"HTTP {resp.status_code}"
                 break
         except Exception as e:
             print(f"[{idx}] Error for {osm_id}: {e}")
+            failure = f"{type(e).__name__}: {e}"
             break
     else:
         print(f"[{idx}] Skipped after {MAX_RETRIES} retries for {osm_id}")
-    time.sleep(1)  # LocationIQ free tier: max 2 requests/second
+        failure = f"blocked after {MAX_RETRIES} retries"
+    if failure:
+        dead_letters.add(el.get('type'), osm_id, lat, lon, 'locationiq', failure)
+        failures += 1
+    time.sleep(config.LOCATIONIQ_API_CONFIG['sleep_interval'])  # LocationIQ free tier: max 2 requests/second
+
+dead_letters.conn.commit()
+dead_letters.close()
+if failures:
+    print(f"{failures} failed lookups recorded for `python deadletter.py retry`")
 
 # Save results
 if results:
@@ -1,4 +1,4 @@
-import requests
+import http_client
 
 query = "Damrak 1, Amsterdam"
 url = "https://api.pdok.nl/bzk/locatieserver/search/v3_1/free"
@@ -7,7 +7,7 @@ params = {
     "rows": 1
 }
 
-response = requests.get(url, params=params)
+response = http_client.get('pdok', url, params=params)
 data = response.json()
 
 if data['response']['numFound'] > 0:
@@ -1,4 +1,4 @@
-import requests
+import http_client
 
 latitude = 52.372759
 longitude = 4.893604
@@ -8,7 +8,7 @@ params = {
     "lon": longitude
 }
 
-response = requests.get(url, params=params)
+response = http_client.get('pdok', url, params=params)
 data = response.json()
 
 if data['response']['numFound'] > 0:
@@ -1,23 +1,32 @@
-import requests
+import http_client
+import rdnew
 
-# Define the WFS endpoint and parameters
+# Define the WFS endpoint and parameters. BAG is stored in RD New, so ask for that
+# (no reprojection on the server) and convert locally with rdnew.py.
 wfs_url = "https://geodata.nationaalgeoregister.nl/bag/wfs"
+lat, lon = 52.3725, 4.8935  # point of interest
+x, y = rdnew.to_rd(lat, lon)
 params = {
     "service": "WFS",
     "version": "2.0.0",
     "request": "GetFeature",
     "typeNames": "bag:pand",
     "outputFormat": "application/json",
-    "srsName": "EPSG:4326",
-    "bbox": "4.893,52.372,4.894,52.373"  # Define a small bounding box around your point
+    "srsName": "EPSG:28992",
+    "bbox": f"{x - 35:.0f},{y - 55:.0f},{x + 35:.0f},{y + 55:.0f},EPSG:28992"  # small box around the point
 }
 
-response = requests.get(wfs_url, params=params)
+response = http_client.get('pdok', wfs_url, params=params)
 data = response.json()
 
 for feature in data['features']:
     properties = feature['properties']
+    ring = feature['geometry']['coordinates'][0]
+    centre_x = sum(point[0] for point in ring) / len(ring)
+    centre_y = sum(point[1] for point in ring) / len(ring)
+    centre_lat, centre_lon = rdnew.to_wgs84(centre_x, centre_y)
     print(f"Building ID: {properties.get('identificatie')}")
     print(f"Usage Purpose: {properties.get('gebruiksdoel')}")
     print(f"Construction Year: {properties.get('bouwjaar')}")
+    print(f"Location: {centre_lat:.6f}, {centre_lon:.6f} ({rdnew.distance(x, y, centre_x, centre_y):.0f} m away)")
     print("---")
@@ -0,0 +1,130 @@
+import threading
+import time
+
+# Adaptive concurrency for requests to one backend (additive increase, multiplicative decrease).
+#
+# Workers take a slot around each unit of work; at most `limit` slots are handed out at
+# a time. The controller learns from http_client events for its provider: every
+# `window` requests (or `window_seconds`) it looks at the error rate (timeouts,
+# connection errors, 429 and 5xx) and the p95 latency of the successful requests.
+#
+#   errors above max_error_rate, or p95 above the latency target  ->  limit *= decrease
+#   otherwise, if the workers kept every slot busy                  ->  limit += increase
+#
+# Without an explicit latency target, the target is `tolerance` times the best p95 seen
+# so far. That baseline drifts up slowly, so the controller follows a server whose
+# normal speed changes during the day instead of throttling against a stale best case.
+#
+#   controller = AimdController('nominatim', maximum=32)
+#   http_client.add_hook(controller.http_hook)
+#   with controller.slot():
+#       geocode.reverse_nominatim(lat, lon)
+
+
+class AimdController:
+    """Limits in-flight work for one backend and tunes the limit from latency and error rates."""
+
+    def __init__(self, provider, initial=4, minimum=1, maximum=64, latency_target=None, tolerance=2.0,
+                 max_error_rate=0.05, increase=1, decrease=0.5, window=20, window_seconds=5.0):
+        self.provider = provider
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.max_error_rate = max_error_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.window_seconds = window_seconds
+        self.baseline = None  # best p95 seen (seconds), drifting up slowly
+        self.in_flight = 0
+        self.adjustments = []  # (time, old limit, new limit, reason), newest last
+        self._condition = threading.Condition()
+        self._latencies = []
+        self._errors = 0
+        self._peak = 0
+        self._window_started = time.monotonic()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            self._peak = max(self._peak, self.in_flight)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def slot(self):
+        """Context manager holding one slot for the duration of a unit of work."""
+        return _Slot(self)
+
+    def observe(self, elapsed, ok):
+        """Records one finished request and adjusts the limit at the end of each window."""
+        with self._condition:
+            if ok:
+                self._latencies.append(elapsed)
+            else:
+                self._errors += 1
+            samples = len(self._latencies) + self._errors
+            if samples >= self.window or (samples >= 5 and
+                                          time.monotonic() - self._window_started >= self.window_seconds):
+                self._adjust(samples)
+
+    def http_hook(self, event):
+        """Hook for http_client.add_hook: feeds requests to this controller's provider into observe()."""
+        if event['provider'] != self.provider:
+            return
+        status = event['status']
+        self.observe(event['elapsed'], status is not None and status != 429 and status < 500)
+
+    def _adjust(self, samples):
+        error_rate = self._errors / samples
+        p95 = None
+        if self._latencies:
+            ordered = sorted(self._latencies)
+            p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+            self.baseline = p95 if self.baseline is None else min(p95, self.baseline * 1.05)
+        target = self.latency_target or (self.baseline * self.tolerance if self.baseline else None)
+
+        old = self.limit
+        if error_rate > self.max_error_rate:
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+            reason = f"error rate {error_rate:.0%}"
+        elif p95 is not None and target is not None and p95 > target:
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+            reason = f"p95 {p95 * 1000:.0f}ms > {target * 1000:.0f}ms"
+        elif self._peak >= self.limit:
+            self.limit = min(self.maximum, self.limit + self.increase)
+            reason = "all slots busy"
+        else:
+            reason = None
+        if self.limit != old:
+            self.adjustments.append((time.time(), old, self.limit, reason))
+            del self.adjustments[:-100]
+            self._condition.notify_all()
+
+        self._latencies = []
+        self._errors = 0
+        self._peak = self.in_flight
+        self._window_started = time.monotonic()
+
+    def collect(self, registry):
+        """Collector for metrics.Metrics.add_collector: current limit and in-flight count."""
+        registry.set('concurrency_limit', self.limit, provider=self.provider)
+        registry.set('concurrency_in_flight', self.in_flight, provider=self.provider)
+
+
+class _Slot:
+    def __init__(self, controller):
+        self.controller = controller
+
+    def __enter__(self):
+        self.controller.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.release()
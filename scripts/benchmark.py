@@ -0,0 +1,309 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import subprocess
+import tempfile
+import time
+import config
+import mock_servers
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Runs each fetch and geocode strategy end-to-end against the local mock servers and
+# reports rows/sec, request latency percentiles and peak RSS. Every run is appended to
+# RESULTS_PATH and compared with the previous run of a different version, so
+# regressions show up between commits.
+#
+#   python benchmark.py --latency 0.02 --jitter 0.01
+#   python benchmark.py --strategies pipeline-nominatim --rate-limit 200 --failure-rate 0.01
+
+RESULTS_PATH = os.path.join(config.OUTPUT_DIR, 'benchmarks', 'benchmark_results.jsonl')
+REGRESSION_THRESHOLD = 0.10  # flag throughput drops of more than 10%
+STRATEGY_TIMEOUT = 1800  # seconds before a strategy that has not reported is stopped
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if peak > 1 << 32 else 1024), 1)
+
+
+def current_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=config.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# Strategies. Each one returns the number of rows it produced.
+
+def _fixture_elements(limit):
+    import overpass
+    return list(overpass.stream_elements(overpass.solar_query(limit)))
+
+
+def fetch_buffered(options):
+    """02_fetch_solar_1000.py: one request, wait for the whole body, then json.loads."""
+    import http_client
+    import overpass
+    response = http_client.post('overpass', config.OVERPASS_API_CONFIG['url'],
+                                data={'data': overpass.solar_query(options['limit'])})
+    response.raise_for_status()
+    return len(response.json().get('elements', []))
+
+
+def fetch_streaming(options):
+    """overpass.stream_elements: elements are decoded while the body is still arriving."""
+    return len(_fixture_elements(options['limit']))
+
+
+def _geocode_sequential(provider, options):
+    import geocode
+    from store import element_coords
+    reverse = geocode.PROVIDERS[provider]
+    rows = 0
+    for element in _fixture_elements(options['limit']):
+        lat, lon = element_coords(element)
+        if reverse(lat, lon) is not None:
+            rows += 1
+    return rows
+
+
+def geocode_sequential_nominatim(options):
+    """03_reverse_geocode_1000.py: one reverse lookup after the other."""
+    return _geocode_sequential('nominatim', options)
+
+
+def geocode_sequential_locationiq(options):
+    """04_reverse_geocode_locationiq.py: one reverse lookup after the other."""
+    return _geocode_sequential('locationiq', options)
+
+
+def _pipeline(provider, options, lookup=False):
+    import pipeline
+    with tempfile.TemporaryDirectory() as tmp:
+        run = pipeline.Pipeline(provider=provider, workers=options['workers'], limit=options['limit'],
+                                output_path=os.path.join(tmp, 'out.csv'),
+                                store_path=os.path.join(tmp, 'store.sqlite'), refresh=True, lookup=lookup)
+        counts = run.run()
+    return counts['exported']
+
+
+def pipeline_nominatim(options):
+    """pipeline.py with concurrent stages and pooled connections."""
+    return _pipeline('nominatim', options)
+
+
+def pipeline_locationiq(options):
+    return _pipeline('locationiq', options)
+
+
+def pipeline_lookup(options):
+    """pipeline.py --lookup: Nominatim /lookup by OSM id in batches of 50, /reverse for the rest."""
+    return _pipeline('nominatim', options, lookup=True)
+
+
+STRATEGIES = {
+    'fetch-buffered': fetch_buffered,
+    'fetch-streaming': fetch_streaming,
+    'geocode-sequential-nominatim': geocode_sequential_nominatim,
+    'geocode-sequential-locationiq': geocode_sequential_locationiq,
+    'pipeline-nominatim': pipeline_nominatim,
+    'pipeline-locationiq': pipeline_locationiq,
+    'pipeline-lookup': pipeline_lookup,
+}
+
+
+def _run_in_child(name, urls, options, results):
+    """Child process entry point: point config at the mocks, run one strategy, report."""
+    import contextlib
+    import io
+    import geocode
+    import http_client
+
+    mock_servers.point_config_at(urls)
+    geocode.BLOCKED_WAIT = options['blocked_wait']
+
+    latencies = {}
+    statuses = {}
+
+    def record(event):
+        latencies.setdefault(event['provider'], []).append(event['elapsed'])
+        key = str(event['status'] or 'error')
+        statuses[key] = statuses.get(key, 0) + 1
+
+    http_client.add_hook(record)
+    started = time.perf_counter()
+    error = None
+    rows = 0
+    try:
+        # Keep the strategies' progress output out of the benchmark report
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = STRATEGIES[name](options)
+    except Exception as e:
+        error = repr(e)
+    elapsed = time.perf_counter() - started
+
+    results.put({
+        'strategy': name,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'requests': sum(len(values) for values in latencies.values()),
+        'statuses': statuses,
+        'latency_ms': {provider: {'p50': round(percentile(values, 0.50) * 1000, 2),
+                                  'p99': round(percentile(values, 0.99) * 1000, 2),
+                                  'count': len(values)}
+                       for provider, values in latencies.items()},
+        'peak_rss_mb': peak_rss_mb(),
+        'error': error,
+    })
+
+
+def _failed(name, seconds, error):
+    return {'strategy': name, 'rows': 0, 'seconds': round(seconds, 3), 'rows_per_sec': None, 'requests': 0,
+            'statuses': {}, 'latency_ms': {}, 'peak_rss_mb': None, 'error': error}
+
+
+def run_strategy(name, servers, options, timeout=STRATEGY_TIMEOUT):
+    """Runs one strategy in a fresh process so peak RSS belongs to that strategy alone.
+
+    A process that dies without reporting, or reports nothing within `timeout`
+    seconds, is reported as a failed strategy.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    urls = {service: server.url for service, server in servers.items()}
+    process = context.Process(target=_run_in_child, args=(name, urls, options, results))
+    started = time.monotonic()
+    process.start()
+    result = None
+    while result is None:
+        alive = process.is_alive()
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            elapsed = time.monotonic() - started
+            if not alive:
+                result = _failed(name, elapsed, f"process exited with code {process.exitcode} without a result")
+            elif elapsed > timeout:
+                process.terminate()
+                result = _failed(name, elapsed, f"no result after {timeout:.0f}s")
+    process.join()
+    return result
+
+
+def previous_run(settings, version, path=RESULTS_PATH):
+    """Returns the newest stored run with the same settings but a different version."""
+    if not os.path.exists(path):
+        return None
+    match = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            run = json.loads(line)
+            if run['settings'] == settings and run['version'] != version:
+                match = run
+    return match
+
+
+def report(run, baseline):
+    print(f"\nBenchmark {run['version']} ({run['timestamp']})")
+    print(f"{'strategy':<32}{'rows':>7}{'rows/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>8}  vs {baseline['version'] if baseline else '-'}")
+    old = {result['strategy']: result for result in baseline['results']} if baseline else {}
+    for result in run['results']:
+        # Show the latency of the provider that served most requests (the geocoder, if any)
+        latency = max(result['latency_ms'].values(), key=lambda value: value['count'], default={})
+        p50 = latency.get('p50', 0)
+        p99 = latency.get('p99', 0)
+        change = ''
+        previous = old.get(result['strategy'])
+        if previous and previous.get('rows_per_sec') and result.get('rows_per_sec'):
+            delta = result['rows_per_sec'] / previous['rows_per_sec'] - 1
+            change = f"{delta:+.1%}" + ('  REGRESSION' if delta < -REGRESSION_THRESHOLD else '')
+        if result['error']:
+            change = f"ERROR {result['error']}"
+        print(f"{result['strategy']:<32}{result['rows']:>7}{result['rows_per_sec'] or 0:>10.1f}"
+              f"{p50:>9.1f}{p99:>9.1f}{result['peak_rss_mb'] or 0:>8.1f}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch and geocode strategies against local mock servers.")
+    parser.add_argument('--strategies', nargs='+', choices=sorted(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument('--limit', type=int, default=1000, help="elements per run")
+    parser.add_argument('--scale', type=int, default=1, help="repeat the 1000-element fixture N times")
+    parser.add_argument('--workers', type=int, default=8, help="pipeline geocoding workers")
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds added to each geocoder response")
+    parser.add_argument('--jitter', type=float, default=0.005)
+    parser.add_argument('--rate-limit', type=float, help="requests/second before a geocoder answers 429")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="fraction of geocoder requests failing with 503")
+    parser.add_argument('--overpass-latency', type=float, default=0.5)
+    parser.add_argument('--overpass-stream-rate', type=float, default=5000, help="elements/second Overpass streams")
+    parser.add_argument('--blocked-wait', type=float, default=0.5, help="backoff after a 429 (60s in production)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=STRATEGY_TIMEOUT,
+                        help="seconds before a strategy that has not finished is stopped and reported as failed")
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    geocoder = dict(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                    failure_rate=args.failure_rate, seed=args.seed)
+    settings = {
+        'overpass': mock_servers.MockSettings(latency=args.overpass_latency, stream_rate=args.overpass_stream_rate,
+                                              seed=args.seed),
+        'nominatim': mock_servers.MockSettings(**geocoder),
+        'locationiq': mock_servers.MockSettings(**geocoder),
+        'pdok': mock_servers.MockSettings(**geocoder),
+    }
+    options = {'limit': args.limit * args.scale, 'workers': args.workers, 'blocked_wait': args.blocked_wait}
+    recorded_settings = dict(vars(args))
+    for key in ('strategies', 'results', 'no_save', 'timeout'):
+        recorded_settings.pop(key)
+
+    servers = mock_servers.start_mock_servers(settings, scale=args.scale)
+    try:
+        results = []
+        for name in args.strategies:
+            print(f"[{datetime.datetime.now()}] Running {name}...")
+            results.append(run_strategy(name, servers, options, args.timeout))
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    version = current_version()
+    run = {
+        'version': version,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'settings': recorded_settings,
+        'results': results,
+    }
+    baseline = previous_run(recorded_settings, version, args.results)
+    report(run, baseline)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"\nResults appended to: {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+
+# Shared settings for the scripts in this folder.
+#
+# Paths are relative to the repository so the scripts work on any machine.
+# Set SOLAR_OUTPUT_DIR to write somewhere else (e.g. C:\TJ\SolarPan2\Output).
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+OUTPUT_DIR = os.environ.get('SOLAR_OUTPUT_DIR', os.path.join(BASE_DIR, 'Output'))
+
+SNAPSHOT_PATH = os.path.join(OUTPUT_DIR, 'north_holland_solar_1000.osnap')
+STORE_DB_PATH = os.environ.get('SOLAR_STORE_DB', os.path.join(OUTPUT_DIR, 'solar_store.sqlite'))
+PIPELINE_CSV_PATH = os.path.join(OUTPUT_DIR, 'north_holland_solar_pipeline.csv')
+
+# Set SOLAR_SERVER_IP to the machine running the self-hosted Overpass and Nominatim
+# containers (see the Manus self-hosting guide) to use them instead of the public APIs.
+SERVER_IP = os.environ.get('SOLAR_SERVER_IP')
+
+if SERVER_IP:
+    OVERPASS_API_CONFIG = {
+        "url": f"http://{SERVER_IP}:12345/api/interpreter",
+        "timeout": 600  # Default timeout for Overpass queries in seconds
+    }
+    NOMINATIM_API_CONFIG = {
+        "base_url": f"http://{SERVER_IP}:8088",
+        "user_agent": "solar-panel-research/1.0 (your_email@example.com)",
+        "timeout": 30,
+        "sleep_interval": 0.01  # Minimal sleep between requests to local Nominatim
+    }
+else:
+    OVERPASS_API_CONFIG = {
+        "url": "https://overpass-api.de/api/interpreter",
+        "timeout": 300
+    }
+    NOMINATIM_API_CONFIG = {
+        "base_url": "https://nominatim.openstreetmap.org",
+        "user_agent": "solar-panel-research/1.0 (your_email@example.com)",
+        "timeout": 20,
+        "sleep_interval": 1.0  # Nominatim usage policy: max 1 request per second
+    }
+
+LOCATIONIQ_API_CONFIG = {
+    "base_url": "https://eu1.locationiq.com/v1",  # Europe endpoint for faster response from NL
+    "api_key": os.environ.get('LOCATIONIQ_API_KEY', 'pk.ea26c8680b03eb94cb304ade3d7e494c'),
+    "timeout": 20,
+    "sleep_interval": 0.5  # LocationIQ free tier: max 2 requests/second
+}
+
+PDOK_API_CONFIG = {
+    "base_url": "https://api.pdok.nl/bzk/locatieserver/search/v3_1",  # PDOK Locatieserver (free, reverse)
+    "wfs_url": "https://geodata.nationaalgeoregister.nl/bag/wfs",
+    "timeout": 20
+}
+
+# Overpass endpoints for tiled fetches (overpass_pool.py): url, relative weight and how
+# many tile queries may run there at once. The self-hosted instance, when configured,
+# takes most of the work; public mirrors help out. Override with SOLAR_OVERPASS_ENDPOINTS,
+# e.g. "http://10.0.0.5:12345/api/interpreter|10|4,https://overpass-api.de/api/interpreter|1|2".
+if os.environ.get('SOLAR_OVERPASS_ENDPOINTS'):
+    OVERPASS_ENDPOINTS = []
+    for _entry in os.environ['SOLAR_OVERPASS_ENDPOINTS'].split(','):
+        _url, _weight, _slots = (_entry.split('|') + ['1', '2'])[:3]
+        OVERPASS_ENDPOINTS.append({"url": _url, "weight": float(_weight), "max_parallel": int(_slots)})
+else:
+    OVERPASS_ENDPOINTS = [
+        {"url": "https://overpass-api.de/api/interpreter", "weight": 2, "max_parallel": 2},
+        {"url": "https://overpass.kumi.systems/api/interpreter", "weight": 1, "max_parallel": 2},
+    ]
+    if SERVER_IP:
+        OVERPASS_ENDPOINTS.insert(0, {"url": OVERPASS_API_CONFIG['url'], "weight": 10, "max_parallel": 4})
+
+OVERPASS_POOL_CONFIG = {
+    "hedge_after": 120,  # seconds before a slow tile is also sent to a second endpoint...
+    "hedge_factor": 3,  # ...or this many times the median tile time, once tiles have finished
+    "max_base_skew": 900,  # max seconds between the osm_base of merged tiles
+    "max_attempts": 3,  # per tile
+    "max_rate_limited": 10,  # 429 answers per tile that don't use up an attempt
+}
+
+# Bounding box of Noord-Holland (south, west, north, east), used to tile fetches
+NORTH_HOLLAND_BBOX = (52.16, 4.49, 53.19, 5.35)
+
+# PostgreSQL database behind the self-hosted Nominatim, for bulk reverse geocoding with
+# nominatim_db.py. The mediagis/nominatim container does not publish PostgreSQL by
+# default: add "5432:5432" to its ports (see the Manus example docker-compose file).
+NOMINATIM_DB_CONFIG = {
+    "dsn": os.environ.get('SOLAR_NOMINATIM_DSN',
+                          f"host={SERVER_IP or 'localhost'} port=5432 dbname=nominatim user=nominatim"),
+    "batch_size": 10000,  # points resolved per query
+    "radius": 0.001  # search radius in degrees (~70-110 m in the Netherlands)
+}
+
+# Connections kept open per host by http_client.py (should be >= the number of worker threads)
+HTTP_POOL_SIZE = 16
+
+# Overpass area id for Noord-Holland (relation 47654 + 3600000000)
+NORTH_HOLLAND_AREA_ID = 47654 + 3600000000
@@ -0,0 +1,183 @@
+import argparse
+import datetime
+import json
+import overpass
+import overpass_query
+import snapshot
+import spatial
+from store import element_coords
+
+# Merges solar nodes into the building footprints they sit on.
+#
+# The solar fetch returns rooftop generator nodes and building ways as separate
+# elements, so a roof with twelve mapped panels became twelve geocoded rows. Here every
+# solar node that lies inside a building footprint is folded into that building, and
+# the building comes out once with its panel count and the ids of the merged nodes:
+#
+#   {'type': 'way', 'id': ..., 'tags': ..., 'center': ..., 'geometry': [...],
+#    'solar': {'panel_count': 12, 'node_ids': [...]}}
+#
+# Footprints of the buildings in the input are fetched lazily (overpass.attach_geometry),
+# and nodes that do not fall in any of them get their host building from one
+# way[building](around.nodes:1) query per HOST_BATCH nodes. Containment is a grid index
+# lookup followed by a point-in-polygon test (spatial.py); when footprints nest, the
+# smallest one wins. Nodes outside every building, and solar ways that are not
+# buildings (fields, carports), pass through as their own record with a panel count of 1.
+#
+#   python consolidate.py elements.osnap consolidated.json
+#   python pipeline.py --consolidate
+
+HOST_BATCH = 1000  # node ids per host building query
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def is_building(element):
+    return element.get('type') == 'way' and 'building' in element.get('tags', {})
+
+
+def is_panel(element):
+    """Solar generator nodes that can be merged into a building."""
+    tags = element.get('tags', {})
+    return element.get('type') == 'node' and tags.get('generator:source') == 'solar'
+
+
+def ring(element):
+    """The footprint of a way as a list of (lat, lon), or None without geometry."""
+    geometry = element.get('geometry')
+    if not geometry or len(geometry) < 3:
+        return None
+    return [(point['lat'], point['lon']) for point in geometry if point]
+
+
+def fetch_host_buildings(node_ids, url=None, batch_size=HOST_BATCH):
+    """Fetches the buildings around the given nodes, with footprint and a bbox centre."""
+    node_ids = sorted(set(node_ids))
+    buildings = {}
+    for start in range(0, len(node_ids), batch_size):
+        query = overpass_query.host_buildings_query(node_ids[start:start + batch_size])
+        for element in overpass.stream_elements(query, url):
+            footprint = ring(element)
+            if footprint:
+                lat, lon = spatial.bbox_center(spatial.bbox_of(footprint))
+                element['center'] = {'lat': lat, 'lon': lon}
+                buildings[element['id']] = element
+    return list(buildings.values())
+
+
+class _Footprints:
+    """Building footprints with a grid index for containment lookups."""
+
+    def __init__(self):
+        self.index = spatial.GridIndex()
+        self.rings = {}
+        self.areas = {}
+
+    def add(self, building):
+        footprint = ring(building)
+        if footprint is None or building['id'] in self.rings:
+            return False
+        self.rings[building['id']] = footprint
+        self.areas[building['id']] = spatial.ring_area(footprint)
+        self.index.insert(building['id'], spatial.bbox_of(footprint))
+        return True
+
+    def host(self, lat, lon):
+        """Id of the smallest footprint containing the point, or None."""
+        inside = [way_id for way_id in self.index.at(lat, lon) if spatial.point_in_polygon(lat, lon, self.rings[way_id])]
+        return min(inside, key=self.areas.get) if inside else None
+
+
+def consolidate(elements, fetch=True, url=None):
+    """Folds solar nodes into their host buildings.
+
+    Returns (records, stats). Records keep the input order; a building fetched as a
+    host takes the place of the first node merged into it. Without fetch only the
+    footprints already in the input are used and Overpass is not queried.
+    """
+    elements = list(elements)
+    buildings = {element['id']: element for element in elements if is_building(element)}
+    listed = set(buildings)
+    if fetch:
+        overpass.attach_geometry(list(buildings.values()), lambda element: not element.get('geometry'), url)
+    footprints = _Footprints()
+    for building in buildings.values():
+        footprints.add(building)
+
+    hosts = {}
+    loose = []
+    for element in elements:
+        if is_panel(element):
+            host = footprints.host(*element_coords(element))
+            if host is None:
+                loose.append(element)
+            else:
+                hosts[element['id']] = host
+
+    fetched = 0
+    if fetch and loose:
+        log(f"Fetching host buildings for {len(loose)} solar nodes outside the fetched footprints")
+        for building in fetch_host_buildings([element['id'] for element in loose], url):
+            if building['id'] not in buildings and footprints.add(building):
+                buildings[building['id']] = building
+                fetched += 1
+        for element in loose:
+            host = footprints.host(*element_coords(element))
+            if host is not None:
+                hosts[element['id']] = host
+
+    merged = {}
+    for node_id, way_id in hosts.items():
+        merged.setdefault(way_id, []).append(node_id)
+
+    records = []
+    emitted = set()
+    for element in elements:
+        if element.get('type') == 'node' and element['id'] in hosts:
+            way_id = hosts[element['id']]
+            if way_id in emitted or way_id in listed:
+                continue  # already written, or written where the input lists it
+            element = buildings[way_id]
+        if is_building(element) and element['id'] in buildings:
+            if element['id'] in emitted:
+                continue
+            emitted.add(element['id'])
+            node_ids = sorted(merged.get(element['id'], []))
+            own = 1 if element.get('tags', {}).get('generator:source') == 'solar' else 0
+            record = dict(element, solar={'panel_count': len(node_ids) + own, 'node_ids': node_ids})
+        else:
+            node_ids = [element['id']] if element.get('type') == 'node' else []
+            record = dict(element, solar={'panel_count': 1, 'node_ids': node_ids})
+        records.append(record)
+
+    stats = {
+        'elements': len(elements),
+        'records': len(records),
+        'merged_nodes': len(hosts),
+        'buildings_with_panels': len(merged),
+        'host_buildings_fetched': fetched,
+        'nodes_without_building': sum(1 for element in elements if is_panel(element) and element['id'] not in hosts),
+    }
+    return records, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge solar nodes into the buildings they sit on.")
+    parser.add_argument('input', help="snapshot (.osnap) or Overpass JSON file")
+    parser.add_argument('output', help="Overpass style JSON file for the consolidated records")
+    parser.add_argument('--no-fetch', action='store_true',
+                        help="only use the footprints in the input, do not query Overpass")
+    args = parser.parse_args()
+
+    records, stats = consolidate(snapshot.iter_elements(args.input), fetch=not args.no_fetch)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'elements': records}, f, ensure_ascii=False)
+    log(f"Consolidated {stats['elements']} elements into {stats['records']} records: {stats}")
+    log(f"Saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,205 @@
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import sys
+import config
+import geocode
+from store import SolarStore, utc_now
+
+# Dead-letter table for geocodes that failed, so a timeout or an HTTP error no longer
+# makes a row disappear.
+#
+# pipeline.py and 03/04 record every failed lookup here with the provider, the reason
+# (timeout, HTTP 503, blocked after retries, ...) and the number of attempts so far;
+# jobs that job_queue.py gave up on can be pulled in with import-jobs. The main runs
+# carry on without waiting for them. Later, a separate retry pass drains the table
+# with its own provider and concurrency, writes what resolves to the store and keeps
+# the rest, with the new reason, for the next pass:
+#
+#   python deadletter.py status
+#   python deadletter.py retry --provider locationiq --workers 2
+#   python deadletter.py retry --provider nominatim-db              (bulk, one query per batch)
+#   python deadletter.py import-jobs
+#   python deadletter.py list --csv > failed.csv
+
+MAX_ATTEMPTS = 10  # attempts after which retry leaves an item alone unless --all is given
+BULK_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    osm_type     TEXT    NOT NULL,
+    osm_id       INTEGER NOT NULL,
+    lat          REAL,
+    lon          REAL,
+    provider     TEXT,
+    reason       TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 1,
+    first_failed TEXT,
+    last_failed  TEXT,
+    resolved_at  TEXT,
+    PRIMARY KEY (osm_type, osm_id)
+);
+CREATE INDEX IF NOT EXISTS dead_letters_open ON dead_letters (resolved_at, attempts);
+"""
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+class DeadLetters:
+    """Failed geocodes in the store database. Pass store= to share an open SolarStore connection."""
+
+    def __init__(self, path=config.STORE_DB_PATH, store=None):
+        self.own_store = store is None
+        self.store = store or SolarStore(path)
+        self.conn = self.store.conn
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        if self.own_store:
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, osm_type, osm_id, lat, lon, provider, reason, attempts=1):
+        """Records a failure; a known item gets its attempts added and its reason replaced."""
+        now = utc_now()
+        self.conn.execute(
+            """INSERT INTO dead_letters (osm_type, osm_id, lat, lon, provider, reason, attempts, first_failed,
+                                         last_failed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (osm_type, osm_id) DO UPDATE SET
+                   lat = excluded.lat, lon = excluded.lon, provider = excluded.provider, reason = excluded.reason,
+                   attempts = attempts + excluded.attempts, last_failed = excluded.last_failed, resolved_at = NULL""",
+            (osm_type, osm_id, lat, lon, provider, reason or 'no address', attempts, now, now))
+
+    def resolve(self, osm_type, osm_id):
+        self.conn.execute("UPDATE dead_letters SET resolved_at = ? WHERE osm_type = ? AND osm_id = ?",
+                          (utc_now(), osm_type, osm_id))
+
+    def pending(self, max_attempts=MAX_ATTEMPTS, limit=None):
+        """Unresolved items, fewest attempts first."""
+        sql = ("SELECT osm_type, osm_id, lat, lon, provider, reason, attempts FROM dead_letters "
+               "WHERE resolved_at IS NULL")
+        params = []
+        if max_attempts is not None:
+            sql += " AND attempts < ?"
+            params.append(max_attempts)
+        sql += " ORDER BY attempts, last_failed"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def stats(self):
+        """Returns {'open': n, 'resolved': n, 'by_reason': {reason: n}, 'by_provider': {provider: n}} (open items)."""
+        counts = self.conn.execute(
+            "SELECT SUM(resolved_at IS NULL) AS open, SUM(resolved_at IS NOT NULL) AS resolved FROM dead_letters"
+        ).fetchone()
+        grouped = {}
+        for column in ('reason', 'provider'):
+            grouped[column] = {row[column]: row['n'] for row in self.conn.execute(
+                f"SELECT {column}, COUNT(*) AS n FROM dead_letters WHERE resolved_at IS NULL "
+                f"GROUP BY {column} ORDER BY n DESC")}
+        return {'open': counts['open'] or 0, 'resolved': counts['resolved'] or 0,
+                'by_reason': grouped['reason'], 'by_provider': grouped['provider']}
+
+    def import_jobs(self):
+        """Copies the jobs job_queue.py marked failed. Returns how many."""
+        if not self.conn.execute("SELECT name FROM sqlite_master WHERE name = 'jobs'").fetchone():
+            return 0
+        now = utc_now()
+        with self.conn:
+            cursor = self.conn.execute(
+                """INSERT INTO dead_letters (osm_type, osm_id, lat, lon, provider, reason, attempts, first_failed,
+                                             last_failed)
+                   SELECT osm_type, osm_id, lat, lon, 'job_queue', COALESCE(error, 'failed'), attempts, ?, ?
+                   FROM jobs WHERE state = 'failed'
+                   ON CONFLICT (osm_type, osm_id) DO NOTHING""", (now, now))
+        return cursor.rowcount
+
+    def retry(self, provider, workers=2, max_attempts=MAX_ATTEMPTS, limit=None):
+        """Reverse geocodes the open items again with `provider`. Returns (resolved, failed)."""
+        items = self.pending(max_attempts, limit)
+        log(f"Retrying {len(items)} dead letters with {provider}")
+        if provider in geocode.BULK_PROVIDERS:
+            reverse_many = geocode.BULK_PROVIDERS[provider]
+            results = []
+            for start in range(0, len(items), BULK_BATCH):
+                batch = items[start:start + BULK_BATCH]
+                addresses = reverse_many([(item['lat'], item['lon']) for item in batch])
+                results += [(item, addr, None) for item, addr in zip(batch, addresses)]
+        else:
+            geocoder = geocode.PROVIDERS[provider]
+
+            def attempt(item):
+                addr = geocoder(item['lat'], item['lon'])
+                return item, addr, geocode.last_error()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(attempt, items))
+
+        resolved = 0
+        with self.conn:
+            for item, addr, reason in results:
+                if addr is None:
+                    self.add(item['osm_type'], item['osm_id'], item['lat'], item['lon'], provider, reason)
+                else:
+                    # 03/04 do not write elements to the store; add a bare one so exports include the row
+                    self.conn.execute(
+                        """INSERT INTO elements (osm_type, osm_id, lat, lon, source, first_seen, updated_at)
+                           VALUES (?, ?, ?, ?, 'deadletter', ?, ?) ON CONFLICT (osm_type, osm_id) DO NOTHING""",
+                        (item['osm_type'], item['osm_id'], item['lat'], item['lon'], utc_now(), utc_now()))
+                    self.store.upsert_fields(item['osm_type'], item['osm_id'], geocode.address_fields(addr),
+                                             provider)
+                    self.resolve(item['osm_type'], item['osm_id'])
+                    resolved += 1
+        return resolved, len(results) - resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dead-letter table of failed geocodes, with a deferred retry pass.")
+    parser.add_argument('--store', default=config.STORE_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="open and resolved items, per reason and provider")
+    commands.add_parser('import-jobs', help="add the jobs job_queue.py gave up on")
+    retry = commands.add_parser('retry', help="geocode the open items again")
+    retry.add_argument('--provider', choices=sorted(geocode.PROVIDERS), default='nominatim')
+    retry.add_argument('--workers', type=int, default=2, help="concurrent requests")
+    retry.add_argument('--limit', type=int, help="retry at most this many items")
+    retry.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                       help="skip items that failed this often")
+    retry.add_argument('--all', action='store_true', help="also retry items past --max-attempts")
+    listing = commands.add_parser('list', help="print the open items")
+    listing.add_argument('--csv', action='store_true')
+    args = parser.parse_args()
+
+    with DeadLetters(args.store) as dead_letters:
+        if args.command == 'import-jobs':
+            log(f"Imported {dead_letters.import_jobs()} failed jobs")
+        elif args.command == 'retry':
+            resolved, failed = dead_letters.retry(args.provider, args.workers,
+                                                  None if args.all else args.max_attempts, args.limit)
+            log(f"Resolved {resolved}, still failing {failed}")
+        elif args.command == 'list':
+            items = dead_letters.pending(max_attempts=None)
+            if args.csv:
+                writer = csv.DictWriter(sys.stdout, fieldnames=['osm_type', 'osm_id', 'lat', 'lon', 'provider',
+                                                                'reason', 'attempts'])
+                writer.writeheader()
+                writer.writerows(items)
+            else:
+                for item in items:
+                    print(f"{item['osm_type']}/{item['osm_id']:<12} {item['provider'] or '':<12} "
+                          f"{item['attempts']:>3}x  {item['reason']}")
+        log(f"Dead letters: {dead_letters.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
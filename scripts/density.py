@@ -0,0 +1,218 @@
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import zlib
+import config
+import rdnew
+import snapshot
+import spatial
+from store import element_coords, LAT_COLUMNS, LON_COLUMNS, EMPTY_VALUES
+
+try:
+    import numpy as np
+except ImportError:  # only needed for this stage
+    np = None
+
+# Density grids of solar installations in RD New (EPSG:28992) metre cells.
+#
+# Points are projected to RD (rdnew.py), binned into the finest grid with one np.bincount over
+# flat cell indexes, and every coarser level is the previous one summed over 2x2
+# blocks, so the whole pyramid costs one pass over the data. Two layers per level:
+#
+#   count      installations per cell (a consolidated building counts its panel nodes)
+#   roof_area  footprint m² per cell, for ways that come with geometry
+#
+# The extent is North Holland (config.NORTH_HOLLAND_BBOX) snapped to the coarsest
+# cell, so grids of different runs line up cell for cell. Rows run north to south,
+# as in a GeoTIFF: cell (row, col) covers x0 + col*size .. +size, y_top - row*size .. -size.
+#
+# Output:
+#   <output>.npz             all levels, compressed (np.load(...)['count_100'])
+#   <output>.json            extent, cell sizes and totals
+#   --tiles DIR              DIR/<size>m/<layer>/<row>_<col>.bin: zlib-compressed
+#                            TILE_SIZE x TILE_SIZE little-endian arrays (count uint16
+#                            or uint32, roof_area float32), empty tiles skipped, plus
+#                            DIR/index.json; a viewer loads the few kB it shows
+#   --heatmap FILE.pgm       log-scaled 8-bit greyscale image of one level
+#
+#   python density.py Output/north_holland_solar.osnap Output/density
+#   python density.py Output/pipeline.csv Output/density --tiles Output/density_tiles --heatmap Output/density.pgm
+
+BASE_CELL = 100  # metres
+LEVELS = 6  # 100, 200, 400, 800, 1600, 3200 m
+TILE_SIZE = 256
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("density.py needs numpy (pip install numpy)")
+
+
+def grid_extent(bbox=config.NORTH_HOLLAND_BBOX, base=BASE_CELL, levels=LEVELS):
+    """Returns (x0, y_top, cols, rows) of the base grid covering a (south, west, north, east) box."""
+    south, west, north, east = bbox
+    x, y = rdnew.to_rd([south, south, north, north], [west, east, west, east])
+    coarsest = base * 2 ** (levels - 1)
+    x0 = math.floor(x.min() / coarsest) * coarsest
+    y0 = math.floor(y.min() / coarsest) * coarsest
+    x1 = math.ceil(x.max() / coarsest) * coarsest
+    y1 = math.ceil(y.max() / coarsest) * coarsest
+    return x0, y1, int((x1 - x0) // base), int((y1 - y0) // base)
+
+
+def read_points(path):
+    """Returns (lat, lon, count, roof_area) arrays from a snapshot/Overpass JSON or an output CSV."""
+    lats, lons, counts, areas = [], [], [], []
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                lat = next((row[c] for c in LAT_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+                lon = next((row[c] for c in LON_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+                if lat is None or lon is None:
+                    continue
+                lats.append(float(lat))
+                lons.append(float(lon))
+                counts.append(int(row['panel_count']) if row.get('panel_count') not in EMPTY_VALUES else 1)
+                areas.append(0.0)
+    else:
+        for element in snapshot.iter_elements(path):
+            lat, lon = element_coords(element)
+            if lat is None or lon is None:
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            counts.append(max(1, element.get('solar', {}).get('panel_count', 1)))
+            geometry = element.get('geometry')
+            ring = [(point['lat'], point['lon']) for point in geometry if point] if geometry else []
+            areas.append(spatial.ring_area(ring) if len(ring) >= 3 else 0.0)
+    return (np.array(lats), np.array(lons), np.array(counts, dtype=np.uint32), np.array(areas, dtype=np.float64))
+
+
+def histogram(x, y, weights, extent, base=BASE_CELL, dtype=None):
+    """Sums weights into the base grid (rows north to south). Returns (grid, points outside the extent)."""
+    x0, y_top, cols, rows = extent
+    col = np.floor((x - x0) / base).astype(np.int64)
+    row = np.floor((y_top - y) / base).astype(np.int64)
+    inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+    flat = row[inside] * cols + col[inside]
+    grid = np.bincount(flat, weights=weights[inside], minlength=rows * cols).reshape(rows, cols)
+    return grid.astype(dtype or np.float64), int((~inside).sum())
+
+
+def pyramid(grid, levels=LEVELS):
+    """Returns [grid, grid summed 2x2, ...], levels long."""
+    grids = [grid]
+    for _ in range(levels - 1):
+        rows, cols = grids[-1].shape
+        grids.append(grids[-1].reshape(rows // 2, 2, cols // 2, 2).sum(axis=(1, 3)))
+    return grids
+
+
+def build(lat, lon, counts, areas, bbox=config.NORTH_HOLLAND_BBOX, base=BASE_CELL, levels=LEVELS):
+    """Bins the points into all levels. Returns ({'count_<size>': grid, 'roof_area_<size>': grid}, meta)."""
+    _require_numpy()
+    extent = grid_extent(bbox, base, levels)
+    x, y = rdnew.to_rd(lat, lon)
+    count, outside = histogram(x, y, counts.astype(np.float64), extent, base, np.uint32)
+    area, _ = histogram(x, y, areas, extent, base, np.float32)
+    grids = {}
+    for level, (count_grid, area_grid) in enumerate(zip(pyramid(count, levels), pyramid(area, levels))):
+        size = base * 2 ** level
+        grids[f'count_{size}'] = count_grid
+        grids[f'roof_area_{size}'] = area_grid
+    meta = {
+        'crs': 'EPSG:28992',
+        'x0': extent[0],
+        'y_top': extent[1],
+        'cell_sizes': [base * 2 ** level for level in range(levels)],
+        'shape': [extent[3], extent[2]],
+        'points': int(len(lat)),
+        'outside': outside,
+        'installations': int(count.sum()),
+        'roof_area': round(float(area.sum()), 1),
+    }
+    return grids, meta
+
+
+def write_tiles(grids, meta, directory, tile_size=TILE_SIZE):
+    """Writes the non-empty tiles of every level and an index. Returns the number of tiles written."""
+    index = dict(meta, tile_size=tile_size, levels={})
+    written = 0
+    for size in meta['cell_sizes']:
+        count = grids[f'count_{size}']
+        layers = {'count': count.astype('<u2' if count.max(initial=0) <= 0xFFFF else '<u4'),
+                  'roof_area': grids[f'roof_area_{size}'].astype('<f4')}
+        tiles = []
+        rows, cols = count.shape
+        for tile_row in range(0, rows, tile_size):
+            for tile_col in range(0, cols, tile_size):
+                window = (slice(tile_row, tile_row + tile_size), slice(tile_col, tile_col + tile_size))
+                if not count[window].any():
+                    continue
+                name = f"{tile_row // tile_size}_{tile_col // tile_size}"
+                for layer, grid in layers.items():
+                    tile = np.zeros((tile_size, tile_size), dtype=grid.dtype)
+                    part = grid[window]
+                    tile[:part.shape[0], :part.shape[1]] = part
+                    path = os.path.join(directory, f"{size}m", layer, f"{name}.bin")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(zlib.compress(tile.tobytes(), 9))
+                tiles.append(name)
+                written += 1
+        index['levels'][str(size)] = {'shape': [rows, cols], 'tiles': tiles,
+                                      'dtypes': {layer: grid.dtype.str for layer, grid in layers.items()}}
+    with open(os.path.join(directory, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+    return written
+
+
+def write_heatmap(grid, path):
+    """Writes a log-scaled 8-bit binary PGM image of a grid."""
+    scaled = np.log1p(grid.astype(np.float64))
+    peak = scaled.max(initial=0) or 1.0
+    pixels = (scaled / peak * 255).astype(np.uint8)
+    with open(path, 'wb') as f:
+        f.write(f"P5\n{pixels.shape[1]} {pixels.shape[0]}\n255\n".encode('ascii'))
+        f.write(pixels.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bin solar installations into multi-resolution RD New density grids.")
+    parser.add_argument('input', help="snapshot (.osnap), Overpass/consolidate.py JSON or an output CSV")
+    parser.add_argument('output', help="output prefix; writes <output>.npz and <output>.json")
+    parser.add_argument('--cell', type=int, default=BASE_CELL, help="finest cell size in metres")
+    parser.add_argument('--levels', type=int, default=LEVELS, help="number of levels, each doubling the cell size")
+    parser.add_argument('--tiles', help="also write compressed tiles and an index.json to this directory")
+    parser.add_argument('--heatmap', help="also write a PGM heatmap of the --heatmap-cell level")
+    parser.add_argument('--heatmap-cell', type=int, help="cell size of the heatmap level (default: the finest)")
+    args = parser.parse_args()
+    _require_numpy()
+
+    lat, lon, counts, areas = read_points(args.input)
+    grids, meta = build(lat, lon, counts, areas, base=args.cell, levels=args.levels)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(f"{args.output}.npz", **grids)
+    with open(f"{args.output}.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+    log(f"{meta['points']} points ({meta['outside']} outside the extent) binned into "
+        f"{len(meta['cell_sizes'])} levels; saved {args.output}.npz ({os.path.getsize(args.output + '.npz')} bytes)")
+    if args.tiles:
+        log(f"Wrote {write_tiles(grids, meta, args.tiles)} tiles to {args.tiles}")
+    if args.heatmap:
+        write_heatmap(grids[f"count_{args.heatmap_cell or args.cell}"], args.heatmap)
+        log(f"Heatmap saved to {args.heatmap}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
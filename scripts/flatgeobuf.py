@@ -0,0 +1,702 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import struct
+import sys
+import config
+import http_client
+import rdnew
+import snapshot
+import spatial
+from store import SolarStore, FIELDS, LAT_COLUMNS, LON_COLUMNS, EMPTY_VALUES, element_coords
+
+# FlatGeobuf export of the solar buildings, and bbox reads that fetch only the
+# features they need, from a local file or over HTTP range requests.
+#
+# A FlatGeobuf file is the magic bytes, a FlatBuffers header (schema, extent, CRS,
+# feature count), a packed Hilbert R-tree and the features, each a size-prefixed
+# FlatBuffers table with its geometry and its attributes. The writer computes the
+# box of every encoded geometry, sorts the features along a Hilbert curve over the
+# extent (spatial.hilbert), and builds the tree bottom-up from those boxes: leaves
+# point at byte offsets in the feature section, parents at their first child, root
+# first. A bbox read walks the tree one level at a time, fetching each level's
+# matching nodes with as few reads as possible, then reads the hits, with
+# neighbouring features merged into one range. Against the file server that is a
+# handful of HTTP range requests, whatever the size of the file.
+#
+# The FlatBuffers tables are written and read directly with struct, so no
+# flatbuffers/GDAL dependency is needed; the files open in QGIS, GDAL/ogr2ogr and
+# the flatgeobuf JS/Python readers.
+#
+# Exports:
+#   snapshot/JSON   footprints (Polygon) for ways that come with geometry (a snapshot
+#                   fetched with geometry or consolidate.py output), points otherwise;
+#                   attributes osm_type, osm_id, building, panel_count, roof_area plus
+#                   the address fields from the store
+#   output CSV      points from the coordinate columns, every column as an attribute
+#                   (typed Long or Double when all its values are numbers)
+#
+#   python flatgeobuf.py export Output/north_holland_solar_consolidated.json Output/solar.fgb
+#   python flatgeobuf.py export Output/north_holland_solar_pipeline.csv Output/solar_points.fgb --rd
+#   python flatgeobuf.py query Output/solar.fgb --bbox 52.37,4.88,52.38,4.90 > hits.geojson
+#   python flatgeobuf.py query https://files.example.nl/solar.fgb --bbox 52.37,4.88,52.38,4.90 --csv
+#   python flatgeobuf.py info https://files.example.nl/solar.fgb
+
+MAGIC = b'fgb\x03fgb\x01'
+DEFAULT_NODE_SIZE = 16
+HEADER_PREFETCH = 64 * 1024  # first read: magic, header and the top levels of the index
+MERGE_GAP = 64 * 1024  # bytes of unneeded nodes or features worth reading to save a request
+SCAN_CHUNK = 1024 * 1024
+
+POINT, LINESTRING, POLYGON, MULTIPOINT, MULTILINESTRING, MULTIPOLYGON = 1, 2, 3, 4, 5, 6
+GEOMETRY_NAMES = {0: 'Unknown', POINT: 'Point', LINESTRING: 'LineString', POLYGON: 'Polygon',
+                  MULTIPOINT: 'MultiPoint', MULTILINESTRING: 'MultiLineString', MULTIPOLYGON: 'MultiPolygon'}
+
+# Column types of the FlatGeobuf schema, with the struct format of the fixed-size ones
+INT, LONG, DOUBLE, STRING, JSON_TYPE, DATETIME, BINARY = 5, 7, 10, 11, 12, 13, 14
+_PROPERTY_FORMATS = {0: 'b', 1: 'B', 2: '?', 3: 'h', 4: 'H', INT: 'i', 6: 'I', LONG: 'q', 8: 'Q', 9: 'f', DOUBLE: 'd'}
+_TEXT_TYPES = (STRING, JSON_TYPE, DATETIME)
+
+_U32 = struct.Struct('<I')
+_NODE = struct.Struct('<4dQ')  # min_x, min_y, max_x, max_y, offset
+
+ELEMENT_COLUMNS = [('osm_type', STRING), ('osm_id', LONG), ('building', STRING), ('panel_count', INT),
+                   ('roof_area', DOUBLE)]
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}", file=sys.stderr)
+
+
+# --- FlatBuffers --------------------------------------------------------------
+
+class _Builder:
+    """Minimal FlatBuffers writer. Tables go front to back, each child after its parent.
+
+    Fields are (slot, kind, value); kind is a struct format for scalars, '[<fmt>]' for a
+    vector of scalars, 'bytes', 'str', 'table' (value: fields) or 'tables' (value: a
+    list of fields). Fields whose value is None are left out.
+    """
+
+    def __init__(self):
+        self.buf = bytearray(4)  # root table offset
+
+    def _align(self, size, extra=0):
+        self.buf.extend(bytes(-(len(self.buf) + extra) % size))
+
+    def finish(self, fields):
+        struct.pack_into('<I', self.buf, 0, self.table(fields))
+        return bytes(self.buf)
+
+    def table(self, fields):
+        layout = []
+        offset = 4  # soffset to the vtable
+        fields = sorted((field for field in fields if field[2] is not None),
+                        key=lambda field: -(struct.calcsize('<' + field[1]) if len(field[1]) == 1 else 4))
+        for slot, kind, value in fields:
+            size = struct.calcsize('<' + kind) if len(kind) == 1 else 4
+            offset += -offset % size
+            layout.append((slot, kind, value, offset, size))
+            offset += size
+        slots = max((slot for slot, _, _ in fields), default=-1) + 1
+        vtable = [4 + 2 * slots, offset] + [0] * slots
+        for slot, _, _, at, _ in layout:
+            vtable[2 + slot] = at
+        self._align(2)
+        vtable_pos = len(self.buf)
+        self.buf += struct.pack(f'<{len(vtable)}H', *vtable)
+        self._align(max([4] + [size for *_, size in layout]))  # field offsets are aligned relative to pos
+        pos = len(self.buf)
+        self.buf += bytes(offset)
+        struct.pack_into('<i', self.buf, pos, pos - vtable_pos)
+        children = []
+        for _, kind, value, at, _ in layout:
+            if len(kind) == 1:
+                struct.pack_into('<' + kind, self.buf, pos + at, value)
+            else:
+                children.append((pos + at, kind, value))
+        for at, kind, value in children:
+            struct.pack_into('<I', self.buf, at, self._child(kind, value) - at)
+        return pos
+
+    def _child(self, kind, value):
+        if kind == 'table':
+            return self.table(value)
+        if kind == 'tables':
+            self._align(4)
+            pos = len(self.buf)
+            self.buf += struct.pack('<I', len(value)) + bytes(4 * len(value))
+            for i, fields in enumerate(value):
+                at = pos + 4 + 4 * i
+                struct.pack_into('<I', self.buf, at, self.table(fields) - at)
+            return pos
+        if kind == 'str':
+            data = value.encode('utf-8')
+            self._align(4)
+            pos = len(self.buf)
+            self.buf += struct.pack('<I', len(data)) + data + b'\0'
+            return pos
+        if kind == 'bytes':
+            self._align(4)
+            pos = len(self.buf)
+            self.buf += struct.pack('<I', len(value)) + value
+            return pos
+        fmt = kind[1:-1]
+        self._align(max(4, struct.calcsize('<' + fmt)), 4)
+        pos = len(self.buf)
+        self.buf += struct.pack(f'<I{len(value)}{fmt}', len(value), *value)
+        return pos
+
+
+class _Table:
+    """Read access to one FlatBuffers table at pos in buf."""
+
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+        self.vtable_size = struct.unpack_from('<H', buf, self.vtable)[0]
+
+    @classmethod
+    def root(cls, buf):
+        return cls(buf, _U32.unpack_from(buf, 0)[0])
+
+    def _offset(self, slot):
+        at = 4 + 2 * slot
+        return struct.unpack_from('<H', self.buf, self.vtable + at)[0] if at < self.vtable_size else 0
+
+    def _ref(self, slot):
+        offset = self._offset(slot)
+        if not offset:
+            return None
+        at = self.pos + offset
+        return at + _U32.unpack_from(self.buf, at)[0]
+
+    def scalar(self, slot, fmt, default=0):
+        offset = self._offset(slot)
+        return struct.unpack_from('<' + fmt, self.buf, self.pos + offset)[0] if offset else default
+
+    def string(self, slot):
+        ref = self._ref(slot)
+        if ref is None:
+            return None
+        size = _U32.unpack_from(self.buf, ref)[0]
+        return bytes(self.buf[ref + 4:ref + 4 + size]).decode('utf-8')
+
+    def bytes(self, slot):
+        ref = self._ref(slot)
+        if ref is None:
+            return b''
+        return bytes(self.buf[ref + 4:ref + 4 + _U32.unpack_from(self.buf, ref)[0]])
+
+    def vector(self, slot, fmt):
+        ref = self._ref(slot)
+        if ref is None:
+            return ()
+        count = _U32.unpack_from(self.buf, ref)[0]
+        return struct.unpack_from(f'<{count}{fmt}', self.buf, ref + 4)
+
+    def table(self, slot):
+        ref = self._ref(slot)
+        return None if ref is None else _Table(self.buf, ref)
+
+    def tables(self, slot):
+        ref = self._ref(slot)
+        if ref is None:
+            return []
+        count = _U32.unpack_from(self.buf, ref)[0]
+        return [_Table(self.buf, at + _U32.unpack_from(self.buf, at)[0])
+                for at in range(ref + 4, ref + 4 + 4 * count, 4)]
+
+
+# --- Packed Hilbert R-tree ----------------------------------------------------
+
+def level_bounds(count, node_size):
+    """Returns [(first node, end node)] per tree level, leaves first; the root is node 0."""
+    sizes = [count]
+    n = count
+    while n != 1:
+        n = -(-n // node_size)
+        sizes.append(n)
+    bounds = []
+    end = sum(sizes)
+    for size in sizes:
+        bounds.append((end - size, end))
+        end -= size
+    return bounds
+
+
+def build_index(boxes, offsets, node_size):
+    """Packs the tree over leaf boxes (min_x, min_y, max_x, max_y) and feature offsets. Returns bytes."""
+    bounds = level_bounds(len(boxes), node_size)
+    nodes = [None] * bounds[0][1]
+    for i, (box, offset) in enumerate(zip(boxes, offsets)):
+        nodes[bounds[0][0] + i] = (*box, offset)
+    for level in range(len(bounds) - 1):
+        start, end = bounds[level]
+        parent = bounds[level + 1][0]
+        for first in range(start, end, node_size):
+            children = nodes[first:min(first + node_size, end)]
+            nodes[parent] = (min(node[0] for node in children), min(node[1] for node in children),
+                             max(node[2] for node in children), max(node[3] for node in children), first)
+            parent += 1
+    return b''.join(_NODE.pack(*node) for node in nodes)
+
+
+def _merge(ranges, gap):
+    """Merges sorted (start, end) ranges that are at most gap apart."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# --- Writing ------------------------------------------------------------------
+
+def _encode_properties(columns, values):
+    out = bytearray()
+    for index, (name, column_type) in enumerate(columns):
+        value = values.get(name)
+        if value in EMPTY_VALUES:
+            continue
+        if column_type in _TEXT_TYPES:
+            data = str(value).encode('utf-8')
+            out += struct.pack('<HI', index, len(data)) + data
+        else:
+            out += struct.pack('<H' + _PROPERTY_FORMATS[column_type], index, value)
+    return bytes(out)
+
+
+def _encode_feature(geometry_type, points, properties, typed):
+    xy = [value for point in points for value in point]
+    geometry = [(1, '[d]', xy), (6, 'B', geometry_type if typed else None)]
+    return _Builder().finish([(0, 'table', geometry), (1, 'bytes', properties)])
+
+
+def write(path, features, columns, name='', crs_code=4326, node_size=DEFAULT_NODE_SIZE):
+    """Writes features to a FlatGeobuf file. Returns the feature count.
+
+    features: (geometry type, [(x, y), ...], {column: value}); a polygon is its closed
+    outer ring. columns: [(name, column type)]. node_size=0 writes no index, and so
+    does an empty file (GDAL does not open an empty file that announces one).
+    """
+    types = {geometry_type for geometry_type, _, _ in features}
+    header_type = types.pop() if len(types) == 1 else 0
+    encoded, boxes = [], []
+    for geometry_type, points, values in features:
+        encoded.append(_encode_feature(geometry_type, points, _encode_properties(columns, values),
+                                       header_type == 0))
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+    extent = None
+    if boxes:
+        extent = (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                  max(box[2] for box in boxes), max(box[3] for box in boxes))
+    if not boxes:
+        node_size = 0
+    if node_size:
+        width = (extent[2] - extent[0]) or 1.0
+        height = (extent[3] - extent[1]) or 1.0
+
+        def curve(box):
+            x = int(spatial.HILBERT_MAX * ((box[0] + box[2]) / 2 - extent[0]) / width)
+            y = int(spatial.HILBERT_MAX * ((box[1] + box[3]) / 2 - extent[1]) / height)
+            return spatial.hilbert(x, y)
+
+        order = sorted(range(len(boxes)), key=lambda i: curve(boxes[i]))
+        encoded = [encoded[i] for i in order]
+        boxes = [boxes[i] for i in order]
+
+    header = _Builder().finish([
+        (0, 'str', name),
+        (1, '[d]', list(extent) if extent else None),
+        (2, 'B', header_type),
+        (7, 'tables', [[(0, 'str', column), (1, 'B', column_type)] for column, column_type in columns]),
+        (8, 'Q', len(encoded)),
+        (9, 'H', node_size),
+        (10, 'table', [(0, 'str', 'EPSG'), (1, 'i', crs_code)]),
+    ])
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_U32.pack(len(header)))
+        f.write(header)
+        if node_size:
+            offsets, offset = [], 0
+            for data in encoded:
+                offsets.append(offset)
+                offset += 4 + len(data)
+            f.write(build_index(boxes, offsets, node_size))
+        for data in encoded:
+            f.write(_U32.pack(len(data)))
+            f.write(data)
+    os.replace(temp_path, path)
+    return len(encoded)
+
+
+def _project(points, rd):
+    """(lat, lon) points to (x, y) in the file CRS: lon/lat, or RD metres."""
+    if rd:
+        return [rdnew.to_rd(lat, lon) for lat, lon in points]
+    return [(lon, lat) for lat, lon in points]
+
+
+def features_from_elements(path, store_path=None, rd=False):
+    """Returns (features, columns) for the elements of a snapshot or Overpass/consolidate.py JSON."""
+    columns = list(ELEMENT_COLUMNS)
+    solar_store = SolarStore(store_path) if store_path and os.path.exists(store_path) else None
+    if solar_store:
+        columns += [(field, STRING) for field in FIELDS]
+    features = []
+    try:
+        for element in snapshot.iter_elements(path):
+            geometry = element.get('geometry')
+            ring = [(point['lat'], point['lon']) for point in geometry if point] if geometry else []
+            values = {
+                'osm_type': element.get('type'),
+                'osm_id': element.get('id'),
+                'building': (element.get('tags') or {}).get('building'),
+                'panel_count': (element.get('solar') or {}).get('panel_count'),
+            }
+            if len(ring) >= 3:
+                if ring[0] != ring[-1]:
+                    ring.append(ring[0])
+                values['roof_area'] = round(spatial.ring_area(ring), 1)
+                geometry_type, points = POLYGON, _project(ring, rd)
+            else:
+                lat, lon = element_coords(element)
+                if lat is None or lon is None:
+                    continue
+                geometry_type, points = POINT, _project([(lat, lon)], rd)
+            if solar_store:
+                values.update(solar_store.get_fields(element.get('type'), element.get('id')))
+            features.append((geometry_type, points, values))
+    finally:
+        if solar_store:
+            solar_store.close()
+    return features, columns
+
+
+def _column_type(values):
+    values = [value for value in values if value not in EMPTY_VALUES]
+    if not values:
+        return STRING
+    try:
+        for value in values:
+            int(value)
+        return LONG
+    except ValueError:
+        pass
+    try:
+        for value in values:
+            float(value)
+        return DOUBLE
+    except ValueError:
+        return STRING
+
+
+def features_from_csv(path, rd=False):
+    """Returns (features, columns): one point per CSV row with coordinates, every column an attribute."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+        header = reader.fieldnames
+    columns = [(column, _column_type(row.get(column) for row in rows)) for column in header]
+    casts = {LONG: int, DOUBLE: float}
+    features = []
+    for row in rows:
+        lat = next((row[c] for c in LAT_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+        lon = next((row[c] for c in LON_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+        if lat is None or lon is None:
+            continue
+        values = {column: casts[column_type](row[column]) if column_type in casts and row[column] not in EMPTY_VALUES
+                  else row[column] for column, column_type in columns}
+        features.append((POINT, _project([(float(lat), float(lon))], rd), values))
+    return features, columns
+
+
+# --- Reading ------------------------------------------------------------------
+
+class LocalSource:
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.requests = 0
+        self.bytes = 0
+
+    def read(self, offset, length=None):
+        """Bytes from offset, up to length (None: to the end)."""
+        self.f.seek(offset)
+        data = self.f.read() if length is None else self.f.read(length)
+        self.requests += 1
+        self.bytes += len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+class HttpSource:
+    """Reads byte ranges of a file on a web server that supports Range requests."""
+
+    def __init__(self, url):
+        self.url = url
+        self.size = None
+        self.requests = 0
+        self.bytes = 0
+
+    def read(self, offset, length=None):
+        if self.size is not None and offset >= self.size:
+            return b''
+        end = '' if length is None else offset + length - 1
+        response = http_client.get('fileserver', self.url,
+                                   headers={'Range': f"bytes={offset}-{end}", 'Accept-Encoding': 'identity'})
+        self.requests += 1
+        if response.status_code == 416:
+            return b''
+        if response.status_code == 200:  # the server ignored the range
+            self.size = len(response.content)
+            data = response.content[offset:None if length is None else offset + length]
+        elif response.status_code == 206:
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+            data = response.content
+        else:
+            raise RuntimeError(f"HTTP {response.status_code} reading {self.url}")
+        self.bytes += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class FlatGeobuf:
+    """A FlatGeobuf file or URL, opened for bbox queries and full scans."""
+
+    def __init__(self, location):
+        if location.startswith(('http://', 'https://')):
+            self.source = HttpSource(location)
+        else:
+            self.source = LocalSource(location)
+        self.head = self.source.read(0, HEADER_PREFETCH)
+        if self.head[:3] != MAGIC[:3] or self.head[4:7] != MAGIC[4:7]:
+            raise ValueError(f"{location} is not a FlatGeobuf file")
+        header_size = _U32.unpack_from(self.head, 8)[0]
+        if len(self.head) < 12 + header_size:
+            self.head = self.source.read(0, 12 + header_size)
+        header = _Table.root(memoryview(self.head)[12:12 + header_size])
+        self.name = header.string(0)
+        self.envelope = header.vector(1, 'd') or None
+        self.geometry_type = header.scalar(2, 'B')
+        self.columns = [(column.string(0), column.scalar(1, 'B')) for column in header.tables(7)]
+        self.count = header.scalar(8, 'Q')
+        self.node_size = header.scalar(9, 'H', DEFAULT_NODE_SIZE)
+        crs = header.table(10)
+        self.crs_code = crs.scalar(1, 'i') if crs else 0
+        self.index_offset = 12 + header_size
+        index_size = 0
+        if self.node_size and self.count:
+            index_size = level_bounds(self.count, self.node_size)[0][1] * _NODE.size
+        self.features_offset = self.index_offset + index_size
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _read(self, offset, length=None):
+        if length is not None and offset + length <= len(self.head):
+            return self.head[offset:offset + length]
+        return self.source.read(offset, length)
+
+    def _search(self, min_x, min_y, max_x, max_y):
+        """Returns [(feature offset, length or None)] of the leaves whose box intersects, in file order."""
+        bounds = level_bounds(self.count, self.node_size)
+        ranges = [(0, 1)]
+        hits = []
+        for level in range(len(bounds) - 1, -1, -1):
+            level_end = bounds[level][1]
+            children = []
+            for start, end in _merge(ranges, MERGE_GAP // _NODE.size):
+                # at the leaves one node more gives the length of the last feature
+                read_end = min(end + 1, level_end) if level == 0 else end
+                data = self._read(self.index_offset + start * _NODE.size, (read_end - start) * _NODE.size)
+                nodes = list(_NODE.iter_unpack(data))
+                for i in range(end - start):
+                    x0, y0, x1, y1, offset = nodes[i]
+                    if x0 > max_x or y0 > max_y or x1 < min_x or y1 < min_y:
+                        continue
+                    if level == 0:
+                        hits.append((offset, nodes[i + 1][4] - offset if i + 1 < len(nodes) else None))
+                    else:
+                        children.append((offset, min(offset + self.node_size, bounds[level - 1][1])))
+            ranges = children
+        return hits
+
+    def _feature(self, buf):
+        feature = _Table.root(buf)
+        geometry = feature.table(0)
+        return {
+            'type': 'Feature',
+            'geometry': _decode_geometry(geometry, self.geometry_type) if geometry else None,
+            'properties': _decode_properties(feature.bytes(1), self.columns),
+        }
+
+    def query(self, min_x, min_y, max_x, max_y):
+        """Yields the features whose box intersects, in file coordinates."""
+        if not self.node_size:
+            for feature in self.scan():
+                xs, ys = _coordinates(feature['geometry'])
+                if xs and min(xs) <= max_x and max(xs) >= min_x and min(ys) <= max_y and max(ys) >= min_y:
+                    yield feature
+            return
+        if not self.count:
+            return
+        groups = []
+        for offset, length in self._search(min_x, min_y, max_x, max_y):
+            end = None if length is None else offset + length
+            if groups and groups[-1][1] is not None and offset <= groups[-1][1] + MERGE_GAP:
+                groups[-1][1] = end
+                groups[-1][2].append(offset)
+            else:
+                groups.append([offset, end, [offset]])
+        for start, end, offsets in groups:
+            data = self._read(self.features_offset + start, None if end is None else end - start)
+            for offset in offsets:
+                at = offset - start
+                size = _U32.unpack_from(data, at)[0]
+                yield self._feature(memoryview(data)[at + 4:at + 4 + size])
+
+    def query_wgs84(self, south, west, north, east):
+        """query() for a lat/lon box, converted to the CRS of the file (WGS84 or RD New)."""
+        if self.crs_code == 28992:
+            xs, ys = zip(*(rdnew.to_rd(lat, lon) for lat in (south, north) for lon in (west, east)))
+            return self.query(min(xs), min(ys), max(xs), max(ys))
+        return self.query(west, south, east, north)
+
+    def scan(self):
+        """Yields every feature in file order, reading SCAN_CHUNK bytes at a time."""
+        buffer, at, position = b'', 0, self.features_offset
+        while True:
+            if len(buffer) - at >= 4:
+                size = _U32.unpack_from(buffer, at)[0]
+                if len(buffer) - at >= 4 + size:
+                    yield self._feature(memoryview(buffer)[at + 4:at + 4 + size])
+                    at += 4 + size
+                    continue
+            chunk = self.source.read(position, SCAN_CHUNK)
+            if not chunk:
+                return
+            buffer, at = buffer[at:] + chunk, 0
+            position += len(chunk)
+
+
+def _decode_geometry(geometry, header_type):
+    geometry_type = geometry.scalar(6, 'B') or header_type
+    if geometry_type == MULTIPOLYGON:
+        return {'type': 'MultiPolygon',
+                'coordinates': [_decode_geometry(part, POLYGON)['coordinates'] for part in geometry.tables(7)]}
+    xy = geometry.vector(1, 'd')
+    points = [[xy[i], xy[i + 1]] for i in range(0, len(xy), 2)]
+    if geometry_type == POINT:
+        coordinates = points[0] if points else []
+    elif geometry_type in (LINESTRING, MULTIPOINT):
+        coordinates = points
+    else:
+        ends = geometry.vector(0, 'I') or (len(points),)
+        coordinates = [points[start:end] for start, end in zip((0,) + ends[:-1], ends)]
+    return {'type': GEOMETRY_NAMES.get(geometry_type, 'Unknown'), 'coordinates': coordinates}
+
+
+def _decode_properties(data, columns):
+    properties = {}
+    at = 0
+    while at < len(data):
+        index = struct.unpack_from('<H', data, at)[0]
+        name, column_type = columns[index]
+        at += 2
+        if column_type in _TEXT_TYPES or column_type == BINARY:
+            size = _U32.unpack_from(data, at)[0]
+            value = data[at + 4:at + 4 + size]
+            properties[name] = value if column_type == BINARY else value.decode('utf-8')
+            at += 4 + size
+        else:
+            fmt = '<' + _PROPERTY_FORMATS[column_type]
+            properties[name] = struct.unpack_from(fmt, data, at)[0]
+            at += struct.calcsize(fmt)
+    return properties
+
+
+def _coordinates(geometry):
+    """All x and all y values of a decoded geometry."""
+    xs, ys = [], []
+    stack = [geometry['coordinates']] if geometry else []
+    while stack:
+        value = stack.pop()
+        if value and isinstance(value[0], (int, float)):
+            xs.append(value[0])
+            ys.append(value[1])
+        else:
+            stack.extend(value)
+    return xs, ys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FlatGeobuf export with a packed Hilbert R-tree, and bbox reads.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write a snapshot/JSON or an output CSV to FlatGeobuf")
+    export.add_argument('input', help="snapshot (.osnap), Overpass/consolidate.py JSON or an output CSV")
+    export.add_argument('output')
+    export.add_argument('--store', default=config.STORE_DB_PATH, help="address fields for snapshot/JSON input")
+    export.add_argument('--rd', action='store_true', help="write RD New (EPSG:28992) instead of WGS84")
+    export.add_argument('--node-size', type=int, default=DEFAULT_NODE_SIZE, help="R-tree fan-out (0 = no index)")
+    query = commands.add_parser('query', help="print the features in a lat/lon box")
+    query.add_argument('location', help="file path or http(s) URL")
+    query.add_argument('--bbox', required=True, help="south,west,north,east")
+    query.add_argument('--csv', action='store_true', help="attributes as CSV instead of GeoJSON")
+    info = commands.add_parser('info', help="print the header")
+    info.add_argument('location', help="file path or http(s) URL")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        if args.input.lower().endswith('.csv'):
+            features, columns = features_from_csv(args.input, args.rd)
+        else:
+            features, columns = features_from_elements(args.input, args.store, args.rd)
+        count = write(args.output, features, columns, os.path.splitext(os.path.basename(args.output))[0],
+                      28992 if args.rd else 4326, args.node_size)
+        log(f"Wrote {count} features to {args.output} ({os.path.getsize(args.output)} bytes)")
+        return 0
+
+    with FlatGeobuf(args.location) as fgb:
+        if args.command == 'info':
+            print(json.dumps({'name': fgb.name, 'geometry_type': GEOMETRY_NAMES.get(fgb.geometry_type),
+                              'features': fgb.count, 'crs': f"EPSG:{fgb.crs_code}", 'envelope': fgb.envelope,
+                              'index_node_size': fgb.node_size, 'columns': fgb.columns}, indent=1))
+            return 0
+        south, west, north, east = (float(value) for value in args.bbox.split(','))
+        features = list(fgb.query_wgs84(south, west, north, east))
+        if args.csv:
+            writer = csv.DictWriter(sys.stdout, fieldnames=[name for name, _ in fgb.columns], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(feature['properties'] for feature in features)
+        else:
+            json.dump({'type': 'FeatureCollection', 'features': features}, sys.stdout, ensure_ascii=False)
+            print()
+        log(f"{len(features)} features in {fgb.source.requests} reads, {fgb.source.bytes} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,158 @@
+import threading
+import time
+import requests
+import http_client
+import nominatim_db
+from config import NOMINATIM_API_CONFIG, LOCATIONIQ_API_CONFIG
+
+MAX_RETRIES = 5
+BLOCKED_WAIT = 60  # seconds to back off per retry after HTTP 403/429
+LOOKUP_BATCH = 50  # maximum osm_ids per Nominatim /lookup request
+OSM_ID_PREFIXES = {'node': 'N', 'way': 'W', 'relation': 'R'}
+
+_errors = threading.local()
+
+
+def last_error():
+    """Why the last request of this thread returned None (e.g. 'timeout', 'HTTP 503'), or None."""
+    return getattr(_errors, 'reason', None)
+
+
+class RateLimiter:
+    """Spaces out request starts by a minimum interval, shared by all worker threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.waited = 0.0  # total seconds callers spent blocked here
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """Blocks until the next request may start and returns the time spent waiting."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+            delay = start - now
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+def address_fields(addr):
+    """Maps a Nominatim/LocationIQ 'address' object onto our output fields."""
+    return {
+        'street': addr.get('road', ''),
+        'huisnummer': addr.get('house_number', ''),
+        'postcode': addr.get('postcode', ''),
+        'city': addr.get('city', '') or addr.get('town', '') or addr.get('village', '') or addr.get('municipality', ''),
+        'country': addr.get('country', ''),
+        'province': addr.get('state', ''),
+    }
+
+
+def _get_json(provider, url, params, headers, limiter, label, subject):
+    """Shared request/retry loop. Returns the decoded JSON body or None (reason in last_error())."""
+    _errors.reason = None
+    for tries in range(MAX_RETRIES):
+        limiter.wait()
+        try:
+            resp = http_client.get(provider, url, params=params, headers=headers)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching address for {subject} from {label}: {e}")
+            _errors.reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else f"{type(e).__name__}: {e}"
+            return None
+        if resp.status_code == 200:
+            try:
+                return resp.json()
+            except ValueError:
+                print(f"Error decoding JSON for {subject} from {label}")
+                _errors.reason = 'invalid JSON'
+                return None
+        if resp.status_code in (403, 429):
+            wait_time = BLOCKED_WAIT * (tries + 1)
+            print(f"Blocked by {label} (HTTP {resp.status_code}). Waiting {wait_time} seconds and retrying...")
+            time.sleep(wait_time)
+            continue
+        print(f"Failed: HTTP {resp.status_code} from {label} for {subject}")
+        _errors.reason = f"HTTP {resp.status_code}"
+        return None
+    print(f"Skipped after {MAX_RETRIES} retries for {subject}")
+    _errors.reason = f"blocked (HTTP {resp.status_code}) after {MAX_RETRIES} retries"
+    return None
+
+
+def _get_address(provider, url, params, headers, limiter, label):
+    """Reverse lookup of one point. Returns the 'address' dict or None."""
+    data = _get_json(provider, url, params, headers, limiter, label, f"{params['lat']},{params['lon']}")
+    if data is None:
+        return None
+    return data.get('address', {})
+
+
+# One limiter per provider, shared by all threads in this process
+LIMITERS = {
+    'nominatim': RateLimiter(NOMINATIM_API_CONFIG['sleep_interval']),
+    'locationiq': RateLimiter(LOCATIONIQ_API_CONFIG['sleep_interval']),
+}
+
+
+def reverse_nominatim(latitude, longitude, zoom=None):
+    """Reverse geocodes one point with Nominatim (public or self-hosted, see config.py)."""
+    if latitude is None or longitude is None:
+        return None
+    params = {'format': 'jsonv2', 'lat': latitude, 'lon': longitude, 'addressdetails': 1}
+    if zoom is not None:
+        params['zoom'] = zoom
+    headers = {'User-Agent': NOMINATIM_API_CONFIG['user_agent']}
+    return _get_address('nominatim', f"{NOMINATIM_API_CONFIG['base_url']}/reverse", params, headers,
+                        LIMITERS['nominatim'], 'Nominatim')
+
+
+def reverse_locationiq(latitude, longitude, zoom=None):
+    """Reverse geocodes one point with LocationIQ."""
+    if latitude is None or longitude is None:
+        return None
+    params = {'key': LOCATIONIQ_API_CONFIG['api_key'], 'format': 'json',
+              'lat': latitude, 'lon': longitude, 'addressdetails': 1}
+    if zoom is not None:
+        params['zoom'] = zoom
+    return _get_address('locationiq', f"{LOCATIONIQ_API_CONFIG['base_url']}/reverse", params, {},
+                        LIMITERS['locationiq'], 'LocationIQ')
+
+
+def lookup_nominatim(keys):
+    """Looks up addresses by OSM id with Nominatim /lookup, LOOKUP_BATCH ids per request.
+
+    keys is a list of (osm_type, osm_id). Returns {(osm_type, osm_id): address dict} for
+    the ids Nominatim resolved; ids it does not know are left out, so callers can fall
+    back to a coordinate-based reverse lookup for them.
+    """
+    headers = {'User-Agent': NOMINATIM_API_CONFIG['user_agent']}
+    found = {}
+    for start in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[start:start + LOOKUP_BATCH]
+        osm_ids = ','.join(f"{OSM_ID_PREFIXES[osm_type]}{osm_id}" for osm_type, osm_id in batch
+                           if osm_type in OSM_ID_PREFIXES)
+        if not osm_ids:
+            continue
+        params = {'format': 'jsonv2', 'osm_ids': osm_ids, 'addressdetails': 1}
+        places = _get_json('nominatim', f"{NOMINATIM_API_CONFIG['base_url']}/lookup", params, headers,
+                           LIMITERS['nominatim'], 'Nominatim', f"{len(batch)} OSM ids")
+        for place in places or []:
+            if place.get('address') and place.get('osm_type') and place.get('osm_id') is not None:
+                found[(place['osm_type'], int(place['osm_id']))] = place['address']
+    return found
+
+
+PROVIDERS = {
+    'nominatim': reverse_nominatim,
+    'locationiq': reverse_locationiq,
+    'nominatim-db': nominatim_db.reverse_point,
+}
+
+# Providers that resolve a whole list of (lat, lon) points at once
+BULK_PROVIDERS = {
+    'nominatim-db': nominatim_db.reverse_many,
+}
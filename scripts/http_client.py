@@ -0,0 +1,114 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+# One pooled, keep-alive Session per host, shared by every script and worker thread.
+#
+# Opening a new TCP (and TLS) connection per request costs more than the request
+# itself against a nearby self-hosted Nominatim, so all provider calls go through
+# here instead of bare requests.get/requests.post.
+
+PROVIDER_CONFIGS = {
+    'overpass': config.OVERPASS_API_CONFIG,
+    'nominatim': config.NOMINATIM_API_CONFIG,
+    'locationiq': config.LOCATIONIQ_API_CONFIG,
+    'pdok': config.PDOK_API_CONFIG,
+}
+DEFAULT_TIMEOUT = 30
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'User-Agent': config.NOMINATIM_API_CONFIG['user_agent'],
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_hooks = []
+
+
+def add_hook(hook):
+    """Registers hook(event) to be called after every request.
+
+    event is a dict with provider, method, url, host, status (None on errors),
+    elapsed (seconds), bytes, and error (exception or None).
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def session_for(url):
+    """Returns the shared Session for the url's scheme and host, creating it on first use."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE, pool_block=False)
+                session.mount(key, adapter)
+                _sessions[key] = session
+    return session
+
+
+def timeout_for(provider):
+    """Returns the configured timeout for a provider from config.py."""
+    return PROVIDER_CONFIGS.get(provider, {}).get('timeout', DEFAULT_TIMEOUT)
+
+
+def request(provider, method, url, **kwargs):
+    """Sends a request through the pooled session for url's host and reports it to the hooks.
+
+    Accepts the same keyword arguments as requests.request. Exceptions are re-raised
+    after the hooks have seen them.
+    """
+    kwargs.setdefault('timeout', timeout_for(provider))
+    session = session_for(url)
+    started = time.perf_counter()
+    response = error = None
+    try:
+        response = session.request(method, url, **kwargs)
+        return response
+    except requests.exceptions.RequestException as e:
+        error = e
+        raise
+    finally:
+        if _hooks:
+            event = {
+                'provider': provider,
+                'method': method,
+                'url': url,
+                'host': urlsplit(url).netloc,
+                'status': response.status_code if response is not None else None,
+                'elapsed': time.perf_counter() - started,
+                'bytes': len(response.content) if response is not None and not kwargs.get('stream') else None,
+                'error': error,
+            }
+            for hook in list(_hooks):
+                hook(event)
+
+
+def get(provider, url, **kwargs):
+    return request(provider, 'GET', url, **kwargs)
+
+
+def post(provider, url, **kwargs):
+    return request(provider, 'POST', url, **kwargs)
+
+
+def close_all():
+    """Closes every pooled connection (e.g. at the end of a run)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
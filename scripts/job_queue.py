@@ -0,0 +1,493 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import aimd
+import config
+import geocode
+import http_client
+import spatial
+from store import SolarStore, utc_now
+
+# Durable geocoding work queue, kept in the store database so results and job state
+# are committed in one transaction.
+#
+# Workers lease batches of OSM elements for --lease seconds and heartbeat while they
+# work. A lease that runs out (worker killed, machine gone) is handed to the next
+# worker that asks. Every lease carries a token, and a result is only accepted
+# together with the token of a lease that is still live, so a worker that comes back
+# after its batch was re-leased cannot write it a second time.
+#
+# The database runs in WAL mode, so workers read while another one commits. WAL
+# needs all processes on the same host (no network shares): run the workers on the
+# machine that holds the store, e.g. next to the self-hosted Nominatim.
+#
+#   python job_queue.py enqueue
+#   python job_queue.py work --provider nominatim --threads 8     (start as many as you like)
+#   python job_queue.py status
+#
+# Jobs are leased in priority order, so a run that is cut short has spent its requests
+# where they add the most:
+#
+#   0  elements without any addr:* tag
+#   1  elements with some addr:* tags
+#   2  solar nodes already covered by a building (merged into one by consolidate.py,
+#      or within COVER_RADIUS of a building in the store)
+#   3  elements whose addr:* tags are complete
+#
+# With --time-budget and/or --max-requests a worker stops leasing when the budget is
+# spent, stores what it finished and hands the rest of its batch back. The queue is
+# the resumable state: the next run continues with the best remaining jobs.
+#
+#   python job_queue.py work --provider nominatim --threads 1 --time-budget 6h
+#
+# Within a priority, jobs are leased along a Hilbert curve over North Holland
+# (spatial.curve_key, stored per job), so a batch and the batches after it cover
+# neighbouring buildings and a self-hosted Nominatim keeps answering from warm pages.
+
+LEASE_SECONDS = 300
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+REQUIRED_FIELDS = ('street', 'huisnummer', 'postcode', 'city')
+ADDRESS_TAGS = ('addr:street', 'addr:housenumber', 'addr:postcode', 'addr:city')
+PRIORITY_NO_ADDRESS, PRIORITY_PARTIAL, PRIORITY_COVERED, PRIORITY_COMPLETE = range(4)
+PRIORITY_NAMES = {0: 'no address', 1: 'partial address', 2: 'covered by building', 3: 'complete tags'}
+COVER_RADIUS = 10  # metres from a building centre within which a solar node counts as covered
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    osm_type      TEXT    NOT NULL,
+    osm_id        INTEGER NOT NULL,
+    lat           REAL,
+    lon           REAL,
+    state         TEXT    NOT NULL DEFAULT 'pending',
+    priority      INTEGER NOT NULL DEFAULT 0,
+    curve         INTEGER,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_token   TEXT,
+    lease_expires REAL,
+    error         TEXT,
+    updated_at    TEXT,
+    PRIMARY KEY (osm_type, osm_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_by_token ON jobs (lease_token);
+CREATE INDEX IF NOT EXISTS jobs_by_lease_order ON jobs (state, priority, attempts, curve);
+"""
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def parse_duration(text):
+    """Parses '90', '90s', '45m' or '6h' into seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def curve_key(lat, lon):
+    """Lease order of a job within its priority: its position along a Hilbert curve over North Holland."""
+    if lat is None or lon is None:
+        return None
+    return spatial.curve_key(lat, lon, config.NORTH_HOLLAND_BBOX)
+
+
+def priority(tags, covered=False):
+    """Priority of an element from its addr:* tags; covered marks a solar node already covered by a building."""
+    present = sum(1 for tag in ADDRESS_TAGS if tags.get(tag))
+    if present == len(ADDRESS_TAGS):
+        return PRIORITY_COMPLETE
+    if covered:
+        return PRIORITY_COVERED
+    return PRIORITY_PARTIAL if present else PRIORITY_NO_ADDRESS
+
+
+def rank(conn, keys, radius=COVER_RADIUS):
+    """Returns {(osm_type, osm_id): priority} for the given keys, from the tags in the store."""
+    # Standalone nodes list their own id in node_ids; only buildings cover other nodes
+    covered = set()
+    for row in conn.execute("SELECT value FROM fields WHERE field = 'node_ids' AND osm_type != 'node'"):
+        covered.update(int(node_id) for node_id in row['value'].split(';') if node_id)
+    buildings = spatial.GridIndex()
+    elements = {}
+    for row in conn.execute("SELECT osm_type, osm_id, lat, lon, tags FROM elements"):
+        tags = json.loads(row['tags']) if row['tags'] else {}
+        elements[(row['osm_type'], row['osm_id'])] = (row['lat'], row['lon'], tags)
+        if row['osm_type'] != 'node' and 'building' in tags and row['lat'] is not None:
+            buildings.insert_point(row['osm_id'], row['lat'], row['lon'])
+
+    priorities = {}
+    for key in keys:
+        lat, lon, tags = elements.get(key, (None, None, {}))
+        priorities[key] = priority(tags, key[0] == 'node' and (
+            key[1] in covered or (lat is not None and bool(buildings.near(lat, lon, radius)))))
+    return priorities
+
+
+class JobQueue:
+    """Lease-based queue of elements to geocode, stored next to the results in SQLite.
+
+    One JobQueue per thread: it owns a sqlite3 connection.
+    """
+
+    def __init__(self, path=config.STORE_DB_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.store = SolarStore(path)
+        self.conn = self.store.conn
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Transactions are opened explicitly below (BEGIN IMMEDIATE takes the write lock
+        # up front, so two workers never lease the same rows)
+        self.conn.isolation_level = None
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def enqueue(self, jobs, retry=False, priorities=None):
+        """Adds (osm_type, osm_id, lat, lon) tuples. Jobs already queued are left alone,
+        except finished or failed ones when retry=True. Returns the number (re)queued.
+
+        priorities maps (osm_type, osm_id) to a priority (default PRIORITY_NO_ADDRESS).
+        """
+        now = utc_now()
+        priorities = priorities or {}
+        conflict = ("DO UPDATE SET state = 'pending', attempts = 0, error = NULL, lat = excluded.lat, "
+                    "lon = excluded.lon, priority = excluded.priority, curve = excluded.curve, "
+                    "updated_at = excluded.updated_at "
+                    "WHERE jobs.state IN ('done', 'failed')"
+                    if retry else "DO NOTHING")
+        added = 0
+        with self._transaction():
+            for osm_type, osm_id, lat, lon in jobs:
+                cursor = self.conn.execute(
+                    f"""INSERT INTO jobs (osm_type, osm_id, lat, lon, priority, curve, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (osm_type, osm_id) {conflict}""",
+                    (osm_type, osm_id, lat, lon, priorities.get((osm_type, osm_id), PRIORITY_NO_ADDRESS),
+                     curve_key(lat, lon), now))
+                added += cursor.rowcount
+        return added
+
+    def enqueue_missing(self, fields=REQUIRED_FIELDS, retry=False):
+        """Queues every element in the store that still lacks one of `fields`, ranked by rank()."""
+        jobs = list(self.store.missing(fields))
+        return self.enqueue(jobs, retry=retry, priorities=rank(self.conn, [(job[0], job[1]) for job in jobs]))
+
+    def prioritize(self):
+        """Ranks the pending jobs again (e.g. after consolidate.py or new tags). Returns {priority: count}."""
+        keys = [(row['osm_type'], row['osm_id'])
+                for row in self.conn.execute("SELECT osm_type, osm_id FROM jobs WHERE state = 'pending'")]
+        priorities = rank(self.conn, keys)
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE jobs SET priority = ? WHERE osm_type = ? AND osm_id = ? AND state = 'pending'",
+                [(value, *key) for key, value in priorities.items()])
+        counts = {}
+        for value in priorities.values():
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def requeue_expired(self):
+        """Returns jobs whose lease ran out to the pending state. Returns how many."""
+        with self._transaction():
+            return self._requeue_expired(time.time())
+
+    def _requeue_expired(self, now):
+        cursor = self.conn.execute(
+            """UPDATE jobs SET state = 'pending', lease_owner = NULL, lease_token = NULL, lease_expires = NULL
+               WHERE state = 'leased' AND lease_expires < ?""", (now,))
+        return cursor.rowcount
+
+    def lease(self, owner, size=BATCH_SIZE):
+        """Leases up to `size` pending jobs. Returns (token, [job dict, ...]); the list is empty when idle."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction():
+            self._requeue_expired(now)
+            rows = self.conn.execute(
+                """SELECT osm_type, osm_id, lat, lon, attempts FROM jobs WHERE state = 'pending'
+                   ORDER BY priority, attempts, curve, osm_type, osm_id LIMIT ?""", (size,)).fetchall()
+            self.conn.executemany(
+                """UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_token = ?,
+                       lease_expires = ?, updated_at = ?
+                   WHERE osm_type = ? AND osm_id = ?""",
+                [(owner, token, now + self.lease_seconds, utc_now(), row['osm_type'], row['osm_id']) for row in rows])
+        return token, [dict(row, attempts=row['attempts'] + 1) for row in rows]
+
+    def heartbeat(self, token):
+        """Extends a lease. Returns the number of jobs still held under it (0 = lease lost)."""
+        with self._transaction():
+            cursor = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE lease_token = ? AND state = 'leased'",
+                (time.time() + self.lease_seconds, token))
+            return cursor.rowcount
+
+    def complete(self, token, results, source):
+        """Stores the results of a leased batch and settles its jobs in one transaction.
+
+        results is a list of (job, fields, error): fields is the address dict on success,
+        None on failure. Failed jobs go back to pending until they reach max_attempts.
+        Results for jobs no longer held under `token` are dropped. Returns how many were accepted.
+        """
+        now = utc_now()
+        accepted = 0
+        with self._transaction():
+            for job, fields, error in results:
+                key = (job['osm_type'], job['osm_id'])
+                if fields is not None:
+                    cursor = self.conn.execute(
+                        """UPDATE jobs SET state = 'done', lease_owner = NULL, lease_token = NULL,
+                               lease_expires = NULL, error = NULL, updated_at = ?
+                           WHERE osm_type = ? AND osm_id = ? AND lease_token = ? AND state = 'leased'""",
+                        (now, *key, token))
+                    if cursor.rowcount:
+                        self.store.upsert_fields(*key, fields, source, now)
+                else:
+                    cursor = self.conn.execute(
+                        """UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                               lease_owner = NULL, lease_token = NULL, lease_expires = NULL, error = ?, updated_at = ?
+                           WHERE osm_type = ? AND osm_id = ? AND lease_token = ? AND state = 'leased'""",
+                        (self.max_attempts, error, now, *key, token))
+                accepted += cursor.rowcount
+        return accepted
+
+    def release(self, token):
+        """Hands unfinished jobs of a lease back without counting the attempt (clean shutdown)."""
+        with self._transaction():
+            cursor = self.conn.execute(
+                """UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL,
+                       lease_token = NULL, lease_expires = NULL
+                   WHERE lease_token = ? AND state = 'leased'""", (token,))
+            return cursor.rowcount
+
+    def stats(self):
+        """Returns {state: count}, with expired leases counted separately."""
+        counts = {'pending': 0, 'leased': 0, 'expired': 0, 'done': 0, 'failed': 0}
+        for row in self.conn.execute(
+                "SELECT state, lease_expires < ? AS expired, COUNT(*) AS n FROM jobs GROUP BY state, expired",
+                (time.time(),)):
+            state = 'expired' if row['state'] == 'leased' and row['expired'] else row['state']
+            counts[state] = counts.get(state, 0) + row['n']
+        return counts
+
+    def pending_by_priority(self):
+        """Returns {priority name: pending jobs}."""
+        return {PRIORITY_NAMES.get(row['priority'], row['priority']): row['n'] for row in self.conn.execute(
+            "SELECT priority, COUNT(*) AS n FROM jobs WHERE state = 'pending' GROUP BY priority ORDER BY priority")}
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class Worker:
+    """Leases batches, geocodes them with `threads` threads and heartbeats while they run.
+
+    time_budget (seconds) and max_requests bound the run; when either is spent the
+    worker finishes the request in flight, stores its results and requeues the rest.
+    """
+
+    def __init__(self, path=config.STORE_DB_PATH, provider='nominatim', threads=4, batch_size=BATCH_SIZE,
+                 lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, idle_exit=True, poll_interval=10,
+                 adaptive=False, time_budget=None, max_requests=None):
+        self.path = path
+        self.provider = provider
+        self.geocoder = geocode.PROVIDERS[provider]
+        self.threads = threads
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.idle_exit = idle_exit
+        self.poll_interval = poll_interval
+        self.controller = aimd.AimdController(provider, initial=min(4, threads), maximum=threads) if adaptive else None
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.time_budget = time_budget
+        self.max_requests = max_requests
+        self.deadline = None
+        self.stopped_by = None
+        self.stop = threading.Event()
+        self.counts = {'batches': 0, 'requests': 0, 'geocoded': 0, 'failed': 0, 'dropped': 0}
+        self._tokens = set()
+        self._lock = threading.Lock()
+
+    def _queue(self):
+        return JobQueue(self.path, self.lease_seconds, self.max_attempts)
+
+    def _heartbeat(self):
+        with self._queue() as jobs:
+            while not self.stop.wait(self.lease_seconds / 3):
+                with self._lock:
+                    tokens = list(self._tokens)
+                for token in tokens:
+                    if not jobs.heartbeat(token):
+                        log(f"Lease {token[:8]} lost (expired and requeued); its results will be dropped")
+
+    def _spent(self):
+        """Returns which budget is used up, or None. Call with self._lock held."""
+        if self.max_requests is not None and self.counts['requests'] >= self.max_requests:
+            return 'request budget'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'time budget'
+        return None
+
+    def _take_request(self):
+        """Counts one geocoder request against the budget. False once the budget is spent."""
+        with self._lock:
+            spent = self._spent()
+            if spent is None:
+                self.counts['requests'] += 1
+                return True
+            self.stopped_by = self.stopped_by or spent
+        self.stop.set()
+        return False
+
+    def _work(self, index):
+        owner = f"{self.name}/{index}"
+        with self._queue() as jobs:
+            while not self.stop.is_set():
+                with self._lock:
+                    spent = self._spent()
+                if spent is not None:
+                    self.stopped_by = self.stopped_by or spent
+                    self.stop.set()
+                    return
+                token, batch = jobs.lease(owner, self.batch_size)
+                if not batch:
+                    if self.idle_exit and not jobs.stats()['leased']:
+                        return
+                    self.stop.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self._tokens.add(token)
+                try:
+                    results = []
+                    for job in batch:
+                        if self.stop.is_set() or not self._take_request():
+                            break
+                        with self.controller.slot() if self.controller else contextlib.nullcontext():
+                            addr = self.geocoder(job['lat'], job['lon'])
+                        if addr is None:
+                            results.append((job, None, f"no address from {self.provider}"))
+                        else:
+                            results.append((job, geocode.address_fields(addr), None))
+                    accepted = jobs.complete(token, results, self.provider)
+                    jobs.release(token)
+                finally:
+                    with self._lock:
+                        self._tokens.discard(token)
+                succeeded = sum(1 for _, fields, _ in results if fields is not None)
+                with self._lock:
+                    self.counts['batches'] += 1
+                    self.counts['geocoded'] += succeeded
+                    self.counts['failed'] += len(results) - succeeded
+                    self.counts['dropped'] += len(results) - accepted
+                log(f"{owner}: batch of {len(batch)} done ({succeeded} geocoded, {len(results) - accepted} dropped)")
+
+    def run(self):
+        """Works until the queue is empty (or forever with idle_exit=False). Returns the counters."""
+        if self.controller is not None:
+            http_client.add_hook(self.controller.http_hook)
+        if self.time_budget is not None:
+            self.deadline = time.monotonic() + self.time_budget
+        heartbeat = threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True)
+        heartbeat.start()
+        threads = [threading.Thread(target=self._work, args=(i,), name=f'worker-{i}', daemon=True)
+                   for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            log("Interrupted, returning unfinished jobs to the queue...")
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        self.stop.set()
+        heartbeat.join()
+        if self.controller is not None:
+            http_client.remove_hook(self.controller.http_hook)
+            self.counts['concurrency'] = self.controller.limit
+        if self.stopped_by:
+            log(f"Stopped: {self.stopped_by} spent; the remaining jobs stay queued for the next run")
+        return self.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable geocoding queue shared by any number of worker processes.")
+    parser.add_argument('--store', default=config.STORE_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = commands.add_parser('enqueue', help="queue every stored element that is missing address fields")
+    enqueue.add_argument('--fields', nargs='+', default=list(REQUIRED_FIELDS))
+    enqueue.add_argument('--retry', action='store_true', help="also requeue jobs that are done or failed")
+
+    work = commands.add_parser('work', help="lease and geocode batches until the queue is empty")
+    work.add_argument('--provider', choices=sorted(geocode.PROVIDERS), default='nominatim')
+    work.add_argument('--threads', type=int, default=4, help="concurrent requests in this process")
+    work.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    work.add_argument('--lease', type=float, default=LEASE_SECONDS, help="seconds before an unfinished batch is requeued")
+    work.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    work.add_argument('--adaptive', action='store_true',
+                      help="tune requests in flight (up to --threads) from latency and error rate")
+    work.add_argument('--follow', action='store_true', help="keep polling for new jobs instead of exiting when idle")
+    work.add_argument('--time-budget', type=parse_duration, metavar='DURATION',
+                      help="stop leasing after this long, e.g. 5400, 90m or 6h")
+    work.add_argument('--max-requests', type=int, help="stop after this many geocoder requests")
+
+    commands.add_parser('status', help="show job counts per state")
+    commands.add_parser('prioritize', help="rank the pending jobs again from the current store")
+    commands.add_parser('requeue-expired', help="return jobs with expired leases to the queue now")
+    args = parser.parse_args()
+
+    if args.command == 'work':
+        worker = Worker(args.store, args.provider, args.threads, args.batch_size, args.lease, args.max_attempts,
+                        idle_exit=not args.follow, adaptive=args.adaptive, time_budget=args.time_budget,
+                        max_requests=args.max_requests)
+        log(f"Worker {worker.name} started ({args.threads} threads, provider {args.provider})")
+        log(f"Worker finished: {worker.run()}")
+        return 0
+
+    with JobQueue(args.store) as jobs:
+        if args.command == 'enqueue':
+            log(f"Queued {jobs.enqueue_missing(args.fields, retry=args.retry)} jobs")
+        elif args.command == 'requeue-expired':
+            log(f"Requeued {jobs.requeue_expired()} jobs with expired leases")
+        elif args.command == 'prioritize':
+            jobs.prioritize()
+        log(f"Queue: {jobs.stats()}")
+        log(f"Pending by priority: {jobs.pending_by_priority()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+
+# Counters, gauges and latency histograms shared by the fetch, geocode and export stages.
+#
+# Metrics are written as JSON and in the Prometheus text format (so node_exporter's
+# textfile collector or a quick `cat` both work) at the end of every run, and
+# periodically while it is going.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HELP = {
+    'http_requests_total': 'HTTP requests by provider and status code',
+    'http_request_seconds': 'HTTP request latency by provider',
+    'http_response_bytes_total': 'Response body bytes by provider',
+    'cache_lookups_total': 'Cache lookups by cache and result (hit/miss)',
+    'cache_hit_ratio': 'Hits / lookups per cache',
+    'rate_limiter_wait_seconds': 'Total time workers spent waiting for the rate limiter',
+    'stage_items_total': 'Items processed per pipeline stage',
+    'stage_item_seconds': 'Time spent per item in each pipeline stage',
+    'rows_total': 'Rows exported',
+    'rows_per_second': 'Rows exported per second since the run started',
+    'run_seconds': 'Seconds since the run started',
+    'queue_depth': 'Items waiting in each queue between pipeline stages',
+    'concurrency_limit': 'Requests allowed in flight per provider (adaptive concurrency)',
+    'concurrency_in_flight': 'Requests in flight per provider (adaptive concurrency)',
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Estimates a quantile from the buckets (upper bound of the bucket it falls in)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms with labels."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        """Context manager that observes the time spent inside it."""
+        return _Timer(self, name, labels)
+
+    def cache(self, cache, hit):
+        self.inc('cache_lookups_total', cache=cache, result='hit' if hit else 'miss')
+
+    def add_collector(self, collector):
+        """Registers collector(metrics), called right before every write to refresh gauges."""
+        self._collectors.append(collector)
+
+    def http_hook(self, event):
+        """Hook for http_client.add_hook: request counts, status codes, latency and bytes."""
+        status = str(event['status']) if event['status'] is not None else 'error'
+        self.inc('http_requests_total', provider=event['provider'], status=status)
+        self.observe('http_request_seconds', event['elapsed'], provider=event['provider'])
+        if event.get('bytes'):
+            self.inc('http_response_bytes_total', event['bytes'], provider=event['provider'])
+
+    def _refresh(self):
+        for collector in self._collectors:
+            collector(self)
+        elapsed = time.monotonic() - self.started
+        self.set('run_seconds', round(elapsed, 3))
+        with self._lock:
+            rows = sum(value for (name, _), value in self.counters.items() if name == 'rows_total')
+            lookups = {}
+            for (name, labels), value in self.counters.items():
+                if name == 'cache_lookups_total':
+                    labels = dict(labels)
+                    hits, total = lookups.get(labels['cache'], (0, 0))
+                    lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+        self.set('rows_per_second', round(rows / elapsed, 3) if elapsed > 0 else 0)
+        for cache, (hits, total) in lookups.items():
+            self.set('cache_hit_ratio', round(hits / total, 4) if total else 0, cache=cache)
+
+    def to_dict(self):
+        """Returns all metrics as plain data, with p50/p95/p99 estimates for histograms."""
+        self._refresh()
+        with self._lock:
+            def series(items):
+                return [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(items)]
+            histograms = []
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.append({
+                    'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': round(histogram.sum, 6),
+                    'p50': histogram.quantile(0.50), 'p95': histogram.quantile(0.95), 'p99': histogram.quantile(0.99),
+                    'buckets': {str(bound): total for bound, total in histogram.cumulative()},
+                })
+            return {'counters': series(self.counters.items()), 'gauges': series(self.gauges.items()),
+                    'histograms': histograms}
+
+    def to_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        self._refresh()
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, 'counter')
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                header(name, 'gauge')
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                header(name, 'histogram')
+                for bound, total in histogram.cumulative():
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {total}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path_prefix):
+        """Writes <prefix>.metrics.json and <prefix>.metrics.prom (atomically, so readers never see half a file)."""
+        _write_atomic(f"{path_prefix}.metrics.json", json.dumps(self.to_dict(), indent=2))
+        _write_atomic(f"{path_prefix}.metrics.prom", self.to_prometheus())
+
+    def start_periodic(self, path_prefix, interval=30):
+        """Writes the metrics files every `interval` seconds until stop_periodic()."""
+        def loop():
+            while not self._stop.wait(interval):
+                self.write(path_prefix)
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='metrics-writer', daemon=True)
+        self._thread.start()
+
+    def stop_periodic(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,329 @@
+import csv
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import config
+import geocode
+import snapshot
+
+# Local stand-ins for Overpass, Nominatim, LocationIQ and PDOK, used by benchmark.py.
+#
+# They serve fixtures derived from the files in Output/ and pdok_ui_test1.json, and can
+# add latency, jitter, 429 rate limiting and random failures so fetch and geocode
+# strategies can be compared without touching the public APIs.
+
+OVERPASS_FIXTURE = os.path.join(config.OUTPUT_DIR, 'north_holland_solar_1000.osnap')
+ADDRESS_FIXTURE = os.path.join(config.OUTPUT_DIR, 'north_holland_solar_1000_locationiq.csv')
+PDOK_FIXTURE = os.path.join(config.BASE_DIR, 'pdok_ui_test1.json')
+
+
+class MockSettings:
+    """Behaviour of one mock server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=None, failure_rate=0.0, stream_rate=None, seed=None,
+                 slots=None):
+        self.latency = latency            # seconds added to every response
+        self.jitter = jitter              # +/- uniform random seconds on top of latency
+        self.rate_limit = rate_limit      # max requests/second before answering 429 (None = unlimited)
+        self.failure_rate = failure_rate  # fraction of requests answered with HTTP 503
+        self.stream_rate = stream_rate    # Overpass only: elements/second sent (None = as fast as possible)
+        self.slots = slots                # Overpass only: concurrent queries before answering 429 (None = unlimited)
+        self.running = 0
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = []
+
+    def delay(self):
+        with self._lock:
+            value = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, value)
+
+    def rate_limited(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                return True
+            self._window.append(now)
+        return False
+
+    def take_slot(self):
+        with self._lock:
+            if self.slots and self.running >= self.slots:
+                return False
+            self.running += 1
+            return True
+
+    def free_slot(self):
+        with self._lock:
+            self.running -= 1
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.failure_rate
+
+
+def load_addresses(path=ADDRESS_FIXTURE):
+    """Returns {(lat, lon): Nominatim-style address dict} from an earlier geocoding run."""
+    addresses = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            addresses[(round(float(row['Latitude']), 7), round(float(row['Longitude']), 7))] = {
+                'road': row['street'],
+                'house_number': row['huisnummer'],
+                'postcode': row['postcode'],
+                'city': row['city'],
+                'country': row['Country'],
+                'state': row['Province'],
+                'country_code': 'nl',
+            }
+    return addresses
+
+
+def load_elements(path=OVERPASS_FIXTURE, scale=1):
+    """Returns the fixture elements, repeated `scale` times with shifted ids for bigger runs."""
+    base = snapshot.load_elements(snapshot.input_path(path))
+    elements = []
+    for copy in range(scale):
+        for element in base:
+            elements.append(dict(element, id=element['id'] + copy * 10 ** 12) if copy else element)
+    return elements
+
+
+class MockState:
+    """Fixtures shared by all handlers."""
+
+    def __init__(self, scale=1):
+        self.elements = load_elements(scale=scale)
+        self.addresses = load_addresses()
+        self.by_key = {(element['type'], element['id']): element for element in self.elements}
+        with open(PDOK_FIXTURE, encoding='utf-8') as f:
+            self.pdok = json.load(f)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def address_for(self, lat, lon):
+        address = self.addresses.get((round(lat, 7), round(lon, 7)))
+        if address is None:
+            # Unknown point: answer with a deterministic placeholder so lookups still succeed
+            address = {'road': f"Teststraat {int(abs(lat * 1000)) % 97}", 'house_number': str(int(abs(lon * 1e5)) % 200 + 1),
+                       'postcode': '1000 AA', 'city': 'Amsterdam', 'country': 'Nederland', 'state': 'Noord-Holland',
+                       'country_code': 'nl'}
+        return address
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled clients behave as they do in production
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid delayed-ACK stalls
+    service = None
+    settings = None
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _gate(self):
+        """Applies rate limiting, failures and latency. Returns False if the request was answered."""
+        self.state.count()
+        if self.settings.rate_limited():
+            self._send_json(429, {'error': 'Rate limited'})
+            return False
+        time.sleep(self.settings.delay())
+        if self.settings.should_fail():
+            self._send_json(503, {'error': 'Service unavailable'})
+            return False
+        return True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if not self._gate():
+            return
+        handler = getattr(self, f"get_{self.service}", None)
+        if handler is None:
+            self._send_json(404, {'error': 'Not found'})
+        else:
+            handler(parts.path, params)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        if not self._gate():
+            return
+        if self.service == 'overpass' and urlsplit(self.path).path.endswith('/interpreter'):
+            query = parse_qs(body).get('data', [''])[0]
+            if not self.settings.take_slot():
+                self._send_json(429, {'error': 'Too many requests'})
+                return
+            try:
+                self.post_overpass(query)
+            finally:
+                self.settings.free_slot()
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    # Services
+
+    def post_overpass(self, query):
+        # Like the real server, every limited output statement returns up to its own limit
+        limits = re.findall(r'out[^;]*?\s(\d+)\s*;', query)
+        elements = self.state.elements[:sum(int(n) for n in limits)] if limits else self.state.elements
+        head = json.dumps({'version': 0.6, 'generator': 'mock Overpass',
+                           'osm3s': {'timestamp_osm_base': '2025-05-16T02:56:20Z'}})[:-1]
+
+        # Chunked transfer, like the real server, so streaming clients see elements early
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._write_chunk(head + ',\n"elements": [\n')
+        batch = []
+        for i, element in enumerate(elements):
+            batch.append(('' if i == 0 else ',\n') + json.dumps(element, ensure_ascii=False))
+            if len(batch) == 200:
+                self._write_chunk(''.join(batch))
+                batch = []
+                if self.settings.stream_rate:
+                    time.sleep(200 / self.settings.stream_rate)
+        self._write_chunk(''.join(batch) + '\n]\n}\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+
+    def get_overpass(self, path, params):
+        if path.endswith('/status'):
+            slots = self.settings.slots or 0
+            running = self.settings.running
+            lines = ["Connected as: 127.0.0.1", "Current time: 2025-05-16T03:00:00Z", f"Rate limit: {slots}"]
+            if slots and running < slots:
+                lines.append(f"{slots - running} slots available now.")
+            lines += ["Slot available after: 2025-05-16T03:00:01Z, in 1 seconds."] * min(running, slots)
+            lines.append("Currently running queries (pid, space limit, time limit, start time):")
+            lines += [f"{1000 + i}\t536870912\t180\t2025-05-16T02:59:59Z" for i in range(running)]
+            body = ('\n'.join(lines) + '\n').encode('ascii')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def get_nominatim(self, path, params):
+        if path.endswith('/reverse'):
+            lat, lon = float(params['lat']), float(params['lon'])
+            self._send_json(200, {'lat': str(lat), 'lon': str(lon), 'address': self.state.address_for(lat, lon)})
+        elif path.endswith('/lookup'):
+            # Like Nominatim, only elements it indexes as places resolve: buildings (ways,
+            # relations) and nodes with address tags. Bare generator nodes are left out.
+            places = []
+            types = {'N': 'node', 'W': 'way', 'R': 'relation'}
+            for osm_id in params.get('osm_ids', '').split(',')[:50]:
+                key = (types.get(osm_id[:1].upper()), int(osm_id[1:]) if osm_id[1:].isdigit() else None)
+                element = self.state.by_key.get(key)
+                if element is None or (key[0] == 'node' and 'addr:street' not in element.get('tags', {})):
+                    continue
+                center = element.get('center') or element
+                places.append({'osm_type': key[0], 'osm_id': key[1], 'lat': str(center['lat']),
+                               'lon': str(center['lon']),
+                               'address': self.state.address_for(center['lat'], center['lon'])})
+            self._send_json(200, places)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def get_locationiq(self, path, params):
+        if path.endswith('/reverse'):
+            if not params.get('key'):
+                self._send_json(401, {'error': 'Invalid key'})
+                return
+            lat, lon = float(params['lat']), float(params['lon'])
+            self._send_json(200, {'lat': str(lat), 'lon': str(lon), 'address': self.state.address_for(lat, lon)})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def get_pdok(self, path, params):
+        if path.endswith('/free') or path.endswith('/reverse') or path.endswith('/suggest'):
+            self._send_json(200, self.state.pdok)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+
+class MockServer:
+    """One mock service on a free localhost port, served from a background thread."""
+
+    def __init__(self, service, state, settings=None):
+        handler = type(f"{service.title()}Handler", (MockHandler,),
+                       {'service': service, 'settings': settings or MockSettings(), 'state': state})
+        self.service = service
+        self.settings = handler.settings
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=f"mock-{service}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_mock_servers(settings=None, scale=1):
+    """Starts all four mock services. settings maps service name to MockSettings."""
+    settings = settings or {}
+    state = MockState(scale=scale)
+    return {service: MockServer(service, state, settings.get(service)).start()
+            for service in ('overpass', 'nominatim', 'locationiq', 'pdok')}
+
+
+def point_config_at(urls):
+    """Redirects the provider settings in config.py to the mock servers (in this process).
+
+    urls maps service name to base url, e.g. {name: server.url for name, server in servers.items()}.
+    """
+    config.OVERPASS_API_CONFIG['url'] = f"{urls['overpass']}/api/interpreter"
+    config.NOMINATIM_API_CONFIG['base_url'] = urls['nominatim']
+    config.NOMINATIM_API_CONFIG['sleep_interval'] = 0
+    config.LOCATIONIQ_API_CONFIG['base_url'] = f"{urls['locationiq']}/v1"
+    config.LOCATIONIQ_API_CONFIG['sleep_interval'] = 0
+    config.PDOK_API_CONFIG['base_url'] = f"{urls['pdok']}/bzk/locatieserver/search/v3_1"
+    for limiter in geocode.LIMITERS.values():
+        limiter.interval = 0
+
+
+if __name__ == "__main__":
+    servers = start_mock_servers()
+    for name, server in servers.items():
+        print(f"{name:<10} {server.url}")
+    print("Mock servers running, press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.stop()
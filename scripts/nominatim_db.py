@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import threading
+import time
+import config
+from store import SolarStore
+
+try:
+    import psycopg2
+except ImportError:  # only needed for this backend
+    psycopg2 = None
+
+# Bulk reverse geocoding straight from the PostgreSQL database of a self-hosted Nominatim.
+#
+# A batch of points is passed as two coordinate arrays and resolved with one set-based
+# query (unnest ... WITH ORDINALITY, so the read-only session never writes): a KNN
+# search on placex finds the nearest addressable place for every point, and
+# Nominatim's own get_addressdata() builds its address hierarchy. The result has
+# the same shape as the 'address' object of /reverse (road, house_number, postcode,
+# city/town/village, state, country, country_code), so geocode.address_fields() and
+# everything after it work unchanged.
+#
+#   python nominatim_db.py enrich              fill missing addresses in the store
+#   pipeline.py --provider nominatim-db        use it as the pipeline's geocoder
+#
+# Needs psycopg2 (pip install psycopg2-binary) and access to the database, see
+# NOMINATIM_DB_CONFIG in config.py.
+
+# Highest address rank to consider per zoom level, as in Nominatim's /reverse. Places are
+# searched from rank 26 (streets) up, or from that rank alone below zoom 16
+ZOOM_RANKS = {18: 30, 17: 27, 16: 26, 15: 25, 14: 22, 13: 18, 12: 18, 11: 17, 10: 16}
+DEFAULT_ZOOM = 18
+
+PLACE_KEYS = ('city', 'town', 'village', 'hamlet', 'suburb', 'neighbourhood', 'quarter', 'isolated_dwelling')
+ADMIN_KEYS = {2: 'country', 4: 'state', 8: 'municipality', 10: 'suburb'}
+
+REVERSE_SQL = """
+WITH solar_points AS (
+    SELECT idx - 1 AS idx, ST_SetSRID(ST_MakePoint(lon, lat), 4326) AS geom
+    FROM unnest(%(lats)s::float8[], %(lons)s::float8[]) WITH ORDINALITY AS t(lat, lon, idx)
+    WHERE lat IS NOT NULL AND lon IS NOT NULL
+),
+nearest AS (
+    SELECT p.idx, x.place_id
+    FROM solar_points p
+    CROSS JOIN LATERAL (
+        SELECT place_id FROM placex
+        WHERE ST_DWithin(geometry, p.geom, %(radius)s)
+          AND rank_address BETWEEN LEAST(26, %(max_rank)s) AND %(max_rank)s
+          AND linked_place_id IS NULL AND indexed_status = 0
+          AND (name IS NOT NULL OR housenumber IS NOT NULL OR address IS NOT NULL)
+        ORDER BY geometry <-> p.geom, rank_address DESC
+        LIMIT 1
+    ) x
+)
+SELECT n.idx, a.class, a.type, a.admin_level, a.rank_address,
+       COALESCE(a.name -> 'name:nl', a.name -> 'name', a.name -> 'ref') AS label
+FROM nearest n
+CROSS JOIN LATERAL get_addressdata(n.place_id, -1) a
+WHERE a.isaddress
+ORDER BY n.idx, a.rank_address DESC
+"""
+
+_local = threading.local()
+
+
+def connect(dsn=None):
+    """Returns this thread's connection to the Nominatim database (opened on first use)."""
+    if psycopg2 is None:
+        raise RuntimeError("the nominatim-db backend needs psycopg2 (pip install psycopg2-binary)")
+    conn = getattr(_local, 'conn', None)
+    if conn is None or conn.closed:
+        conn = _local.conn = psycopg2.connect(dsn or config.NOMINATIM_DB_CONFIG['dsn'])
+        conn.set_session(readonly=True)
+    return conn
+
+
+def _address(rows):
+    """Turns get_addressdata() rows (most specific first) into a /reverse style address dict."""
+    address = {}
+    for place_class, place_type, admin_level, rank, label in rows:
+        if not label:
+            continue
+        if place_class == 'place' and place_type in ('house_number', 'postcode', 'country_code', 'country'):
+            key = place_type
+        elif rank in (26, 27):
+            key = 'road'
+        elif place_class == 'place' and place_type in PLACE_KEYS:
+            key = place_type
+        elif place_class == 'boundary' and place_type == 'administrative':
+            key = ADMIN_KEYS.get(admin_level)
+        else:
+            key = None
+        if key:
+            address.setdefault(key, label.lower() if key == 'country_code' else label)
+    return address
+
+
+def reverse_many(points, zoom=DEFAULT_ZOOM, conn=None):
+    """Reverse geocodes a list of (lat, lon) points with one query.
+
+    Returns a list of address dicts (None where nothing was found), in the order of points.
+    """
+    conn = conn or connect()
+    results = [None] * len(points)
+    lats = [lat for lat, _ in points]
+    lons = [lon for _, lon in points]
+
+    with conn, conn.cursor() as cursor:
+        cursor.execute(REVERSE_SQL, {'lats': lats, 'lons': lons,
+                                     'radius': config.NOMINATIM_DB_CONFIG['radius'],
+                                     'max_rank': ZOOM_RANKS.get(zoom, 30)})
+        current = None
+        rows = []
+        for idx, *row in cursor:
+            if idx != current:
+                if rows:
+                    results[current] = _address(rows)
+                current, rows = idx, []
+            rows.append(row)
+        if rows:
+            results[current] = _address(rows)
+    return results
+
+
+def reverse_point(latitude, longitude, zoom=None):
+    """Single-point provider with the signature of geocode.reverse_nominatim."""
+    if latitude is None or longitude is None:
+        return None
+    return reverse_many([(latitude, longitude)], zoom or DEFAULT_ZOOM)[0]
+
+
+def enrich_store(store_path=config.STORE_DB_PATH, fields=('street', 'huisnummer', 'postcode', 'city'),
+                 batch_size=None, zoom=DEFAULT_ZOOM):
+    """Fills the store's missing address fields, one query per batch. Returns (resolved, total)."""
+    import geocode
+    batch_size = batch_size or config.NOMINATIM_DB_CONFIG['batch_size']
+    resolved = total = 0
+    with SolarStore(store_path) as solar_store:
+        todo = list(solar_store.missing(fields))
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            started = time.monotonic()
+            addresses = reverse_many([(lat, lon) for _, _, lat, lon in batch], zoom)
+            with solar_store.conn:
+                for (osm_type, osm_id, _, _), addr in zip(batch, addresses):
+                    if addr:
+                        solar_store.upsert_fields(osm_type, osm_id, geocode.address_fields(addr), 'nominatim-db')
+                        resolved += 1
+            total += len(batch)
+            print(f"[{datetime.datetime.now()}] {total}/{len(todo)} points, {resolved} resolved "
+                  f"(last batch {time.monotonic() - started:.1f}s)")
+    return resolved, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk reverse geocoding against the Nominatim PostgreSQL database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    enrich = commands.add_parser('enrich', help="fill missing addresses of the elements in the store")
+    enrich.add_argument('--store', default=config.STORE_DB_PATH)
+    enrich.add_argument('--batch-size', type=int, default=config.NOMINATIM_DB_CONFIG['batch_size'])
+    enrich.add_argument('--zoom', type=int, default=DEFAULT_ZOOM)
+    reverse = commands.add_parser('reverse', help="reverse geocode one point")
+    reverse.add_argument('lat', type=float)
+    reverse.add_argument('lon', type=float)
+    args = parser.parse_args()
+
+    if args.command == 'reverse':
+        print(reverse_point(args.lat, args.lon))
+    else:
+        resolved, total = enrich_store(args.store, batch_size=args.batch_size, zoom=args.zoom)
+        print(f"Resolved {resolved} of {total} points")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+import codecs
+import json
+import http_client
+import overpass_query
+import overpass_status
+from config import OVERPASS_API_CONFIG
+
+MAX_SLOT_RETRIES = 3  # 429 answers tolerated per query before giving up
+
+
+def solar_query(limit=None, timeout=None, bbox=None):
+    """Returns the North Holland solar query used by 00/02, optionally limited to N elements
+    or to a (south, west, north, east) tile."""
+    return overpass_query.SOLAR.build(timeout=timeout, limit=limit, bbox=bbox)
+
+
+class OverpassError(Exception):
+    pass
+
+
+def iter_json_elements(chunks, meta=None):
+    """Yields the objects of the "elements" array from an Overpass JSON text stream.
+
+    Elements are decoded as soon as they are complete, so callers can start on
+    the first results while the rest of the response is still downloading.
+    The fields before the array (version, osm3s, ...) are stored into `meta`.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    in_elements = False
+    tail = ''
+
+    for chunk in chunks:
+        if not in_elements:
+            buffer += chunk
+            start = buffer.find('"elements"')
+            if start < 0:
+                continue
+            bracket = buffer.find('[', start)
+            if bracket < 0:
+                continue
+            if meta is not None:
+                head = buffer[:start].rstrip().rstrip(',') + '}'
+                try:
+                    meta.update(json.loads(head))
+                except ValueError:
+                    pass
+            in_elements = True
+            buffer = buffer[bracket + 1:]
+            pos = 0
+        elif tail:
+            tail += chunk
+            continue
+        else:
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        size = len(buffer)
+        while True:
+            while pos < size and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= size:
+                break
+            if buffer[pos] == ']':
+                tail = buffer[pos + 1:] or ' '
+                break
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # incomplete element, wait for more data
+            yield element
+
+    if not in_elements:
+        raise OverpassError(f"No elements array in Overpass response: {buffer[:500]}")
+    if not tail:
+        raise OverpassError("Overpass response ended before the elements array was complete")
+    if '"remark"' in tail:
+        # Overpass reports timeouts and memory errors after the (partial) result
+        remark = tail[tail.find('"remark"'):].split('\n')[0]
+        raise OverpassError(f"Overpass returned a partial result: {remark}")
+
+
+def stream_elements(query, url=None, timeout=None, meta=None, wait_for_slot=True):
+    """Posts a query to Overpass and yields elements while the response streams in.
+
+    With wait_for_slot the query is held back until the server's /api/status shows a
+    free slot, and a 429 sends it back to wait instead of failing (see overpass_status.py).
+    """
+    url = url or OVERPASS_API_CONFIG['url']
+    timeout = timeout or http_client.timeout_for('overpass')
+    gate = overpass_status.gate_for(url) if wait_for_slot else None
+    for tries in range(MAX_SLOT_RETRIES):
+        if gate is not None:
+            gate.acquire()
+        try:
+            response = http_client.post('overpass', url, data={'data': query}, timeout=timeout, stream=True)
+            with response:
+                if response.status_code == 429 and gate is not None and tries < MAX_SLOT_RETRIES - 1:
+                    print(f"Overpass at {url} answered 429, waiting for a free slot")
+                    continue
+                response.raise_for_status()
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size=64 * 1024))
+                yield from iter_json_elements(chunks, meta)
+                return
+        finally:
+            if gate is not None:
+                gate.release()
+
+
+def fetch_geometries(way_ids, url=None, batch_size=overpass_query.GEOMETRY_BATCH):
+    """Fetches the full geometry of the given ways. Returns {way id: [(lat, lon), ...]}."""
+    way_ids = sorted(set(way_ids))
+    geometries = {}
+    for start in range(0, len(way_ids), batch_size):
+        query = overpass_query.geometry_query(way_ids[start:start + batch_size])
+        for element in stream_elements(query, url):
+            if element.get('geometry'):
+                geometries[element['id']] = [(point['lat'], point['lon']) for point in element['geometry']]
+    return geometries
+
+
+def needs_geometry(element):
+    """Default for attach_geometry: ways that are (or sit on) buildings, where area and containment matter."""
+    return element.get('type') == 'way' and 'building' in element.get('tags', {})
+
+
+def attach_geometry(elements, predicate=needs_geometry, url=None):
+    """Adds a 'geometry' list to the elements that need one, with one lazy query per batch of ways.
+
+    Works on a list (elements are updated in place and returned) for specs built with
+    needs={'geometry', ...}: the main query only ships centres.
+    """
+    wanted = [element['id'] for element in elements if predicate(element)]
+    if not wanted:
+        return elements
+    geometries = fetch_geometries(wanted, url)
+    for element in elements:
+        if element.get('type') == 'way' and element['id'] in geometries:
+            element['geometry'] = [{'lat': lat, 'lon': lon} for lat, lon in geometries[element['id']]]
+    return elements
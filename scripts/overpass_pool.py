@@ -0,0 +1,343 @@
+import argparse
+import concurrent.futures
+import datetime
+import statistics
+import threading
+import time
+import aimd
+import config
+import overpass
+import overpass_status
+import snapshot
+
+# Tiled Overpass fetches spread over several endpoints (config.OVERPASS_ENDPOINTS).
+#
+# Each tile goes to the endpoint with the most spare capacity for its weight, and only
+# when that endpoint's /api/status shows a free slot, so parallel tiles stay inside the
+# server's quota (see overpass_status.py). A 429 puts the tile back in line without
+# using up one of its attempts, up to max_rate_limited times per tile. Endpoints
+# that fail are benched for a while (30s, doubling per consecutive failure). A tile that
+# is still running after the hedge threshold is sent to a second endpoint as well; the
+# first complete answer wins and the other request is dropped, so one slow mirror does
+# not hold up the whole run.
+#
+# Before merging, the osm_base timestamps of all tiles are compared. Tiles more than
+# max_base_skew behind the newest one are fetched again from an endpoint that is up to
+# date; if that does not help the fetch fails rather than mixing data of different ages.
+# The merged result is deduplicated (ways crossing a tile border come back twice) and
+# ordered by type and id like a single Overpass response.
+#
+#   python overpass_pool.py --tiles 4x4 --output Output/north_holland_solar.osnap
+
+_TYPE_ORDER = {'node': 0, 'way': 1, 'relation': 2}
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def tiles(bbox=config.NORTH_HOLLAND_BBOX, rows=4, cols=4):
+    """Splits (south, west, north, east) into rows x cols tiles."""
+    south, west, north, east = bbox
+    height = (north - south) / rows
+    width = (east - west) / cols
+    return [(round(south + r * height, 6), round(west + c * width, 6),
+             round(south + (r + 1) * height, 6), round(west + (c + 1) * width, 6))
+            for r in range(rows) for c in range(cols)]
+
+
+def osm_base_time(meta):
+    value = (meta.get('osm3s') or {}).get('timestamp_osm_base')
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
+
+
+class Endpoint:
+    """One Overpass server with its weight, capacity and health."""
+
+    def __init__(self, url, weight=1, max_parallel=2, adaptive=False):
+        self.url = url
+        self.weight = weight
+        self.max_parallel = max_parallel
+        self.controller = aimd.AimdController(url, initial=max_parallel, maximum=max_parallel,
+                                              window=4, window_seconds=60) if adaptive else None
+        self.in_flight = 0
+        self.failures = 0
+        self.benched_until = 0.0
+        self.latency = None  # moving average of tile seconds
+        self.osm_base = None  # newest osm_base seen from this endpoint
+        self.gate = overpass_status.gate_for(url)
+
+    def capacity(self):
+        capacity = self.controller.limit if self.controller is not None else self.max_parallel
+        quota = self.gate.rate_limit()
+        return min(capacity, quota) if quota else capacity
+
+    def available(self, now):
+        return now >= self.benched_until and self.in_flight < self.capacity() and self.gate.has_slot()
+
+    def start(self):
+        self.in_flight += 1
+        self.gate.reserve()
+        if self.controller is not None:
+            self.controller.acquire()  # never blocks: tiles are only submitted below capacity()
+
+    def finish(self):
+        self.in_flight -= 1
+        self.gate.release()
+        if self.controller is not None:
+            self.controller.release()
+
+    def score(self):
+        """Lower is better: load relative to weight, then speed."""
+        return (self.in_flight + 1) / self.weight, self.latency or 0.0
+
+    def succeeded(self, elapsed, meta):
+        self.failures = 0
+        self.latency = elapsed if self.latency is None else 0.7 * self.latency + 0.3 * elapsed
+        base = osm_base_time(meta)
+        if base is not None and (self.osm_base is None or base > self.osm_base):
+            self.osm_base = base
+        if self.controller is not None:
+            self.controller.observe(elapsed, True)
+
+    def failed(self, elapsed, rate_limited=False):
+        if rate_limited:
+            return  # not a health problem: the slot gate holds the next tile back
+        self.failures += 1
+        self.benched_until = time.monotonic() + 30 * 2 ** min(self.failures - 1, 5)
+        if self.controller is not None:
+            self.controller.observe(elapsed, False)
+
+
+class _Attempt:
+    def __init__(self, tile, endpoint, hedge):
+        self.tile = tile
+        self.endpoint = endpoint
+        self.hedge = hedge
+        self.started = time.monotonic()
+        self.cancel = threading.Event()
+
+
+class OverpassPool:
+    """Runs tile queries across weighted endpoints with hedging and an osm_base check."""
+
+    def __init__(self, endpoints=None, hedge_after=None, hedge_factor=None, max_base_skew=None, max_attempts=None,
+                 max_rate_limited=None, adaptive=False):
+        settings = config.OVERPASS_POOL_CONFIG
+        self.endpoints = [Endpoint(e['url'], e.get('weight', 1), e.get('max_parallel', 2), adaptive)
+                          for e in (endpoints or config.OVERPASS_ENDPOINTS)]
+        self.hedge_after = hedge_after if hedge_after is not None else settings['hedge_after']
+        self.hedge_factor = hedge_factor if hedge_factor is not None else settings['hedge_factor']
+        self.max_base_skew = max_base_skew if max_base_skew is not None else settings['max_base_skew']
+        self.max_attempts = max_attempts or settings['max_attempts']
+        self.max_rate_limited = max_rate_limited if max_rate_limited is not None else settings['max_rate_limited']
+        self.stats = {'tiles': 0, 'hedged': 0, 'hedge_wins': 0, 'retried': 0, 'refetched_stale': 0}
+        self._durations = []
+
+    def _choose(self, exclude=()):
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude and e.available(now)]
+        return min(candidates, key=Endpoint.score) if candidates else None
+
+    def _hedge_threshold(self):
+        if len(self._durations) >= 3:
+            return min(self.hedge_after, max(1.0, self.hedge_factor * statistics.median(self._durations)))
+        return self.hedge_after
+
+    def _fetch(self, attempt, query):
+        """Worker: streams one tile from one endpoint. Returns (elements, meta) or None if cancelled."""
+        meta = {}
+        elements = []
+        stream = overpass.stream_elements(query, url=attempt.endpoint.url, meta=meta, wait_for_slot=False)
+        try:
+            for element in stream:
+                if attempt.cancel.is_set():
+                    return None
+                elements.append(element)
+        finally:
+            stream.close()
+        return elements, meta
+
+    def fetch_tiles(self, queries):
+        """Runs {tile: query} and returns {tile: (elements, meta, endpoint)}.
+
+        Raises overpass.OverpassError when a tile fails on every attempt.
+        """
+        pending = list(queries)
+        attempts_left = {tile: self.max_attempts for tile in queries}
+        refunds_left = {tile: self.max_rate_limited for tile in queries}
+        results = {}
+        hedged = set()
+        running = {}  # future -> _Attempt
+        workers = sum(endpoint.max_parallel for endpoint in self.endpoints) * 2
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='overpass-tile')
+        try:
+            def submit(tile, endpoint, hedge):
+                attempt = _Attempt(tile, endpoint, hedge)
+                endpoint.start()
+                running[pool.submit(self._fetch, attempt, queries[tile])] = attempt
+
+            while pending or any(attempt.tile not in results for attempt in running.values()):
+                while pending:
+                    endpoint = self._choose()
+                    if endpoint is None:
+                        break
+                    tile = pending.pop(0)
+                    attempts_left[tile] -= 1
+                    submit(tile, endpoint, hedge=False)
+
+                now = time.monotonic()
+                threshold = self._hedge_threshold()
+                for attempt in list(running.values()):
+                    tile = attempt.tile
+                    if tile in results or tile in hedged or now - attempt.started < threshold:
+                        continue
+                    siblings = [a for a in running.values() if a.tile == tile]
+                    endpoint = self._choose(exclude=[a.endpoint for a in siblings])
+                    if endpoint is not None:
+                        log(f"Tile {tile} slow on {attempt.endpoint.url} ({now - attempt.started:.0f}s), "
+                            f"hedging on {endpoint.url}")
+                        self.stats['hedged'] += 1
+                        hedged.add(tile)
+                        submit(tile, endpoint, hedge=True)
+
+                if not running:
+                    if pending:
+                        time.sleep(1)  # every endpoint is benched, busy or out of slots
+                    continue
+                done, _ = concurrent.futures.wait(list(running), timeout=0.5,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    attempt = running.pop(future)
+                    endpoint = attempt.endpoint
+                    endpoint.finish()
+                    elapsed = time.monotonic() - attempt.started
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        response = getattr(e, 'response', None)
+                        rate_limited = response is not None and response.status_code == 429
+                        endpoint.failed(elapsed, rate_limited)
+                        log(f"Tile {attempt.tile} failed on {endpoint.url}: {e}")
+                        # hedges never took an attempt, so only give back what was taken
+                        if rate_limited and not attempt.hedge and refunds_left[attempt.tile] > 0:
+                            refunds_left[attempt.tile] -= 1
+                            attempts_left[attempt.tile] += 1
+                        still_running = any(a.tile == attempt.tile for a in running.values())
+                        if attempt.tile not in results and not still_running:
+                            if attempts_left[attempt.tile] <= 0:
+                                for other in running.values():
+                                    other.cancel.set()
+                                raise overpass.OverpassError(f"Tile {attempt.tile} failed on every attempt: {e}")
+                            self.stats['retried'] += 1
+                            pending.append(attempt.tile)
+                        continue
+                    if result is None:
+                        continue  # cancelled: the other attempt won
+                    endpoint.succeeded(elapsed, result[1])
+                    if attempt.tile in results:
+                        continue
+                    results[attempt.tile] = (result[0], result[1], endpoint)
+                    self._durations.append(elapsed)
+                    self.stats['tiles'] += 1
+                    if attempt.hedge:
+                        self.stats['hedge_wins'] += 1
+                    for other in running.values():
+                        if other.tile == attempt.tile:
+                            other.cancel.set()
+        finally:
+            # Losing hedged requests stop on their own once they notice the cancel flag;
+            # don't wait for them, but give their slot back when they do, so a reused pool
+            # doesn't see phantom load on those endpoints
+            for future, attempt in running.items():
+                attempt.cancel.set()
+                future.add_done_callback(lambda _, endpoint=attempt.endpoint: endpoint.finish())
+            pool.shutdown(wait=False)
+        return results
+
+    def _stale(self, results):
+        bases = {tile: osm_base_time(meta) for tile, (_, meta, _) in results.items()}
+        known = [base for base in bases.values() if base is not None]
+        if not known:
+            return [], None
+        newest = max(known)
+        return [tile for tile, base in bases.items()
+                if base is not None and (newest - base).total_seconds() > self.max_base_skew], newest
+
+    def fetch(self, query_for_tile, tile_list):
+        """Fetches all tiles, checks osm_base consistency and returns (elements, meta) merged."""
+        queries = {tile: query_for_tile(tile) for tile in tile_list}
+        results = self.fetch_tiles(queries)
+
+        stale, newest = self._stale(results)
+        if stale:
+            log(f"{len(stale)} tile(s) have an osm_base more than {self.max_base_skew}s behind {newest:%Y-%m-%dT%H:%M:%SZ}, "
+                f"fetching them again from up-to-date endpoints")
+            self.stats['refetched_stale'] += len(stale)
+            lagging = [e for e in self.endpoints
+                       if e.osm_base is not None and (newest - e.osm_base).total_seconds() > self.max_base_skew]
+            saved = [(e, e.benched_until) for e in lagging]
+            for endpoint in lagging:
+                endpoint.benched_until = float('inf')
+            try:
+                results.update(self.fetch_tiles({tile: queries[tile] for tile in stale}))
+            finally:
+                for endpoint, until in saved:
+                    endpoint.benched_until = until
+            stale, newest = self._stale(results)
+            if stale:
+                raise overpass.OverpassError(f"osm_base of {len(stale)} tile(s) still differs by more than "
+                                             f"{self.max_base_skew}s from the newest tile; not merging")
+
+        merged = {}
+        oldest = None
+        meta = {}
+        for tile, (elements, tile_meta, _) in results.items():
+            for element in elements:
+                merged.setdefault((element.get('type'), element['id']), element)
+            base = osm_base_time(tile_meta)
+            if base is not None and (oldest is None or base < oldest):
+                oldest, meta = base, tile_meta
+        elements = sorted(merged.values(), key=lambda e: (_TYPE_ORDER.get(e.get('type'), 3), e['id']))
+        meta = dict(meta, tiles=len(results))
+        return elements, meta
+
+
+def fetch_solar_tiled(rows=4, cols=4, bbox=config.NORTH_HOLLAND_BBOX, pool=None, timeout=None):
+    """Fetches the solar query tile by tile through an OverpassPool. Returns (elements, meta)."""
+    pool = pool or OverpassPool()
+    elements, meta = pool.fetch(lambda tile: overpass.solar_query(timeout=timeout, bbox=tile),
+                                tiles(bbox, rows, cols))
+    log(f"Fetched {len(elements)} elements in {rows}x{cols} tiles: {pool.stats}")
+    for endpoint in pool.endpoints:
+        log(f"  {endpoint.url}: weight {endpoint.weight}, average tile {endpoint.latency or 0:.1f}s, "
+            f"osm_base {endpoint.osm_base:%Y-%m-%dT%H:%M:%SZ}" if endpoint.osm_base else f"  {endpoint.url}: unused")
+    return elements, meta
+
+
+def parse_grid(text):
+    rows, _, cols = text.lower().partition('x')
+    return int(rows), int(cols or rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch the solar query in tiles across several Overpass endpoints.")
+    parser.add_argument('--tiles', default='4x4', help="grid as ROWSxCOLS (default 4x4)")
+    parser.add_argument('--output', default=config.SNAPSHOT_PATH, help=".osnap snapshot to write")
+    parser.add_argument('--hedge-after', type=float, help="seconds before a slow tile is sent to a second endpoint")
+    parser.add_argument('--adaptive', action='store_true', help="tune tiles in flight per endpoint (AIMD)")
+    args = parser.parse_args()
+
+    rows, cols = parse_grid(args.tiles)
+    pool = OverpassPool(hedge_after=args.hedge_after, adaptive=args.adaptive)
+    elements, meta = fetch_solar_tiled(rows, cols, pool=pool)
+    snapshot.save_snapshot(dict(meta, elements=elements), args.output, query=overpass.solar_query())
+    log(f"Snapshot saved to: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
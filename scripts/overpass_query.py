@@ -0,0 +1,171 @@
+import config
+
+# Overpass queries composed from a declarative spec, with the cheapest output mode for
+# the fields the downstream stages actually use.
+#
+#   spec = QuerySpec([Filter(('node', 'way', 'relation'), {'generator:source': 'solar'})],
+#                    needs={'center', 'tags'})
+#   spec.build()
+#
+# needs is a set of:
+#   ids       element ids only
+#   center    a coordinate per element (lat/lon for nodes, bbox centre for ways and relations)
+#   tags      all tags
+#   geometry  full way geometry; fetched afterwards, only for the ways that need it
+#             (overpass.attach_geometry), so the main query never ships it
+#
+# Output statements per needs (nodes carry their coordinates in the skel/body modes,
+# ways and relations get a centre instead of their node lists):
+#
+#   needs            nodes        ways, relations
+#   ids              out ids      out ids
+#   center           out skel     out ids center
+#   tags             out tags     out tags
+#   center + tags    out body     out tags center
+#
+# A limit applies per output statement, so a limited query uses one combined statement
+# for all types instead (ways then carry their node refs, as in a plain 'out center N'):
+#
+#   needs            all types
+#   ids              out ids
+#   center           out skel center
+#   tags             out tags
+#   center + tags    out body center
+#
+# Results are in quadtile order (qt), which spares the server a sort by id.
+
+NEEDS = ('ids', 'center', 'tags', 'geometry')
+
+_NODE_MODES = {
+    frozenset(): 'ids',
+    frozenset({'center'}): 'skel',
+    frozenset({'tags'}): 'tags',
+    frozenset({'center', 'tags'}): 'body',
+}
+_WAY_MODES = {
+    frozenset(): 'ids',
+    frozenset({'center'}): 'ids center',
+    frozenset({'tags'}): 'tags',
+    frozenset({'center', 'tags'}): 'tags center',
+}
+_LIMITED_MODES = {
+    frozenset(): 'ids',
+    frozenset({'center'}): 'skel center',
+    frozenset({'tags'}): 'tags',
+    frozenset({'center', 'tags'}): 'body center',
+}
+GEOMETRY_BATCH = 2000  # way ids per lazy geometry query
+
+
+def _quote(text):
+    return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class Filter:
+    """One tag filter applied to the given element types.
+
+    tags maps key -> value: a string matches exactly, None means the key must exist,
+    a tuple/list matches any of the values.
+    """
+
+    def __init__(self, types, tags):
+        self.types = tuple(types)
+        self.tags = dict(tags)
+
+    def clauses(self):
+        parts = []
+        for key, value in self.tags.items():
+            if value is None:
+                parts.append(f"[{_quote(key)}]")
+            elif isinstance(value, (tuple, list)):
+                alternatives = '|'.join(str(v).replace('\\', '\\\\').replace('"', '\\"') for v in value)
+                parts.append(f'[{_quote(key)}~"^({alternatives})$"]')
+            else:
+                parts.append(f"[{_quote(key)}={_quote(value)}]")
+        return ''.join(parts)
+
+
+class QuerySpec:
+    """Declarative description of an Overpass query: filters, area and needed fields."""
+
+    def __init__(self, filters, needs=('center', 'tags'), area_id=config.NORTH_HOLLAND_AREA_ID, order='qt'):
+        unknown = set(needs) - set(NEEDS)
+        if unknown:
+            raise ValueError(f"Unknown needs {sorted(unknown)}; choose from {NEEDS}")
+        self.filters = list(filters)
+        self.needs = frozenset(needs)
+        self.area_id = area_id
+        self.order = order
+
+    def _modes_key(self):
+        key = self.needs & {'center', 'tags'}
+        if 'geometry' in self.needs:
+            key = key | {'center'}  # keep a coordinate per element; full geometry comes later
+        return key
+
+    def output_modes(self):
+        """Returns (node mode, way/relation mode) for this spec's needs."""
+        key = self._modes_key()
+        return _NODE_MODES[key], _WAY_MODES[key]
+
+    def types(self):
+        return {element_type for spec in self.filters for element_type in spec.types}
+
+    def build(self, timeout=None, limit=None, bbox=None):
+        """Returns the Overpass QL text. bbox is (south, west, north, east); limit caps the total number of elements."""
+        settings = f"[out:json][timeout:{timeout or config.OVERPASS_API_CONFIG['timeout']}]"
+        if bbox:
+            settings += f"[bbox:{','.join(str(value) for value in bbox)}]"
+        area = "(area.searchArea)" if self.area_id else ""
+        lines = [settings + ';']
+        if self.area_id:
+            lines.append(f"area({self.area_id})->.searchArea;")
+        lines.append("(")
+        for spec in self.filters:
+            for element_type in spec.types:
+                lines.append(f"  {element_type}{spec.clauses()}{area};")
+        lines.append(")->.matches;")
+
+        node_mode, way_mode = self.output_modes()
+        suffix = f" {self.order}" if self.order else ""
+        if limit:
+            lines.append(f".matches out {_LIMITED_MODES[self._modes_key()]}{suffix} {limit};")
+            return '\n'.join(lines) + '\n'
+        types = self.types()
+        if node_mode == way_mode:
+            lines.append(f".matches out {node_mode}{suffix};")
+            return '\n'.join(lines) + '\n'
+        if 'node' in types:
+            lines.append(f"node.matches;\nout {node_mode}{suffix};")
+        others = [t for t in ('way', 'relation') if t in types]
+        if others:
+            selection = ' '.join(f"{t}.matches;" for t in others)
+            lines.append(f"({selection});\nout {way_mode}{suffix};")
+        return '\n'.join(lines) + '\n'
+
+
+def geometry_query(way_ids, timeout=None):
+    """Query for the full geometry of a list of ways (the lazy second step of 'geometry')."""
+    ids = ','.join(str(way_id) for way_id in way_ids)
+    return (f"[out:json][timeout:{timeout or config.OVERPASS_API_CONFIG['timeout']}];\n"
+            f"way(id:{ids});\nout ids geom qt;\n")
+
+
+def host_buildings_query(node_ids, radius=1, timeout=None):
+    """Query for the buildings within radius metres of the given nodes, with their geometry.
+
+    Used for containment (consolidate.py), so geometry is what the caller needs here.
+    """
+    ids = ','.join(str(node_id) for node_id in node_ids)
+    return (f"[out:json][timeout:{timeout or config.OVERPASS_API_CONFIG['timeout']}];\n"
+            f"node(id:{ids})->.nodes;\nway[\"building\"](around.nodes:{radius});\nout tags geom qt;\n")
+
+
+# The solar generators of Noord-Holland, with what pipeline.py needs: a coordinate and the tags
+SOLAR = QuerySpec([Filter(('node', 'way', 'relation'), {'generator:source': 'solar'})], needs=('center', 'tags'))
+
+# Buildings tagged as carrying solar panels (the direct part of run_solar_data_collection_local())
+SOLAR_BUILDINGS = QuerySpec([
+    Filter(('way',), {'building': None, 'generator:source': 'solar'}),
+    Filter(('way',), {'building': None, 'roof:material': 'solar_panels'}),
+], needs=('center', 'tags'))
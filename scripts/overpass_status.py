@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+import requests
+import http_client
+
+# Slot-aware submission for Overpass, based on its /api/status page:
+#
+#   Connected as: 1234567
+#   Current time: 2025-05-16T03:00:00Z
+#   Rate limit: 2
+#   1 slots available now.
+#   Slot available after: 2025-05-16T03:00:12Z, in 12 seconds.
+#   Currently running queries (pid, space limit, time limit, start time):
+#
+# Queries are only posted when the status page shows a free slot. Otherwise the gate
+# sleeps until the earliest "slot available after" time and checks again, instead of
+# posting into a 429 or a queue that ends in a timeout minutes later. "Rate limit: 0"
+# (the usual setting on a self-hosted instance) means no quota, and so does a server
+# without a status page.
+
+STATUS_TIMEOUT = 10
+STATUS_MAX_AGE = 5.0  # seconds a status page is trusted before it is fetched again
+MAX_WAIT = 300  # longest single sleep while waiting for a slot
+
+_RATE_LIMIT = re.compile(r'^Rate limit:\s*(\d+)', re.M)
+_AVAILABLE = re.compile(r'^(\d+)\s+slots?\s+available now', re.M)
+_SLOT_AFTER = re.compile(r'^Slot available after:\s*(\S+?),\s*in\s*(-?\d+)\s*seconds?', re.M)
+_RUNNING_HEADER = 'Currently running queries'
+
+
+def status_url(interpreter_url):
+    """Maps .../api/interpreter to .../api/status."""
+    base = interpreter_url.split('?')[0].rstrip('/')
+    if base.endswith('/interpreter'):
+        base = base[:-len('/interpreter')]
+    return f"{base}/status"
+
+
+def parse_status(text):
+    """Parses an /api/status page.
+
+    Returns {'rate_limit': int (0 = unlimited), 'available': int, 'waits': [seconds, ...], 'running': int}.
+    """
+    rate_limit = _RATE_LIMIT.search(text)
+    available = _AVAILABLE.search(text)
+    waits = sorted(max(0, int(seconds)) for _, seconds in _SLOT_AFTER.findall(text))
+    running = 0
+    if _RUNNING_HEADER in text:
+        running = sum(1 for line in text.split(_RUNNING_HEADER, 1)[1].splitlines()[1:] if line[:1].isdigit())
+    return {
+        'rate_limit': int(rate_limit.group(1)) if rate_limit else 0,
+        # When every slot is taken the page lists only "Slot available after" lines
+        'available': int(available.group(1)) if available else 0,
+        'waits': waits,
+        'running': running,
+    }
+
+
+def fetch_status(interpreter_url):
+    """Fetches and parses the status page that belongs to an interpreter url."""
+    response = http_client.get('overpass', status_url(interpreter_url), timeout=STATUS_TIMEOUT)
+    response.raise_for_status()
+    return parse_status(response.text)
+
+
+class SlotGate:
+    """Tracks the free query slots of one Overpass endpoint."""
+
+    def __init__(self, url, max_age=STATUS_MAX_AGE):
+        self.url = url
+        self.max_age = max_age
+        self.status = None
+        self.fetched = 0.0
+        self.reserved = 0  # queries we started since the status page was fetched
+        self.waited = 0.0  # total seconds spent waiting for slots
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        due = self.status is not None and self.status['waits'] and now - self.fetched >= self.status['waits'][0]
+        if not force and self.status is not None and now - self.fetched < self.max_age and not due:
+            return
+        try:
+            self.status = fetch_status(self.url)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if self.status is None or self.status['rate_limit']:
+                print(f"Overpass status unavailable at {status_url(self.url)} ({e}); submitting without slot checks")
+            self.status = {'rate_limit': 0, 'available': 0, 'waits': [], 'running': 0}
+        self.fetched = now
+        self.reserved = 0
+
+    def rate_limit(self):
+        """Number of slots this endpoint grants us (0 = unlimited)."""
+        with self._lock:
+            self._refresh()
+            return self.status['rate_limit']
+
+    def has_slot(self):
+        """True if a query could be posted now (without reserving the slot)."""
+        with self._lock:
+            self._refresh()
+            return not self.status['rate_limit'] or self.status['available'] > self.reserved
+
+    def wait_time(self):
+        """Seconds until the next slot frees up according to the last status page (0 if one is free)."""
+        with self._lock:
+            self._refresh()
+            status = self.status
+            if not status['rate_limit'] or status['available'] > self.reserved:
+                return 0.0
+            elapsed = time.monotonic() - self.fetched
+            return max(0.5, (status['waits'][0] if status['waits'] else 1.0) - elapsed)
+
+    def reserve(self):
+        with self._lock:
+            self.reserved += 1
+
+    def release(self):
+        """Call when a query has finished; the next check re-reads the status page."""
+        with self._lock:
+            self.fetched = 0.0
+
+    def acquire(self, timeout=None):
+        """Blocks until a slot is free and reserves it. Returns the seconds waited."""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refresh()
+                if not self.status['rate_limit'] or self.status['available'] > self.reserved:
+                    self.reserved += 1
+                    waited = time.monotonic() - started
+                    self.waited += waited
+                    return waited
+            delay = min(MAX_WAIT, self.wait_time())
+            if timeout is not None and time.monotonic() - started + delay > timeout:
+                raise TimeoutError(f"No Overpass slot free at {self.url} within {timeout}s")
+            print(f"No free Overpass slot at {self.url}, waiting {delay:.0f}s")
+            time.sleep(delay)
+            self.release()  # force a fresh status page
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def gate_for(url):
+    """Returns the shared SlotGate for an interpreter url."""
+    with _gates_lock:
+        gate = _gates.get(url)
+        if gate is None:
+            gate = _gates[url] = SlotGate(url)
+        return gate
@@ -0,0 +1,648 @@
+import argparse
+import contextlib
+import csv
+import datetime
+import queue
+import threading
+import time
+import os
+import aimd
+import config
+import consolidate
+import deadletter
+import geocode
+import http_client
+import job_queue
+import metrics
+import overpass
+import overpass_pool
+import profiling
+import snapshot
+import spatial
+from store import SolarStore, EXPORT_COLUMNS, EXPORT_NAMES, element_coords
+
+# Single entry point for fetch -> normalize -> geocode -> export.
+#
+# Every stage runs in its own thread(s) and hands work on through bounded queues,
+# so geocoding starts on the first Overpass elements while the response is still
+# streaming in, and rows are written as they finish. A full queue blocks the stage
+# in front of it, which keeps memory flat however large the fetch is. Rows go to
+# <output>.tmp, which replaces the output CSV when the run ends, so readers of the CSV
+# (query_service.py) only ever see finished runs.
+#
+# Metrics (request counts, status codes, latency histograms, cache hits, rate limiter
+# waits, rows/sec) are written next to the output CSV as <name>.metrics.json and
+# <name>.metrics.prom every --metrics-interval seconds and at the end of the run.
+# With --profile each stage also runs under cProfile and tracemalloc (see profiling.py).
+#
+# With --lookup the geocode workers first resolve elements by OSM id, in batches of up
+# to 50 per Nominatim /lookup request, and only reverse geocode (with --provider) the
+# ids that lookup does not resolve.
+#
+# With --tiles the fetch stage splits the query into tiles spread over the Overpass
+# endpoints in config.OVERPASS_ENDPOINTS (see overpass_pool.py) instead of one request.
+#
+# Bulk providers (--provider nominatim-db) get batches of BULK_BATCH points per call.
+#
+# With --consolidate the fetched elements are collected first and solar nodes are merged
+# into their host buildings (see consolidate.py), so each building is geocoded and
+# exported once, with its panel count and node ids.
+#
+# With --adaptive the number of requests in flight is tuned between 1 and --workers by
+# an AIMD controller watching the geocoder's p95 latency and error rate (see aimd.py).
+#
+# Overpass hands out elements in id order, so consecutive lookups jump across the
+# province. With --order hilbert (or zorder) an extra stage collects up to
+# --order-window items that need geocoding and dispatches them along that curve over
+# North Holland (spatial.curve_order), so neighbouring lookups follow each other and
+# hit warm pages in a self-hosted Nominatim. The export stage puts the rows back in
+# their input order before writing them.
+#
+# With --time-budget and/or --max-requests that stage first collects every item that
+# needs geocoding and dispatches them by value, in job_queue.py's priorities (no addr:*
+# tags, then partial tags, then solar nodes within COVER_RADIUS of a building), and
+# along the --order curve within a priority. Once the budget is spent the geocoders
+# stop sending requests and pass the remaining items on with the fields their tags
+# give. Everything geocoded so far is in the store, so the next run only geocodes what
+# is still missing, best items first.
+
+_DONE = object()
+BATCH_LINGER = 0.2  # seconds a batching worker waits for more items to fill a batch
+BULK_BATCH = 1000  # points per query for bulk providers (nominatim-db)
+ORDER_WINDOW = 5000  # items sorted together by the --order stage
+
+ADDRESS_TAGS = {
+    'street': 'addr:street',
+    'huisnummer': 'addr:housenumber',
+    'postcode': 'addr:postcode',
+    'city': 'addr:city',
+}
+REQUIRED_FIELDS = ('street', 'huisnummer', 'postcode', 'city')
+CONSOLIDATED_COLUMNS = ['panel_count', 'node_ids']
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def row_from_element(element):
+    """Builds the output fields we can fill from the element's own OSM tags."""
+    tags = element.get('tags', {})
+    row = {field: tags.get(tag, '') for field, tag in ADDRESS_TAGS.items()}
+    row['country'] = tags.get('addr:country', '')
+    row['province'] = ''
+    row['gebruiksdoel'] = tags.get('building', '')
+    row['functie'] = tags.get('building:use', tags.get('amenity', tags.get('shop', tags.get('office', ''))))
+    solar = element.get('solar')
+    if solar is not None:
+        row['panel_count'] = solar['panel_count']
+        row['node_ids'] = ';'.join(str(node_id) for node_id in solar['node_ids'])
+    return row
+
+
+def csv_row(item):
+    """Flattens a pipeline item into the export CSV layout shared with store.py."""
+    lat, lon = item['lat'], item['lon']
+    out = {
+        'Objectnummer': item['osm_id'],
+        'osm_type': item['osm_type'],
+        'Longitude': lon,
+        'Latitude': lat,
+        'maps_url': f"https://www.google.com/maps?q={lat},{lon}",
+    }
+    for field, value in item['row'].items():
+        out[EXPORT_NAMES.get(field, field)] = value
+    return out
+
+
+class Pipeline:
+    """Runs the fetch, normalize, geocode and export stages concurrently."""
+
+    def __init__(self, provider='nominatim', workers=4, queue_size=500, input_path=None, limit=None,
+                 snapshot_path=None, output_path=config.PIPELINE_CSV_PATH, store_path=config.STORE_DB_PATH,
+                 refresh=False, metrics_interval=30, profile=False, lookup=False,
+                 adaptive=False, tiles=None, consolidate=False, order=None, order_window=ORDER_WINDOW,
+                 time_budget=None, max_requests=None):
+        self.provider = provider
+        self.geocoder = geocode.PROVIDERS[provider]
+        self.workers = workers
+        self.input_path = input_path
+        self.limit = limit
+        self.snapshot_path = snapshot_path
+        self.output_path = output_path
+        self.store_path = store_path
+        self.refresh = refresh
+        self.metrics_interval = metrics_interval
+        self.metrics = metrics.Metrics()
+        self.profile = profile
+        self.lookup = lookup
+        self.tiles = tiles
+        self.consolidate = consolidate
+        self.order = order
+        self.order_window = order_window
+        self.time_budget = time_budget
+        self.max_requests = max_requests
+        self.ranked = time_budget is not None or max_requests is not None
+        self.deadline = None
+        self.stopped_by = None
+        self.buildings = spatial.GridIndex()  # building centres, for ranking solar nodes
+        self.controller = aimd.AimdController(provider, initial=min(4, workers), maximum=workers) if adaptive else None
+        self.profiler = None
+
+        self.raw_queue = queue.Queue(maxsize=queue_size)
+        self.order_queue = queue.Queue(maxsize=max(queue_size, order_window))
+        self.geocode_queue = queue.Queue(maxsize=queue_size)
+        self.export_queue = queue.Queue(maxsize=queue_size)
+        self.abort = threading.Event()
+        self.errors = []
+        self.counts = {'fetched': 0, 'skipped': 0, 'cached': 0, 'looked_up': 0, 'geocoded': 0, 'failed': 0,
+                       'deferred': 0, 'requests': 0, 'exported': 0}
+        self._count_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._count_lock:
+            self.counts[name] += amount
+
+    def _put(self, q, item):
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                if self.abort.is_set():
+                    return _DONE
+
+    def _get_batch(self, q, size):
+        """Returns up to `size` items, waiting at most BATCH_LINGER for the batch to fill.
+
+        Stops early at _DONE, which is included as the last element.
+        """
+        batch = [self._get(q)]
+        deadline = time.monotonic() + BATCH_LINGER
+        while len(batch) < size and batch[-1] is not _DONE:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _get_all(self, q):
+        """Returns every item up to and including _DONE."""
+        items = [self._get(q)]
+        while items[-1] is not _DONE:
+            items.append(self._get(q))
+        return items
+
+    def _slot(self):
+        return self.controller.slot() if self.controller is not None else contextlib.nullcontext()
+
+    def _spent(self):
+        """Returns which budget is used up, or None. Call with self._count_lock held."""
+        if self.max_requests is not None and self.counts['requests'] >= self.max_requests:
+            return 'request budget'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'time budget'
+        return None
+
+    def _take_request(self):
+        """Counts one geocoder request against the budget. False once the budget is spent."""
+        with self._count_lock:
+            spent = self._spent()
+            if spent is None:
+                self.counts['requests'] += 1
+                return True
+            first = self.stopped_by is None
+            self.stopped_by = self.stopped_by or spent
+        if first:
+            log(f"{spent.capitalize()} spent, exporting the remaining items without geocoding them")
+        return False
+
+    def _run_stage(self, name, target, *args):
+        try:
+            if self.profiler is None:
+                target(*args)
+            else:
+                self.profiler.run(name, target, *args)
+        except Exception as e:
+            log(f"ERROR in {name} stage: {e}")
+            self.errors.append((name, e))
+            self.abort.set()
+
+    # Stages
+
+    def fetch(self):
+        """Streams elements from a snapshot file or straight from Overpass."""
+        if self.input_path:
+            log(f"Reading elements from {self.input_path}")
+            elements = snapshot.iter_elements(self.input_path)
+            writer = None
+        elif self.tiles:
+            rows, cols = self.tiles
+            log(f"Fetching elements from Overpass in {rows}x{cols} tiles")
+            elements, meta = overpass_pool.fetch_solar_tiled(rows, cols)
+            if self.limit:
+                elements = elements[:self.limit]
+            writer = snapshot.SnapshotWriter(self.snapshot_path, osm_base=meta.get('osm3s', {}).get('timestamp_osm_base'),
+                                             query=overpass.solar_query()) if self.snapshot_path else None
+        else:
+            query = overpass.solar_query(self.limit)
+            log(f"Streaming elements from Overpass ({config.OVERPASS_API_CONFIG['url']})")
+            meta = {}
+            elements = overpass.stream_elements(query, meta=meta)
+            writer = snapshot.SnapshotWriter(self.snapshot_path, query=query) if self.snapshot_path else None
+
+        def recorded():
+            for element in elements:
+                if writer is not None:
+                    writer.write(element)
+                yield element
+
+        try:
+            records = recorded()
+            if self.consolidate:
+                records, stats = consolidate.consolidate(records)
+                log(f"Consolidated into {stats['records']} records ({stats['merged_nodes']} solar nodes merged "
+                    f"into {stats['buildings_with_panels']} buildings)")
+            for element in records:
+                if not self._put(self.raw_queue, element):
+                    break
+                self._count('fetched')
+                self.metrics.inc('stage_items_total', stage='fetch')
+                if self.limit and self.counts['fetched'] >= self.limit:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+                log(f"Raw snapshot saved to: {self.snapshot_path}")
+            self._put(self.raw_queue, _DONE)
+        log(f"Fetch finished: {self.counts['fetched']} elements")
+
+    def normalize(self):
+        """Extracts coordinates and tag addresses, and skips work the store already has."""
+        solar_store = SolarStore(self.store_path)
+        seq = 0
+        try:
+            while True:
+                element = self._get(self.raw_queue)
+                if element is _DONE:
+                    break
+                self.metrics.inc('stage_items_total', stage='normalize')
+                lat, lon = element_coords(element)
+                if lat is None or lon is None:
+                    self._count('skipped')
+                    continue
+                item = {
+                    'element': element,
+                    'osm_type': element['type'],
+                    'osm_id': element['id'],
+                    'lat': lat,
+                    'lon': lon,
+                    'row': row_from_element(element),
+                    'source': 'osm',
+                    'seq': seq,
+                }
+                seq += 1
+                if element['type'] != 'node' and 'building' in element.get('tags', {}):
+                    self.buildings.insert_point(element['id'], lat, lon)
+                complete = all(item['row'][field] for field in REQUIRED_FIELDS)
+                if not complete and not self.refresh:
+                    for field, value in solar_store.get_fields(item['osm_type'], item['osm_id']).items():
+                        if not item['row'].get(field):
+                            item['row'][field] = value
+                    if all(item['row'][field] for field in REQUIRED_FIELDS):
+                        self._count('cached')
+                        complete = True
+                    self.metrics.cache('store', complete)
+                if complete:
+                    target = self.export_queue
+                else:
+                    target = self.order_queue if self.order or self.ranked else self.geocode_queue
+                if not self._put(target, item):
+                    break
+        finally:
+            solar_store.close()
+            if self.order or self.ranked:
+                self._put(self.order_queue, _DONE)
+            else:
+                for _ in range(self.workers):
+                    self._put(self.geocode_queue, _DONE)
+            self._put(self.export_queue, _DONE)
+
+    def _priority(self, item):
+        covered = item['osm_type'] == 'node' and bool(
+            self.buildings.near(item['lat'], item['lon'], job_queue.COVER_RADIUS))
+        return job_queue.priority(item['element'].get('tags', {}), covered)
+
+    def order_items(self):
+        """Dispatches windows of items to the geocoders along a space-filling curve.
+
+        With a budget the window is every item, dispatched by priority first.
+        """
+        curve = spatial.CURVES[self.order] if self.order else None
+        try:
+            done = False
+            while not done:
+                if self.ranked:
+                    window = self._get_all(self.order_queue)
+                else:
+                    window = self._get_batch(self.order_queue, self.order_window)
+                done = window[-1] is _DONE
+                items = [item for item in window if item is not _DONE]
+                if curve is not None:
+                    order = spatial.curve_order([(item['lat'], item['lon']) for item in items],
+                                                config.NORTH_HOLLAND_BBOX, curve)
+                else:
+                    order = list(range(len(items)))
+                if self.ranked:
+                    priorities = [self._priority(item) for item in items]
+                    order = sorted(order, key=lambda index: priorities[index])
+                self.metrics.inc('stage_items_total', len(items), stage='order')
+                for index in order:
+                    if not self._put(self.geocode_queue, items[index]):
+                        return
+        finally:
+            for _ in range(self.workers):
+                self._put(self.geocode_queue, _DONE)
+
+    def geocode(self):
+        """Fills missing address fields with the selected reverse geocoder."""
+        try:
+            while True:
+                item = self._get(self.geocode_queue)
+                if item is _DONE:
+                    break
+                if not self._take_request():
+                    if not self._defer(item):
+                        break
+                    continue
+                with self._slot(), self.metrics.timer('stage_item_seconds', stage='geocode'):
+                    addr = self.geocoder(item['lat'], item['lon'])
+                self.metrics.inc('stage_items_total', stage='geocode')
+                if not self._finish(item, addr, self.provider):
+                    break
+        finally:
+            self._put(self.export_queue, _DONE)
+
+    def geocode_lookup(self):
+        """Resolves batches of elements by OSM id, reverse geocoding only what lookup misses."""
+        try:
+            done = False
+            while not done:
+                batch = self._get_batch(self.geocode_queue, geocode.LOOKUP_BATCH)
+                done = batch[-1] is _DONE
+                items = [item for item in batch if item is not _DONE]
+                if not items:
+                    continue
+                if not self._take_request():
+                    if not all(self._defer(item) for item in items):
+                        return
+                    continue
+                with self._slot(), self.metrics.timer('stage_item_seconds', stage='lookup'):
+                    found = geocode.lookup_nominatim([(item['osm_type'], item['osm_id']) for item in items])
+                self.metrics.inc('stage_items_total', len(items), stage='lookup')
+                self._count('looked_up', len(found))
+                for item in items:
+                    addr = found.get((item['osm_type'], item['osm_id']))
+                    source = 'nominatim-lookup'
+                    if addr is None:
+                        if not self._take_request():
+                            if not self._defer(item):
+                                return
+                            continue
+                        with self._slot(), self.metrics.timer('stage_item_seconds', stage='geocode'):
+                            addr = self.geocoder(item['lat'], item['lon'])
+                        self.metrics.inc('stage_items_total', stage='geocode')
+                        source = self.provider
+                    if not self._finish(item, addr, source):
+                        return
+        finally:
+            self._put(self.export_queue, _DONE)
+
+    def geocode_bulk(self):
+        """Reverse geocodes batches of points with one call to a bulk provider."""
+        reverse_many = geocode.BULK_PROVIDERS[self.provider]
+        try:
+            done = False
+            while not done:
+                batch = self._get_batch(self.geocode_queue, BULK_BATCH)
+                done = batch[-1] is _DONE
+                items = [item for item in batch if item is not _DONE]
+                if not items:
+                    continue
+                if not self._take_request():
+                    if not all(self._defer(item) for item in items):
+                        return
+                    continue
+                with self._slot(), self.metrics.timer('stage_item_seconds', stage='bulk'):
+                    addresses = reverse_many([(item['lat'], item['lon']) for item in items])
+                self.metrics.inc('stage_items_total', len(items), stage='bulk')
+                for item, addr in zip(items, addresses):
+                    if not self._finish(item, addr, self.provider):
+                        return
+        finally:
+            self._put(self.export_queue, _DONE)
+
+    def _finish(self, item, addr, source):
+        """Merges a geocoder address into the item and hands it to the export stage."""
+        if addr is None:
+            self._count('failed')
+            item['dead_letter'] = (source, geocode.last_error())
+        else:
+            for field, value in geocode.address_fields(addr).items():
+                if value and not item['row'].get(field):
+                    item['row'][field] = value
+            item['source'] = source
+            self._count('geocoded')
+        return self._put(self.export_queue, item)
+
+    def _defer(self, item):
+        """Hands an item to the export stage ungeocoded (budget spent); the next run picks it up."""
+        self._count('deferred')
+        return self._put(self.export_queue, item)
+
+    def export(self):
+        """Writes rows to <output>.tmp as they finish and upserts them into the store.
+
+        The temporary file replaces the output CSV at the end of the run.
+
+        Items whose geocode failed are still written (with the fields their tags give)
+        and are also recorded in the dead-letter table for deadletter.py retry. With
+        --order or a budget, finished items are held until every item before them in
+        the input has been written, so the CSV keeps the input order.
+        """
+        solar_store = SolarStore(self.store_path)
+        dead_letters = deadletter.DeadLetters(store=solar_store)
+        pending_done = self.workers + 1
+        held = {}
+        next_seq = 0
+        temp_path = f"{self.output_path}.tmp"
+        try:
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+                columns = EXPORT_COLUMNS + CONSOLIDATED_COLUMNS if self.consolidate else EXPORT_COLUMNS
+                writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+                writer.writeheader()
+
+                def write(item):
+                    with self.metrics.timer('stage_item_seconds', stage='export'):
+                        writer.writerow(csv_row(item))
+                        f.flush()
+                        solar_store.upsert_element(item['element'], 'overpass')
+                        solar_store.upsert_fields(item['osm_type'], item['osm_id'], item['row'], item['source'])
+                        if 'dead_letter' in item:
+                            dead_letters.add(item['osm_type'], item['osm_id'], item['lat'], item['lon'],
+                                             *item['dead_letter'])
+                    self._count('exported')
+                    self.metrics.inc('stage_items_total', stage='export')
+                    self.metrics.inc('rows_total', source=item['source'])
+                    if self.counts['exported'] % 100 == 0:
+                        solar_store.conn.commit()
+                        log(f"Exported {self.counts['exported']} rows "
+                            f"(geocoded {self.counts['geocoded']}, from store {self.counts['cached']})")
+
+                while pending_done:
+                    item = self._get(self.export_queue)
+                    if item is _DONE:
+                        pending_done -= 1
+                        continue
+                    if not (self.order or self.ranked):
+                        write(item)
+                        continue
+                    held[item['seq']] = item
+                    while next_seq in held:
+                        write(held.pop(next_seq))
+                        next_seq += 1
+                for seq in sorted(held):  # only left after an abort
+                    write(held[seq])
+            os.replace(temp_path, self.output_path)
+        finally:
+            solar_store.conn.commit()
+            solar_store.close()
+
+    def _collect(self, registry):
+        for provider, limiter in geocode.LIMITERS.items():
+            registry.set('rate_limiter_wait_seconds', round(limiter.waited, 3), provider=provider)
+        for name, q in (('raw', self.raw_queue), ('order', self.order_queue), ('geocode', self.geocode_queue),
+                        ('export', self.export_queue)):
+            registry.set('queue_depth', q.qsize(), queue=name)
+
+    def run(self):
+        """Starts all stages, waits for them and returns the counters."""
+        started = time.monotonic()
+        if self.time_budget is not None:
+            self.deadline = started + self.time_budget
+        metrics_prefix = os.path.splitext(self.output_path)[0]
+        self.metrics.add_collector(self._collect)
+        http_client.add_hook(self.metrics.http_hook)
+        if self.controller is not None:
+            self.metrics.add_collector(self.controller.collect)
+            http_client.add_hook(self.controller.http_hook)
+        if self.metrics_interval:
+            self.metrics.start_periodic(metrics_prefix, self.metrics_interval)
+        if self.profile:
+            self.profiler = profiling.StageProfiler(metrics_prefix)
+            self.profiler.start()
+        threads = [
+            threading.Thread(target=self._run_stage, args=('fetch', self.fetch), name='fetch'),
+            threading.Thread(target=self._run_stage, args=('normalize', self.normalize), name='normalize'),
+            threading.Thread(target=self._run_stage, args=('export', self.export), name='export'),
+        ]
+        if self.order or self.ranked:
+            threads.append(threading.Thread(target=self._run_stage, args=('order', self.order_items), name='order'))
+        if self.lookup:
+            geocoder = self.geocode_lookup
+        elif self.provider in geocode.BULK_PROVIDERS:
+            geocoder = self.geocode_bulk
+        else:
+            geocoder = self.geocode
+        threads += [threading.Thread(target=self._run_stage, args=('geocode', geocoder), name=f'geocode-{i}')
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            log("Interrupted, stopping stages...")
+            self.abort.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.metrics.stop_periodic()
+        http_client.remove_hook(self.metrics.http_hook)
+        if self.controller is not None:
+            http_client.remove_hook(self.controller.http_hook)
+            log(f"Adaptive concurrency ended at {self.controller.limit} (p95 baseline "
+                f"{(self.controller.baseline or 0) * 1000:.0f}ms, {len(self.controller.adjustments)} adjustments)")
+        self.metrics.write(metrics_prefix)
+        if self.profiler is not None:
+            reports = self.profiler.write_reports()
+            self.profiler.stop()
+            log(f"Profiles saved: {', '.join(reports)}")
+
+        elapsed = time.monotonic() - started
+        self.counts['seconds'] = round(elapsed, 2)
+        log(f"Pipeline finished in {elapsed:.1f}s: {self.counts}")
+        if self.stopped_by:
+            log(f"Stopped geocoding: {self.stopped_by} spent, {self.counts['deferred']} items left for the next run")
+        log(f"Results saved to: {self.output_path}")
+        log(f"Metrics saved to: {metrics_prefix}.metrics.json / .metrics.prom")
+        return self.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch, geocode and export North Holland solar buildings in one run.")
+    parser.add_argument('--input', help="read elements from a snapshot/Overpass JSON file instead of querying Overpass")
+    parser.add_argument('--limit', type=int, help="maximum number of elements to fetch")
+    parser.add_argument('--snapshot', help="also save the raw Overpass elements to this .osnap file")
+    parser.add_argument('--provider', choices=sorted(geocode.PROVIDERS), default='nominatim')
+    parser.add_argument('--workers', type=int, default=4, help="concurrent geocoding workers")
+    parser.add_argument('--queue-size', type=int, default=500, help="capacity of each queue between stages")
+    parser.add_argument('--output', default=config.PIPELINE_CSV_PATH)
+    parser.add_argument('--store', default=config.STORE_DB_PATH)
+    parser.add_argument('--refresh', action='store_true', help="geocode again even if the store has the address")
+    parser.add_argument('--metrics-interval', type=float, default=30,
+                        help="seconds between metrics file updates during the run (0 = only at the end)")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile CPU (cProfile) and allocations (tracemalloc) per stage, saved next to --output")
+    parser.add_argument('--lookup', action='store_true',
+                        help="resolve elements by OSM id with Nominatim /lookup (50 per request), "
+                             "reverse geocoding only the ids it does not resolve")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="tune requests in flight (up to --workers) from the geocoder's latency and error rate")
+    parser.add_argument('--tiles', type=overpass_pool.parse_grid, metavar='ROWSxCOLS',
+                        help="fetch in tiles spread over config.OVERPASS_ENDPOINTS, e.g. 4x4")
+    parser.add_argument('--consolidate', action='store_true',
+                        help="merge solar nodes into their host buildings before geocoding (one row per building)")
+    parser.add_argument('--order', choices=sorted(spatial.CURVES),
+                        help="dispatch lookups along this space-filling curve; the CSV keeps the input order")
+    parser.add_argument('--order-window', type=int, default=ORDER_WINDOW, help="items sorted together by --order")
+    parser.add_argument('--time-budget', type=job_queue.parse_duration, metavar='DURATION',
+                        help="stop geocoding after this long, e.g. 5400, 90m or 6h; items are geocoded best first")
+    parser.add_argument('--max-requests', type=int,
+                        help="stop geocoding after this many geocoder requests; items are geocoded best first")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(provider=args.provider, workers=args.workers, queue_size=args.queue_size,
+                        input_path=args.input, limit=args.limit, snapshot_path=args.snapshot,
+                        output_path=args.output, store_path=args.store, refresh=args.refresh,
+                        metrics_interval=args.metrics_interval, profile=args.profile, lookup=args.lookup,
+                        adaptive=args.adaptive, tiles=args.tiles, consolidate=args.consolidate,
+                        order=args.order, order_window=args.order_window, time_budget=args.time_budget,
+                        max_requests=args.max_requests)
+    pipeline.run()
+    return 1 if pipeline.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
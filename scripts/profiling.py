@@ -0,0 +1,108 @@
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+
+# Opt-in CPU and memory profiling per pipeline stage (pipeline.py --profile).
+#
+# Each stage thread runs under its own cProfile.Profile; threads of the same stage
+# (the geocode workers) are merged into one profile. tracemalloc snapshots taken when
+# a stage starts and when its last thread finishes give the top allocation sites.
+# Stages run concurrently, so an allocation report can include lines from other
+# stages that were busy at the same time; the CPU profiles are exact per stage.
+#
+# Output, next to the CSV (<prefix> = output path without .csv):
+#   <prefix>.<stage>.prof       binary pstats, open with `python -m pstats` or snakeviz
+#   <prefix>.<stage>.txt        top functions by cumulative and own time
+#   <prefix>.<stage>.alloc.txt  top allocation sites (tracemalloc, grouped by line)
+
+TRACEMALLOC_FRAMES = 10
+
+
+class StageProfiler:
+    """Collects per-stage cProfile stats and tracemalloc snapshots and writes reports."""
+
+    def __init__(self, prefix, top_n=30):
+        self.prefix = prefix
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._active = {}
+        self._start_snapshots = {}
+        self._allocations = {}
+        self._warned = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def run(self, stage, target, *args):
+        """Runs target(*args) in the current thread, profiled as part of `stage`."""
+        with self._lock:
+            self._active[stage] = self._active.get(stage, 0) + 1
+            if self._active[stage] == 1 and stage not in self._start_snapshots:
+                self._start_snapshots[stage] = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows only one active profiler at a time
+            profile = None
+            if not self._warned:
+                self._warned = True
+                print("Warning: CPU profiling unavailable for concurrent stages on this Python version")
+        try:
+            return target(*args)
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                if profile is not None:
+                    self._profiles.setdefault(stage, []).append(profile)
+                self._active[stage] -= 1
+                if self._active[stage] == 0:
+                    self._allocations[stage] = tracemalloc.take_snapshot().compare_to(
+                        self._start_snapshots[stage], 'lineno')
+
+    def write_reports(self):
+        """Writes the .prof, .txt and .alloc.txt files for every stage and returns their paths."""
+        written = []
+        for stage, profiles in sorted(self._profiles.items()):
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            path = f"{self.prefix}.{stage}.prof"
+            stats.dump_stats(path)
+            written.append(path)
+
+            text = io.StringIO()
+            text.write(f"Stage '{stage}': {len(profiles)} thread(s)\n\n== Top {self.top_n} by cumulative time ==\n")
+            pstats.Stats(path, stream=text).sort_stats('cumulative').print_stats(self.top_n)
+            text.write(f"\n== Top {self.top_n} by own time ==\n")
+            pstats.Stats(path, stream=text).sort_stats('tottime').print_stats(self.top_n)
+            path = f"{self.prefix}.{stage}.txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            written.append(path)
+
+        for stage, differences in sorted(self._allocations.items()):
+            path = f"{self.prefix}.{stage}.alloc.txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"Stage '{stage}': top {self.top_n} allocation sites still held when the stage finished\n")
+                f.write("(stages overlap, so sites from concurrently running stages can appear)\n\n")
+                for stat in differences[:self.top_n]:
+                    f.write(f"{stat}\n")
+            written.append(path)
+
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        path = f"{self.prefix}.memory.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Traced memory at end of run: {current / 1e6:.1f} MB\nPeak traced memory: {peak / 1e6:.1f} MB\n")
+        written.append(path)
+        return written
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -0,0 +1,307 @@
+import argparse
+import collections
+import csv
+import datetime
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import config
+import spatial
+from store import LAT_COLUMNS, LON_COLUMNS, EMPTY_VALUES
+
+# Read-only HTTP service over an enriched output CSV (pipeline.py, store.py export or
+# the 03/04 outputs).
+#
+# The CSV is loaded once into memory with a grid index on the coordinates and hash
+# indexes on postcode, city and Objectnummer, so a query touches only the rows it
+# returns. Responses are kept in an LRU cache keyed on the normalized query.
+#
+#   GET /bbox?bbox=52.37,4.88,52.38,4.90              south,west,north,east
+#   GET /radius?lat=52.3730&lon=4.8932&r=250          metres (up to 50 km), nearest first
+#   GET /search?postcode=1705RC                       also city=, objectnummer=, street=
+#   GET /status                                       rows, source file, load time, cache stats
+#
+# Every query takes format=json (default) or format=csv, and limit=N.
+#
+# The file is polled every --watch seconds. When its modification time changed and has
+# then been stable for --settle seconds, a new dataset is built in the background and
+# swapped in with one assignment: queries in flight finish on the old one, and the cache
+# is dropped with it. pipeline.py replaces its CSV in one step when a run finishes; the
+# settle time covers tools that write the file in place (03/04).
+#
+#   python query_service.py Output/north_holland_solar_pipeline.csv --port 8765
+
+CACHE_SIZE = 512
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 100000
+WATCH_INTERVAL = 5
+SETTLE_SECONDS = 5
+MAX_RADIUS = 50000  # metres; larger circles are a bbox query
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def normalize_postcode(value):
+    return ''.join((value or '').split()).upper()
+
+
+def _text_key(value):
+    return (value or '').strip().lower()
+
+
+class Dataset:
+    """An immutable, indexed copy of one CSV."""
+
+    def __init__(self, path):
+        started = time.monotonic()
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            self.columns = reader.fieldnames
+            self.rows = list(reader)
+        self.points = spatial.GridIndex()
+        self.by_postcode = collections.defaultdict(list)
+        self.by_city = collections.defaultdict(list)
+        self.by_object = collections.defaultdict(list)
+        postcode_column = next((c for c in ('postcode', 'Postal code') if c in self.columns), None)
+        city_column = next((c for c in ('city', 'City') if c in self.columns), None)
+        self.street_column = next((c for c in ('street', 'Street') if c in self.columns), None)
+        for index, row in enumerate(self.rows):
+            lat = next((row[c] for c in LAT_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+            lon = next((row[c] for c in LON_COLUMNS if row.get(c) not in EMPTY_VALUES), None)
+            if lat is not None and lon is not None:
+                self.points.insert_point(index, float(lat), float(lon))
+            if postcode_column and row[postcode_column] not in EMPTY_VALUES:
+                self.by_postcode[normalize_postcode(row[postcode_column])].append(index)
+            if city_column and row[city_column] not in EMPTY_VALUES:
+                self.by_city[_text_key(row[city_column])].append(index)
+            if row.get('Objectnummer') not in EMPTY_VALUES:
+                self.by_object[row['Objectnummer'].strip()].append(index)
+        # Query boxes are clamped to this, so their cost never depends on how big a box was asked for
+        self.extent = spatial.bbox_of([self.points.boxes[key][:2] for key in self.points.boxes]) \
+            if len(self.points) else None
+        self.loaded_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self.load_seconds = round(time.monotonic() - started, 3)
+
+    def bbox(self, south, west, north, east):
+        if self.extent is None:
+            return []
+        e_south, e_west, e_north, e_east = self.extent
+        south, west, north, east = max(south, e_south), max(west, e_west), min(north, e_north), min(east, e_east)
+        if south > north or west > east:
+            return []
+        return sorted(self.points.within((south, west, north, east)))
+
+    def radius(self, lat, lon, metres):
+        return self.points.near(lat, lon, metres)
+
+    def search(self, postcode=None, city=None, objectnummer=None, street=None):
+        """Rows matching every given attribute; the most selective index is used first."""
+        candidates = []
+        if objectnummer is not None:
+            candidates.append(self.by_object.get(objectnummer.strip(), []))
+        if postcode is not None:
+            candidates.append(self.by_postcode.get(normalize_postcode(postcode), []))
+        if city is not None:
+            candidates.append(self.by_city.get(_text_key(city), []))
+        if not candidates:
+            if street is None:
+                return []
+            candidates.append(range(len(self.rows)))
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for other in candidates[1:]:
+            result.intersection_update(other)
+        if street is not None and self.street_column:
+            wanted = _text_key(street)
+            result = {index for index in result if _text_key(self.rows[index][self.street_column]) == wanted}
+        return sorted(result)
+
+
+class LruCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class QueryService:
+    """Holds the current dataset and its cache, and swaps both on reload."""
+
+    def __init__(self, path, cache_size=CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.current = (Dataset(path), LruCache(cache_size))
+        self.reloads = 0
+        self.stop = threading.Event()
+
+    def reload(self):
+        dataset = Dataset(self.path)
+        self.current = (dataset, LruCache(self.cache_size))
+        self.reloads += 1
+        log(f"Reloaded {len(dataset.rows)} rows from {self.path} in {dataset.load_seconds}s")
+
+    def watch(self, interval=WATCH_INTERVAL, settle=SETTLE_SECONDS):
+        """Reloads when the file changed and has not been written for `settle` seconds."""
+        while not self.stop.wait(interval):
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime != self.current[0].mtime and time.time() - mtime >= settle:
+                    self.reload()
+            except (OSError, ValueError, csv.Error) as e:
+                log(f"Reload of {self.path} failed, still serving the previous data: {e}")
+
+    def answer(self, path, params):
+        """Returns (status, content type, body bytes) for a request."""
+        dataset, cache = self.current
+        if path == '/status':
+            return 200, 'application/json', json.dumps({
+                'path': dataset.path, 'rows': len(dataset.rows), 'loaded_at': dataset.loaded_at,
+                'load_seconds': dataset.load_seconds, 'reloads': self.reloads,
+                'cache': {'entries': len(cache.entries), 'hits': cache.hits, 'misses': cache.misses}}).encode('utf-8')
+        key = (path, tuple(sorted(params.items())))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            limit = self._limit(params)
+            indexes = self._query(dataset, path, params)
+        except (KeyError, ValueError) as e:
+            return 400, 'application/json', json.dumps({'error': f"bad query: {e}"}).encode('utf-8')
+        if indexes is None:
+            return 404, 'application/json', json.dumps({'error': 'not found'}).encode('utf-8')
+        rows = [dataset.rows[index] for index in indexes[:limit]]
+        if params.get('format', 'json') == 'csv':
+            out = io.StringIO()
+            writer = csv.DictWriter(out, fieldnames=dataset.columns)
+            writer.writeheader()
+            writer.writerows(rows)
+            response = (200, 'text/csv', out.getvalue().encode('utf-8'))
+        else:
+            response = (200, 'application/json', json.dumps(
+                {'count': len(indexes), 'returned': len(rows), 'rows': rows}, ensure_ascii=False).encode('utf-8'))
+        cache.put(key, response)
+        return response
+
+    @staticmethod
+    def _limit(params):
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+        if limit < 0:
+            raise ValueError(f"limit must not be negative, got {limit}")
+        return min(limit, MAX_LIMIT)
+
+    @staticmethod
+    def _coordinate(value, name, limit):
+        value = float(value)
+        if not -limit <= value <= limit:  # also rejects nan
+            raise ValueError(f"{name} must be between -{limit} and {limit}, got {value}")
+        return value
+
+    @classmethod
+    def _query(cls, dataset, path, params):
+        if path == '/bbox':
+            values = params['bbox'].split(',')
+            if len(values) != 4:
+                raise ValueError("bbox is south,west,north,east")
+            south, north = (cls._coordinate(values[i], 'latitude', 90) for i in (0, 2))
+            west, east = (cls._coordinate(values[i], 'longitude', 180) for i in (1, 3))
+            if south > north or west > east:
+                raise ValueError("bbox is south,west,north,east with south <= north and west <= east")
+            return dataset.bbox(south, west, north, east)
+        if path == '/radius':
+            metres = float(params.get('r', 100))
+            if not 0 <= metres <= MAX_RADIUS:
+                raise ValueError(f"r must be between 0 and {MAX_RADIUS} metres, got {metres}")
+            return dataset.radius(cls._coordinate(params['lat'], 'lat', 90), cls._coordinate(params['lon'], 'lon', 180),
+                                  metres)
+        if path == '/search':
+            attributes = {name: params[name] for name in ('postcode', 'city', 'objectnummer', 'street') if name in params}
+            if not attributes:
+                raise ValueError("give postcode, city, objectnummer and/or street")
+            return dataset.search(**attributes)
+        return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        try:
+            status, content_type, body = self.service.answer(parts.path.rstrip('/') or '/', params)
+        except Exception as e:  # answer with a 500 instead of dropping the connection
+            log(f"Error answering {self.path}: {type(e).__name__}: {e}")
+            status, content_type, body = 500, 'application/json', json.dumps({'error': 'internal error'}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(path, host='127.0.0.1', port=8765, watch=WATCH_INTERVAL, settle=SETTLE_SECONDS, cache_size=CACHE_SIZE):
+    service = QueryService(path, cache_size)
+    dataset = service.current[0]
+    log(f"Loaded {len(dataset.rows)} rows from {path} in {dataset.load_seconds}s")
+    handler = type('QueryHandler', (Handler,), {'service': service})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    if watch:
+        threading.Thread(target=service.watch, args=(watch, settle), name='watch', daemon=True).start()
+    log(f"Serving on http://{host}:{httpd.server_address[1]} (bbox, radius, search, status)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        log("Stopping")
+    finally:
+        service.stop.set()
+        httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only HTTP queries over an enriched solar CSV.")
+    parser.add_argument('csv', nargs='?', default=config.PIPELINE_CSV_PATH)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--watch', type=float, default=WATCH_INTERVAL,
+                        help="seconds between checks for a new version of the file (0 = never reload)")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help="seconds the file must be unchanged before it is reloaded")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="responses kept in the LRU cache")
+    args = parser.parse_args()
+    serve(args.csv, args.host, args.port, args.watch, args.settle, args.cache_size)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import os
+import config
+import geocode
+import overpass
+import spatial
+from store import SolarStore, CSV_ALIASES, EMPTY_VALUES, LAT_COLUMNS, LON_COLUMNS
+
+# Fills the gaps of an existing output CSV without geocoding it again.
+#
+# Only rows with an empty or "N/A" value in one of --fields are re-queried, with
+# strategies that are more precise than the plain reverse lookup that left the gap,
+# tried in order until the row is complete:
+#
+#   lookup     the element's own address by OSM id (Nominatim /lookup, 50 ids per request)
+#   footprint  reverse geocode a point inside the building footprint instead of the
+#              bbox centre, which for L-shaped or large buildings often lies next door
+#   zoom18     reverse geocode the CSV coordinate at zoom 18 (building level) with
+#              another provider than the one that wrote the CSV; skipped for nominatim
+#              and nominatim-db, whose plain reverse lookup already is zoom 18
+#
+# footprint and zoom18 use --provider, so a gap left by one provider can be retried
+# with the other. A result only fills a row when it agrees with the street and postcode
+# the row already has (a geocode of a neighbouring point would otherwise put its house
+# number next to this row's street). Found values only fill empty cells, the CSV is
+# rewritten in place (atomically, via a temporary file next to it) and the new values
+# also go into the store. Requests scale with the number of gaps, not the size of the file.
+#
+#   python reenrich.py ../Output/north_holland_solar_1000_locationiq.csv --fields huisnummer
+#   python reenrich.py north_holland_solar_buildings_geocoded.csv --provider locationiq --strategies footprint zoom18
+
+STRATEGIES = ('lookup', 'footprint', 'zoom18')
+DEFAULT_FIELDS = ('street', 'huisnummer', 'postcode', 'city')
+PRECISE_ZOOM = 18
+MATCH_FIELDS = ('street', 'postcode')  # a result must agree with the row on these before it fills anything
+SAME_AS_DEFAULT_ZOOM = ('nominatim', 'nominatim-db')  # providers whose reverse lookup is zoom 18 already
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def _normalized(field, value):
+    value = ' '.join(str(value).split()).lower()
+    return value.replace(' ', '') if field == 'postcode' else value
+
+
+def _float(row, columns):
+    for column in columns:
+        if row.get(column) not in EMPTY_VALUES:
+            return float(row[column])
+    return None
+
+
+class Gap:
+    """One CSV row with missing fields."""
+
+    def __init__(self, index, row, columns, fields):
+        self.index = index
+        self.row = row
+        self.columns = columns  # canonical field -> CSV column
+        self.osm_id = int(row['Objectnummer']) if row.get('Objectnummer') not in EMPTY_VALUES else None
+        self.lat = _float(row, LAT_COLUMNS)
+        self.lon = _float(row, LON_COLUMNS)
+        self.osm_type = row.get('osm_type') or ('way' if row.get('OSM_Way_ID') not in EMPTY_VALUES else None)
+        self.missing = [field for field in fields if row.get(columns[field]) in EMPTY_VALUES]
+        self.filled = {}
+
+    def matches(self, values):
+        """True if the address agrees with the street and postcode the row already has."""
+        for field in MATCH_FIELDS:
+            column = self.columns.get(field)
+            known = self.row.get(column) if column else None
+            if known in EMPTY_VALUES:
+                continue
+            if not values.get(field) or _normalized(field, values[field]) != _normalized(field, known):
+                return False
+        return True
+
+    def fill(self, addr, source):
+        """Takes the missing fields from a geocoder address of the same street and postcode.
+
+        Returns the number filled; 0 when the address belongs to another street or postcode.
+        """
+        if not addr:
+            return 0
+        values = geocode.address_fields(addr)
+        if not self.matches(values):
+            return 0
+        filled = 0
+        for field in list(self.missing):
+            if values.get(field):
+                self.row[self.columns[field]] = values[field]
+                self.filled[field] = (values[field], source)
+                self.missing.remove(field)
+                filled += 1
+        return filled
+
+
+def find_gaps(rows, columns, fields):
+    gaps = []
+    for index, row in enumerate(rows):
+        gap = Gap(index, row, columns, fields)
+        if gap.missing:
+            gaps.append(gap)
+    return gaps
+
+
+def _reverse_all(geocoder, gaps, points, workers, source):
+    """Reverse geocodes points (one per gap) with a thread pool and fills the gaps."""
+    filled = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        addresses = pool.map(lambda point: geocoder(point[0], point[1], zoom=PRECISE_ZOOM), points)
+        for gap, addr in zip(gaps, addresses):
+            filled += gap.fill(addr, source)
+    return filled
+
+
+def by_lookup(gaps, provider, workers):
+    keys = [(gap.osm_type, gap.osm_id) for gap in gaps if gap.osm_type and gap.osm_id is not None]
+    found = geocode.lookup_nominatim(keys)
+    return sum(gap.fill(found.get((gap.osm_type, gap.osm_id)), 'nominatim-lookup') for gap in gaps)
+
+
+def by_footprint(gaps, provider, workers):
+    ways = [gap for gap in gaps if gap.osm_type == 'way' and gap.osm_id is not None]
+    if not ways:
+        return 0
+    geometries = overpass.fetch_geometries([gap.osm_id for gap in ways])
+    todo = [gap for gap in ways if len(geometries.get(gap.osm_id, ())) >= 3]
+    points = [spatial.interior_point(geometries[gap.osm_id]) for gap in todo]
+    return _reverse_all(geocode.PROVIDERS[provider], todo, points, workers, f"{provider}-footprint")
+
+
+def by_zoom18(gaps, provider, workers):
+    if provider in SAME_AS_DEFAULT_ZOOM:
+        log(f"zoom18: skipped, {provider} already reverse geocodes at zoom {PRECISE_ZOOM}")
+        return 0
+    todo = [gap for gap in gaps if gap.lat is not None and gap.lon is not None]
+    return _reverse_all(geocode.PROVIDERS[provider], todo, [(gap.lat, gap.lon) for gap in todo], workers,
+                        f"{provider}-z{PRECISE_ZOOM}")
+
+
+STRATEGY_FUNCTIONS = {'lookup': by_lookup, 'footprint': by_footprint, 'zoom18': by_zoom18}
+
+
+def reenrich(path, fields=DEFAULT_FIELDS, strategies=STRATEGIES, provider='nominatim', workers=1,
+             store_path=config.STORE_DB_PATH, dry_run=False):
+    """Re-queries the rows of a CSV that lack any of the fields and patches the file. Returns the stats."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        rows = list(reader)
+    columns = {CSV_ALIASES[column]: column for column in header if column in CSV_ALIASES}
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        raise ValueError(f"{path} has no column for {unknown}")
+
+    gaps = find_gaps(rows, columns, fields)
+    missing_before = sum(len(gap.missing) for gap in gaps)
+    log(f"{len(gaps)} of {len(rows)} rows miss {missing_before} values of {', '.join(fields)}")
+
+    with SolarStore(store_path) as solar_store:
+        for gap in gaps:
+            if gap.osm_type is None and gap.osm_id is not None:
+                gap.osm_type = solar_store.resolve_type(gap.osm_id, gap.lat, gap.lon)
+
+        stats = {'rows': len(rows), 'gap_rows': len(gaps), 'missing_before': missing_before}
+        for strategy in strategies:
+            todo = [gap for gap in gaps if gap.missing]
+            if not todo:
+                break
+            filled = STRATEGY_FUNCTIONS[strategy](todo, provider, workers)
+            stats[strategy] = filled
+            log(f"{strategy}: filled {filled} values in {len(todo)} rows")
+
+        if not dry_run:
+            with solar_store.conn:
+                for gap in gaps:
+                    if gap.filled and gap.osm_type:
+                        for field, (value, source) in gap.filled.items():
+                            solar_store.upsert_fields(gap.osm_type, gap.osm_id, {field: value}, source)
+
+    stats['missing_after'] = sum(len(gap.missing) for gap in gaps)
+    if not dry_run and stats['missing_after'] < missing_before:
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, path)
+        log(f"Patched {path}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill missing address fields of an existing output CSV in place.")
+    parser.add_argument('csv', help="output CSV of 03/04, pipeline.py or the building scripts")
+    parser.add_argument('--fields', nargs='+', default=list(DEFAULT_FIELDS),
+                        help="fields whose empty or N/A values should be filled")
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES),
+                        help="strategies to try, in this order")
+    parser.add_argument('--provider', choices=sorted(geocode.PROVIDERS), default='nominatim',
+                        help="reverse geocoder for the footprint and zoom18 strategies")
+    parser.add_argument('--workers', type=int, default=1, help="concurrent reverse lookups")
+    parser.add_argument('--store', default=config.STORE_DB_PATH)
+    parser.add_argument('--dry-run', action='store_true', help="report what would be filled without writing")
+    args = parser.parse_args()
+
+    stats = reenrich(args.csv, args.fields, args.strategies, args.provider, args.workers, args.store, args.dry_run)
+    log(f"Missing values: {stats['missing_before']} -> {stats['missing_after']} ({stats})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
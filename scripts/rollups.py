@@ -0,0 +1,320 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import config
+import snapshot
+import spatial
+from store import SolarStore, EMPTY_VALUES, utc_now
+
+# Solar building counts, estimated roof area and building type breakdowns per
+# province, gemeente and PC4, kept up to date in the store database.
+#
+# Every counted element has a row in rollup_members with the regions and the roof
+# area it contributed. An update takes a set of changed and removed elements,
+# subtracts their old contribution from the rollups table and adds the new one, so
+# the cost of a run is proportional to what changed, not to the dataset:
+#
+#   python rollups.py build [--snapshot today.osnap]            first build from the store
+#   python rollups.py update --diff Output/diff/today           after snapshot_diff.py and geocoding
+#   python rollups.py show --level gemeente
+#   python rollups.py show --level pc4 --region 1705 --csv
+#
+# update also picks up elements whose address fields changed since the last update
+# (a geocoding or reenrich.py run), using the updated_at stamps of the store.
+#
+# Solar nodes that consolidate.py merged into a building (listed in the building's
+# node_ids field) are counted through that building only, not a second time on their own.
+#
+# The gemeente is the store's city field (Nominatim's city/town/village, falling back
+# to municipality), the PC4 the digits of the postcode. The roof area is the footprint
+# area of ways that come with geometry (--snapshot takes a snapshot fetched with
+# geometry or the JSON written by consolidate.py); elements without one count towards
+# the totals but not the area.
+
+LEVELS = ('province', 'gemeente', 'pc4')
+UNKNOWN = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_members (
+    osm_type      TEXT    NOT NULL,
+    osm_id        INTEGER NOT NULL,
+    province      TEXT    NOT NULL,
+    gemeente      TEXT    NOT NULL,
+    pc4           TEXT    NOT NULL,
+    building_type TEXT    NOT NULL,
+    roof_area     REAL,
+    PRIMARY KEY (osm_type, osm_id)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    level         TEXT    NOT NULL,
+    region        TEXT    NOT NULL,
+    building_type TEXT    NOT NULL,
+    buildings     INTEGER NOT NULL,
+    with_area     INTEGER NOT NULL,
+    roof_area     REAL    NOT NULL,
+    PRIMARY KEY (level, region, building_type)
+);
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def log(message):
+    print(f"[{datetime.datetime.now()}] {message}")
+
+
+def pc4(postcode):
+    digits = ''.join(ch for ch in (postcode or '') if ch.isdigit())
+    return digits[:4] if len(digits) >= 4 else UNKNOWN
+
+
+def _clean(value):
+    return UNKNOWN if value in EMPTY_VALUES else value.strip()
+
+
+def read_areas(path, keys=None):
+    """Returns {(osm_type, osm_id): roof area in m²} for the ways with geometry in a snapshot."""
+    areas = {}
+    for element in snapshot.iter_elements(path):
+        key = (element.get('type'), element.get('id'))
+        geometry = element.get('geometry')
+        if geometry and (keys is None or key in keys):
+            ring = [(point['lat'], point['lon']) for point in geometry if point]
+            if len(ring) >= 3:
+                areas[key] = spatial.ring_area(ring)
+    return areas
+
+
+def read_diff(prefix):
+    """Returns (changed keys, removed keys) from the CSVs snapshot_diff.py wrote for prefix."""
+    changed, removed = set(), set()
+    for kind in ('added', 'tags', 'moved', 'removed'):
+        path = f"{prefix}.{kind}.csv"
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = (row['osm_type'], int(row['osm_id']))
+                (removed if kind == 'removed' else changed).add(key)
+    return changed - removed, removed
+
+
+class Rollups:
+    """Incrementally maintained rollups in the store database."""
+
+    def __init__(self, path=config.STORE_DB_PATH):
+        self.store = SolarStore(path)
+        self.conn = self.store.conn
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def covered_nodes(self, exclude=()):
+        """Ids of the solar nodes merged into a building, except into the buildings in exclude."""
+        covered = set()
+        for row in self.conn.execute(
+                "SELECT osm_type, osm_id, value FROM fields WHERE field = 'node_ids' AND osm_type != 'node'"):
+            if (row['osm_type'], row['osm_id']) not in exclude:
+                covered.update(int(node_id) for node_id in row['value'].split(';') if node_id)
+        return covered
+
+    def _member(self, key, area, covered=()):
+        """Builds the member row of one element from the store, or None if it is not counted."""
+        if key[0] == 'node' and key[1] in covered:
+            return None
+        element = self.conn.execute("SELECT tags FROM elements WHERE osm_type = ? AND osm_id = ?", key).fetchone()
+        if element is None:
+            return None
+        tags = json.loads(element['tags']) if element['tags'] else {}
+        fields = self.store.get_fields(*key)
+        building_type = _clean(fields.get('gebruiksdoel') or tags.get('building') or '')
+        return {
+            'province': _clean(fields.get('province', '')),
+            'gemeente': _clean(fields.get('city', '')),
+            'pc4': pc4(fields.get('postcode')),
+            'building_type': building_type,
+            'roof_area': area,
+        }
+
+    def _apply(self, member, sign):
+        area = member['roof_area']
+        for level in LEVELS:
+            self.conn.execute(
+                """INSERT INTO rollups (level, region, building_type, buildings, with_area, roof_area)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (level, region, building_type) DO UPDATE SET
+                       buildings = buildings + excluded.buildings, with_area = with_area + excluded.with_area,
+                       roof_area = roof_area + excluded.roof_area""",
+                (level, member[level], member['building_type'], sign, sign if area is not None else 0,
+                 sign * (area or 0.0)))
+
+    def update(self, changed=(), removed=(), areas=None):
+        """Moves the contribution of each changed key to its current regions and drops removed keys.
+
+        areas maps keys to a roof area; changed keys without one keep the area they had.
+        Returns (updated, removed) counts.
+        """
+        areas = areas or {}
+        removed = set(removed)
+        covered = self.covered_nodes(exclude=removed)
+        keys = list(changed) + list(removed)
+        # the nodes of a changed or removed building may have been merged or released since
+        seen = set(keys)
+        for key in [key for key in keys if key[0] != 'node']:
+            for node_id in self.store.get_fields(*key).get('node_ids', '').split(';'):
+                if node_id and ('node', int(node_id)) not in seen:
+                    seen.add(('node', int(node_id)))
+                    keys.append(('node', int(node_id)))
+        updated = dropped = 0
+        with self.conn:
+            for key in keys:
+                old = self.conn.execute(
+                    "SELECT * FROM rollup_members WHERE osm_type = ? AND osm_id = ?", key).fetchone()
+                new = None
+                if key not in removed:
+                    area = areas.get(key, old['roof_area'] if old is not None else None)
+                    new = self._member(key, area, covered)
+                if old is not None:
+                    old = dict(old)
+                    if new is not None and new == {name: old[name] for name in new}:
+                        continue  # nothing that is rolled up changed
+                    self._apply(old, -1)
+                    self.conn.execute("DELETE FROM rollup_members WHERE osm_type = ? AND osm_id = ?", key)
+                if new is not None:
+                    self._apply(new, 1)
+                    self.conn.execute(
+                        """INSERT INTO rollup_members (osm_type, osm_id, province, gemeente, pc4, building_type,
+                                                       roof_area) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        (*key, new['province'], new['gemeente'], new['pc4'], new['building_type'], new['roof_area']))
+                    updated += 1
+                elif old is not None:
+                    dropped += 1
+            self.conn.execute("DELETE FROM rollups WHERE buildings <= 0")
+        return updated, dropped
+
+    def _set_watermark(self, stamp):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO rollup_meta (key, value) VALUES ('updated_at', ?)", (stamp,))
+
+    def watermark(self):
+        row = self.conn.execute("SELECT value FROM rollup_meta WHERE key = 'updated_at'").fetchone()
+        return row['value'] if row else None
+
+    def touched_since(self, stamp):
+        """Keys whose element or fields changed in the store since stamp (inclusive: stamps have 1s resolution)."""
+        cursor = self.conn.execute(
+            """SELECT osm_type, osm_id FROM elements WHERE updated_at >= ?
+               UNION SELECT osm_type, osm_id FROM fields WHERE updated_at >= ?""", (stamp, stamp))
+        return {(row['osm_type'], row['osm_id']) for row in cursor}
+
+    def build(self, areas=None):
+        """Rebuilds everything from the store (first run). Returns the member count."""
+        started = utc_now()
+        with self.conn:
+            self.conn.execute("DELETE FROM rollup_members")
+            self.conn.execute("DELETE FROM rollups")
+        keys = [(row['osm_type'], row['osm_id']) for row in self.conn.execute("SELECT osm_type, osm_id FROM elements")]
+        updated, _ = self.update(keys, areas=areas)
+        self._set_watermark(started)
+        return updated
+
+    def refresh(self, changed=(), removed=(), areas=None):
+        """Incremental update: the given keys plus everything the store changed since the last update."""
+        started = utc_now()
+        since = self.watermark()
+        changed = set(changed) | (self.touched_since(since) if since else set())
+        result = self.update(changed - set(removed), removed, areas)
+        self._set_watermark(started)
+        return result
+
+    def query(self, level, region=None):
+        """Returns rollup rows for a level (optionally one region), largest regions first."""
+        if level not in LEVELS:
+            raise ValueError(f"level must be one of {LEVELS}")
+        sql = "SELECT region, building_type, buildings, with_area, roof_area FROM rollups WHERE level = ?"
+        params = [level]
+        if region is not None:
+            sql += " AND region = ?"
+            params.append(region)
+        sql += " ORDER BY SUM(buildings) OVER (PARTITION BY region) DESC, region, buildings DESC"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def totals(self, level):
+        """Returns [{region, buildings, with_area, roof_area, types: {building_type: count}}], largest first."""
+        regions = {}
+        for row in self.query(level):
+            total = regions.setdefault(row['region'], {'region': row['region'], 'buildings': 0, 'with_area': 0,
+                                                       'roof_area': 0.0, 'types': {}})
+            total['buildings'] += row['buildings']
+            total['with_area'] += row['with_area']
+            total['roof_area'] += row['roof_area']
+            total['types'][row['building_type'] or 'unknown'] = row['buildings']
+        return sorted(regions.values(), key=lambda total: -total['buildings'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solar rollups per province, gemeente and PC4.")
+    parser.add_argument('--store', default=config.STORE_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build the rollups from the whole store")
+    build.add_argument('--snapshot', help="snapshot or consolidate.py output with way geometry, for roof areas")
+    update = commands.add_parser('update', help="apply what changed since the last build/update")
+    update.add_argument('--diff', help="prefix of the snapshot_diff.py output of this run")
+    update.add_argument('--snapshot', help="new snapshot or consolidate.py output with way geometry, for roof areas")
+    show = commands.add_parser('show', help="print the rollups of one level")
+    show.add_argument('--level', choices=LEVELS, default='gemeente')
+    show.add_argument('--region', help="only this region, per building type")
+    show.add_argument('--csv', action='store_true', help="write CSV to stdout")
+    args = parser.parse_args()
+
+    with Rollups(args.store) as rollups:
+        if args.command == 'build':
+            areas = read_areas(args.snapshot) if args.snapshot else None
+            log(f"Built rollups for {rollups.build(areas)} elements")
+        elif args.command == 'update':
+            changed, removed = read_diff(args.diff) if args.diff else (set(), set())
+            areas = read_areas(args.snapshot, changed) if args.snapshot else None
+            updated, dropped = rollups.refresh(changed, removed, areas)
+            log(f"Updated {updated} elements, removed {dropped}")
+        elif args.region is not None:
+            rows = rollups.query(args.level, args.region)
+            writer = csv.DictWriter(sys.stdout, fieldnames=['region', 'building_type', 'buildings', 'with_area',
+                                                            'roof_area'])
+            if args.csv:
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    print(f"{row['region'] or '(unknown)':<24} {row['building_type'] or '(unknown)':<20} "
+                          f"{row['buildings']:>8} {row['roof_area']:>12.0f} m²")
+        else:
+            totals = rollups.totals(args.level)
+            if args.csv:
+                writer = csv.writer(sys.stdout)
+                writer.writerow(['region', 'buildings', 'with_area', 'roof_area', 'types'])
+                for total in totals:
+                    writer.writerow([total['region'], total['buildings'], total['with_area'],
+                                     round(total['roof_area'], 1), json.dumps(total['types'], ensure_ascii=False)])
+            else:
+                for total in totals:
+                    top = ', '.join(f"{name} {count}" for name, count in
+                                    sorted(total['types'].items(), key=lambda item: -item[1])[:3])
+                    print(f"{total['region'] or '(unknown)':<24} {total['buildings']:>8} "
+                          f"{total['roof_area']:>12.0f} m²  {top}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,361 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+# Snapshot file layout
+#   fixed header : magic, format version, codec, element count
+#   meta header  : u32 length + compact JSON (osm_base, query_hash, generator, ...)
+#   body         : gzip or zstd stream of length-prefixed element records
+#
+# Element record (little endian):
+#   flags/type u8, id i64, lat*1e7 i32, lon*1e7 i32, new strings u16, tags u16, way nodes u32
+#   new strings  : u16 length + utf-8 bytes each, appended to the shared string table
+#   tags         : pairs of u32 string table indices (key, value)
+#   way nodes    : i64 node ids
+#   rest         : compact JSON of any remaining fields (geometry, members, bounds, ...)
+MAGIC = b'OSMSNP'
+VERSION = 1
+CODEC_GZIP = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {CODEC_GZIP: 'gzip', CODEC_ZSTD: 'zstd'}
+
+_FIXED = struct.Struct('<6sBBQ')
+_COUNT_OFFSET = 8
+_U32 = struct.Struct('<I')
+_U16 = struct.Struct('<H')
+_CORE = struct.Struct('<BqiiHHI')
+_READ_BLOCK = 1 << 18
+
+TYPE_CODES = {'node': 0, 'way': 1, 'relation': 2}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+_TYPE_MASK = 0x0F
+_UNKNOWN_TYPE = 0x0F
+_CENTER_FLAG = 0x10
+_NO_COORD = -2 ** 31
+_SCALE = 10 ** 7
+
+
+def query_hash(query):
+    """Returns a stable hash of an Overpass query text."""
+    if not query:
+        return None
+    return hashlib.sha256(query.strip().encode('utf-8')).hexdigest()
+
+
+def _to_e7(value):
+    """Returns value as a 1e-7 fixed-point int, or None if that would lose precision."""
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    scaled = round(value * _SCALE)
+    if not -2 ** 31 < scaled < 2 ** 31 or scaled / _SCALE != value:
+        return None
+    return scaled
+
+
+class SnapshotWriter:
+    """Streams Overpass elements into a compressed snapshot file."""
+
+    def __init__(self, path, osm_base=None, query=None, meta=None, codec=None, level=None):
+        if codec is None:
+            codec = CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise RuntimeError("zstd snapshots need the 'zstandard' package (pip install zstandard)")
+
+        self.path = path
+        self.count = 0
+        self._strings = {}
+        self._file = open(path, 'wb')
+
+        header = dict(meta or {})
+        header['osm_base'] = osm_base
+        header['query_hash'] = query_hash(query)
+        header['created'] = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        meta_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        self._file.write(_FIXED.pack(MAGIC, VERSION, codec, 0))
+        self._file.write(_U32.pack(len(meta_bytes)))
+        self._file.write(meta_bytes)
+
+        if codec == CODEC_ZSTD:
+            compressor = zstandard.ZstdCompressor(level=level or 10)
+            self._stream = compressor.stream_writer(self._file, closefd=False)
+        else:
+            self._stream = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=level or 6, mtime=0)
+
+    def _intern(self, text, new_strings):
+        index = self._strings.get(text)
+        if index is None:
+            index = len(self._strings)
+            self._strings[text] = index
+            new_strings.append(text)
+        return index
+
+    def write(self, element):
+        """Appends one Overpass element (dict) to the snapshot."""
+        rest = dict(element)
+        kind = TYPE_CODES.get(rest.get('type'), _UNKNOWN_TYPE)
+        osm_id = rest.get('id')
+        valid_id = isinstance(osm_id, int) and not isinstance(osm_id, bool) and -2 ** 63 <= osm_id < 2 ** 63
+        if kind != _UNKNOWN_TYPE and valid_id:
+            del rest['type'], rest['id']
+        else:
+            kind, osm_id = _UNKNOWN_TYPE, 0
+
+        lat = lon = _NO_COORD
+        lat_e7, lon_e7 = _to_e7(rest.get('lat')), _to_e7(rest.get('lon'))
+        center = rest.get('center')
+        if lat_e7 is not None and lon_e7 is not None:
+            lat, lon = lat_e7, lon_e7
+            del rest['lat'], rest['lon']
+        elif isinstance(center, dict) and set(center) == {'lat', 'lon'}:
+            lat_e7, lon_e7 = _to_e7(center['lat']), _to_e7(center['lon'])
+            if lat_e7 is not None and lon_e7 is not None:
+                lat, lon = lat_e7, lon_e7
+                kind |= _CENTER_FLAG
+                del rest['center']
+
+        new_strings = []
+        indices = []
+        tags = rest.get('tags')
+        if isinstance(tags, dict) and tags and all(isinstance(v, str) for v in tags.values()):
+            for key, value in tags.items():
+                indices.append(self._intern(key, new_strings))
+                indices.append(self._intern(value, new_strings))
+            del rest['tags']
+
+        nodes = rest.get('nodes')
+        if isinstance(nodes, list) and nodes and all(type(n) is int and -2 ** 63 <= n < 2 ** 63 for n in nodes):
+            del rest['nodes']
+        else:
+            nodes = ()
+
+        parts = [_CORE.pack(kind, osm_id, lat, lon, len(new_strings), len(indices) // 2, len(nodes))]
+        for text in new_strings:
+            encoded = text.encode('utf-8')
+            parts.append(_U16.pack(len(encoded)))
+            parts.append(encoded)
+        if indices:
+            parts.append(struct.pack('<%dI' % len(indices), *indices))
+        if nodes:
+            parts.append(struct.pack('<%dq' % len(nodes), *nodes))
+        if rest:
+            parts.append(json.dumps(rest, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+        payload = b''.join(parts)
+        self._stream.write(_U32.pack(len(payload)) + payload)
+        self.count += 1
+
+    def close(self):
+        """Finishes the compressed stream and records the element count in the header."""
+        if self._file.closed:
+            return
+        self._stream.close()
+        self._file.seek(_COUNT_OFFSET)
+        self._file.write(struct.pack('<Q', self.count))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _decode(payload, strings, pos, end):
+    kind, osm_id, lat, lon, new_count, tag_count, node_count = _CORE.unpack_from(payload, pos)
+    pos += _CORE.size
+    for _ in range(new_count):
+        (length,) = _U16.unpack_from(payload, pos)
+        pos += 2
+        strings.append(payload[pos:pos + length].decode('utf-8'))
+        pos += length
+
+    element = {}
+    type_code = kind & _TYPE_MASK
+    if type_code != _UNKNOWN_TYPE:
+        element['type'] = TYPE_NAMES[type_code]
+        element['id'] = osm_id
+    if lat != _NO_COORD:
+        if kind & _CENTER_FLAG:
+            element['center'] = {'lat': lat / _SCALE, 'lon': lon / _SCALE}
+        else:
+            element['lat'] = lat / _SCALE
+            element['lon'] = lon / _SCALE
+
+    tags = None
+    if tag_count:
+        indices = struct.unpack_from('<%dI' % (tag_count * 2), payload, pos)
+        pos += tag_count * 8
+        tags = dict(zip(map(strings.__getitem__, indices[0::2]), map(strings.__getitem__, indices[1::2])))
+    if node_count:
+        element['nodes'] = list(struct.unpack_from('<%dq' % node_count, payload, pos))
+        pos += node_count * 8
+
+    if pos < end:
+        element.update(json.loads(payload[pos:end].decode('utf-8')))
+    if tags is not None:
+        element['tags'] = tags
+    return element
+
+
+def is_snapshot(path):
+    """Returns True if path is a snapshot file (as opposed to raw Overpass JSON)."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _read_header(f):
+    magic, version, codec, count = _FIXED.unpack(f.read(_FIXED.size))
+    if magic != MAGIC:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a solar snapshot file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    (meta_len,) = _U32.unpack(f.read(_U32.size))
+    header = json.loads(f.read(meta_len).decode('utf-8'))
+    header.update({'format_version': version, 'codec': CODEC_NAMES.get(codec, codec), 'count': count})
+    return header, codec
+
+
+def _header_from_json(data):
+    osm3s = data.get('osm3s', {})
+    return {
+        'osm_base': osm3s.get('timestamp_osm_base'),
+        'query_hash': None,
+        'generator': data.get('generator'),
+        'osm3s': osm3s,
+        'version': data.get('version'),
+        'format_version': None,
+        'codec': 'json',
+        'count': len(data.get('elements', [])),
+    }
+
+
+def read_header(path):
+    """Returns the header dict (osm_base, query_hash, count, ...) of a snapshot or Overpass JSON file."""
+    if not is_snapshot(path):
+        with open(path, encoding='utf-8') as f:
+            return _header_from_json(json.load(f))
+    with open(path, 'rb') as f:
+        header, _ = _read_header(f)
+    return header
+
+
+def iter_elements(path):
+    """Yields elements one at a time from a snapshot (or, for convenience, an Overpass JSON file)."""
+    if not is_snapshot(path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        yield from data.get('elements', [])
+        return
+
+    with open(path, 'rb') as f:
+        _, codec = _read_header(f)
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Reading zstd snapshots needs the 'zstandard' package (pip install zstandard)")
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        # Decompress in large blocks and cut records out of the buffer, which is much
+        # cheaper than one small read() per record through a file-like wrapper.
+        strings = []
+        buffer = b''
+        while True:
+            chunk = f.read(_READ_BLOCK)
+            if not chunk:
+                break
+            buffer += decompressor.decompress(chunk)
+            pos = 0
+            size = len(buffer)
+            while pos + 4 <= size:
+                (length,) = _U32.unpack_from(buffer, pos)
+                end = pos + 4 + length
+                if end > size:
+                    break
+                yield _decode(buffer, strings, pos + 4, end)
+                pos = end
+            buffer = buffer[pos:]
+        if buffer:
+            raise ValueError(f"{path} is truncated ({len(buffer)} trailing bytes)")
+
+
+def input_path(path):
+    """Returns path, or the Overpass JSON dump of the same name when the snapshot was not made yet.
+
+    Snapshots are build output; make one from a dump with `python snapshot.py convert <dump.json>`.
+    """
+    if not os.path.exists(path):
+        dump = os.path.splitext(path)[0] + '.json'
+        if os.path.exists(dump):
+            return dump
+    return path
+
+
+def load_elements(path):
+    """Returns all elements of a snapshot or Overpass JSON file as a list."""
+    return list(iter_elements(path))
+
+
+def save_snapshot(data, path, query=None, codec=None):
+    """Writes an Overpass JSON response (dict) to a snapshot file and returns the element count."""
+    meta = {key: data[key] for key in ('version', 'generator', 'osm3s') if key in data}
+    osm_base = data.get('osm3s', {}).get('timestamp_osm_base')
+    with SnapshotWriter(path, osm_base=osm_base, query=query, meta=meta, codec=codec) as writer:
+        for element in data.get('elements', []):
+            writer.write(element)
+    return writer.count
+
+
+def to_overpass_json(path):
+    """Rebuilds the Overpass JSON response dict from a snapshot."""
+    header = read_header(path)
+    data = {key: header[key] for key in ('version', 'generator', 'osm3s') if header.get(key) is not None}
+    data['elements'] = load_elements(path)
+    return data
+
+
+def convert(json_path, snapshot_path=None, query=None, codec=None):
+    """Converts an existing Overpass JSON dump into a snapshot next to it."""
+    if snapshot_path is None:
+        snapshot_path = os.path.splitext(json_path)[0] + '.osnap'
+    with open(json_path, encoding='utf-8') as f:
+        data = json.load(f)
+    count = save_snapshot(data, snapshot_path, query=query, codec=codec)
+    before = os.path.getsize(json_path)
+    after = os.path.getsize(snapshot_path)
+    print(f"Converted {count} elements: {json_path} ({before:,} bytes) -> {snapshot_path} ({after:,} bytes, {before / max(after, 1):.1f}x smaller)")
+    return snapshot_path
+
+
+if __name__ == "__main__":
+    usage = ("Usage:\n"
+             "  python snapshot.py convert <input.json> [output.osnap]\n"
+             "  python snapshot.py info <file.osnap>\n"
+             "  python snapshot.py to-json <input.osnap> <output.json>")
+    if len(sys.argv) < 3:
+        print(usage)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == 'convert':
+        convert(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    elif command == 'info':
+        print(json.dumps(read_header(sys.argv[2]), ensure_ascii=False, indent=2))
+    elif command == 'to-json' and len(sys.argv) > 3:
+        with open(sys.argv[3], 'w', encoding='utf-8') as f:
+            json.dump(to_overpass_json(sys.argv[2]), f, ensure_ascii=False, indent=2)
+        print(f"Wrote {sys.argv[3]}")
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,189 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import struct
+import tempfile
+import time
+import config
+import snapshot
+from store import element_coords
+
+# Streaming diff of two Overpass snapshots (.osnap or Overpass JSON).
+#
+# Each element is reduced to a fixed 33-byte record: (type, id) as the sort key, a
+# fingerprint of its tags, a fingerprint of its geometry and its coordinates. Records
+# are sorted in runs of --chunk-size, spilled to temporary files when a snapshot has
+# more than one run, and merged back with heapq.merge, so memory stays bounded however
+# big the snapshots are. Overpass already returns elements ordered by type and id,
+# which makes every sort a single linear pass. The two sorted streams are then joined
+# in one merge pass.
+#
+# Output, for --prefix P:
+#   P.added.csv, P.removed.csv, P.tags.csv, P.moved.csv   osm_type, osm_id, lat, lon
+#   P.geocode.osnap   added, moved and tag-changed elements from the new snapshot,
+#                     ready for `pipeline.py --input P.geocode.osnap`
+#   P.summary.json    counts and snapshot headers
+#
+#   python snapshot_diff.py Output/last_month.osnap Output/today.osnap
+
+_RECORD = struct.Struct('>BQqqii')
+_KEY_SIZE = 9  # type + id, big-endian so the raw bytes sort in (type, id) order
+CHUNK_SIZE = 500_000  # records per in-memory run (~40 MB)
+CHANGE_KINDS = ('added', 'removed', 'tags', 'moved')
+_NO_COORD = -2 ** 31
+
+
+def _tags_fingerprint(tags):
+    # Python's hash() is stable within a process, and records never outlive the diff
+    return hash(frozenset(tags.items()))
+
+
+def _geometry_fingerprint(lat, lon, element):
+    nodes = element.get('nodes')
+    extra = element.get('geometry') or element.get('members')
+    return hash((lat, lon, tuple(nodes) if nodes else None, repr(extra) if extra else None))
+
+
+def _e7(value):
+    return _NO_COORD if value is None else int(round(value * 1e7))
+
+
+def record(element):
+    """Packs an element into its sortable diff record."""
+    lat, lon = element_coords(element)
+    lat, lon = _e7(lat), _e7(lon)
+    return _RECORD.pack(snapshot.TYPE_CODES.get(element.get('type'), 15), element['id'],
+                        _tags_fingerprint(element.get('tags', {})), _geometry_fingerprint(lat, lon, element), lat, lon)
+
+
+def _read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(_RECORD.size * 8192)
+            if not block:
+                return
+            for offset in range(0, len(block), _RECORD.size):
+                yield block[offset:offset + _RECORD.size]
+
+
+def sorted_records(path, tmpdir, chunk_size=CHUNK_SIZE):
+    """Yields the diff records of a snapshot in (type, id) order using an external merge sort."""
+    runs = []
+    chunk = []
+    for element in snapshot.iter_elements(path):
+        chunk.append(record(element))
+        if len(chunk) >= chunk_size:
+            chunk.sort()
+            # mkstemp, not the snapshot's file name: both snapshots spill into the same
+            # directory and may well share a name (2026-09/solar.osnap, 2026-10/solar.osnap)
+            fd, run = tempfile.mkstemp(suffix='.run', dir=tmpdir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b''.join(chunk))
+            runs.append(run)
+            chunk = []
+    chunk.sort()
+    if not runs:
+        yield from chunk
+        return
+    yield from heapq.merge(chunk, *(_read_run(run) for run in runs))
+
+
+def diff_records(old, new):
+    """Merge-joins two sorted record streams. Yields (kind, record), kind in CHANGE_KINDS.
+
+    An element whose tags and geometry both changed is reported as 'tags' and as 'moved'.
+    For removed elements the record is the old one, otherwise the new one.
+    """
+    old_record = next(old, None)
+    new_record = next(new, None)
+    while old_record is not None or new_record is not None:
+        if new_record is None or (old_record is not None and old_record[:_KEY_SIZE] < new_record[:_KEY_SIZE]):
+            yield 'removed', old_record
+            old_record = next(old, None)
+        elif old_record is None or new_record[:_KEY_SIZE] < old_record[:_KEY_SIZE]:
+            yield 'added', new_record
+            new_record = next(new, None)
+        else:
+            if old_record[9:17] != new_record[9:17]:
+                yield 'tags', new_record
+            if old_record[17:25] != new_record[17:25]:
+                yield 'moved', new_record
+            old_record = next(old, None)
+            new_record = next(new, None)
+
+
+def _row(packed):
+    type_code, osm_id, _, _, lat, lon = _RECORD.unpack(packed)
+    return [snapshot.TYPE_NAMES.get(type_code, 'unknown'), osm_id,
+            '' if lat == _NO_COORD else lat / 1e7, '' if lon == _NO_COORD else lon / 1e7]
+
+
+def diff(old_path, new_path, prefix, chunk_size=CHUNK_SIZE):
+    """Diffs two snapshots and writes the change files. Returns the summary dict."""
+    started = time.monotonic()
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    counts = {kind: 0 for kind in CHANGE_KINDS}
+    changed = set()  # (type, id) of elements to geocode again; only changes are kept in memory
+    files = {kind: open(f"{prefix}.{kind}.csv", 'w', newline='', encoding='utf-8') for kind in CHANGE_KINDS}
+    try:
+        writers = {kind: csv.writer(f) for kind, f in files.items()}
+        for writer in writers.values():
+            writer.writerow(['osm_type', 'osm_id', 'lat', 'lon'])
+        with tempfile.TemporaryDirectory(dir=directory or None) as tmpdir:
+            old = sorted_records(old_path, tmpdir, chunk_size)
+            new = sorted_records(new_path, tmpdir, chunk_size)
+            for kind, packed in diff_records(old, new):
+                counts[kind] += 1
+                row = _row(packed)
+                writers[kind].writerow(row)
+                if kind != 'removed':
+                    changed.add((row[0], row[1]))
+    finally:
+        for f in files.values():
+            f.close()
+
+    # Second pass over the new snapshot to copy the full elements the geocoder needs
+    new_header = snapshot.read_header(new_path)
+    geocode_path = f"{prefix}.geocode.osnap"
+    meta = {key: new_header[key] for key in ('version', 'generator', 'osm3s') if key in new_header}
+    with snapshot.SnapshotWriter(geocode_path, osm_base=new_header.get('osm_base'), meta=meta) as writer:
+        if changed:
+            for element in snapshot.iter_elements(new_path):
+                if (element.get('type'), element['id']) in changed:
+                    writer.write(element)
+
+    summary = {
+        'old': {'path': old_path, **snapshot.read_header(old_path)},
+        'new': {'path': new_path, **new_header},
+        'counts': counts,
+        'to_geocode': len(changed),
+        'seconds': round(time.monotonic() - started, 2),
+    }
+    with open(f"{prefix}.summary.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two Overpass snapshots by (type, id), tags and geometry.")
+    parser.add_argument('old', help="older snapshot (.osnap or Overpass JSON)")
+    parser.add_argument('new', help="newer snapshot (.osnap or Overpass JSON)")
+    parser.add_argument('--prefix', help="output path prefix (default: Output/diff_<new file name>)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="records sorted in memory per run")
+    args = parser.parse_args()
+
+    prefix = args.prefix or os.path.join(config.OUTPUT_DIR, f"diff_{os.path.splitext(os.path.basename(args.new))[0]}")
+    summary = diff(args.old, args.new, prefix, args.chunk_size)
+    print(f"Diffed in {summary['seconds']}s: {summary['counts']}")
+    print(f"{summary['to_geocode']} elements to geocode again: {prefix}.geocode.osnap")
+    print(f"Change lists: {prefix}.<added|removed|tags|moved>.csv")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,269 @@
+import math
+
+# Small in-memory spatial helpers shared by the stages that work on coordinates.
+#
+# GridIndex buckets bounding boxes into a uniform lat/lon grid. Lookups touch only the
+# cells a point or box falls in, which keeps point-in-building and bbox queries over a
+# province's worth of footprints at a few dict lookups each, without a dependency on
+# rtree or shapely.
+#
+# Rings are lists of (lat, lon) tuples, as returned by overpass.fetch_geometries().
+
+DEFAULT_CELL = 0.002  # degrees; ~220 m north-south and ~135 m east-west at 52°N
+EARTH_RADIUS = 6371008.8  # metres
+
+
+def bbox_of(points):
+    """Returns (south, west, north, east) of a list of (lat, lon) points."""
+    lats = [lat for lat, _ in points]
+    lons = [lon for _, lon in points]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def bbox_center(bbox):
+    south, west, north, east = bbox
+    return (south + north) / 2, (west + east) / 2
+
+
+def point_in_polygon(lat, lon, ring):
+    """Even-odd ray casting test of a point against a closed or open ring of (lat, lon)."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lat_i, lon_i = ring[i]
+        lat_j, lon_j = ring[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+def ring_area(ring):
+    """Approximate area of a ring in square metres (shoelace on a local equirectangular projection)."""
+    if len(ring) < 3:
+        return 0.0
+    lat0 = math.radians(sum(lat for lat, _ in ring) / len(ring))
+    scale_x = math.cos(lat0) * math.pi / 180 * EARTH_RADIUS
+    scale_y = math.pi / 180 * EARTH_RADIUS
+    area = 0.0
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        area += (ring[j][1] * scale_x) * (ring[i][0] * scale_y) - (ring[i][1] * scale_x) * (ring[j][0] * scale_y)
+        j = i
+    return abs(area) / 2
+
+
+def interior_point(ring):
+    """A (lat, lon) point that lies inside the ring.
+
+    The vertex mean when it is inside (the usual case), otherwise the middle of the widest
+    span where the horizontal line through the middle of the ring crosses its interior,
+    so L- and U-shaped footprints still get a point on the building itself.
+    """
+    lat = sum(point[0] for point in ring) / len(ring)
+    lon = sum(point[1] for point in ring) / len(ring)
+    if point_in_polygon(lat, lon, ring):
+        return lat, lon
+    south, _, north, _ = bbox_of(ring)
+    lat = (south + north) / 2
+    crossings = []
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lat_i, lon_i = ring[i]
+        lat_j, lon_j = ring[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossings.append(lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i))
+        j = i
+    crossings.sort()
+    spans = [(crossings[k + 1] - crossings[k], crossings[k]) for k in range(0, len(crossings) - 1, 2)]
+    if not spans:
+        return lat, lon
+    width, start = max(spans)
+    return lat, start + width / 2
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+HILBERT_MAX = (1 << 16) - 1
+
+
+def hilbert(x, y):
+    """Position of integer cell (x, y), 0..HILBERT_MAX each, along a 16-bit Hilbert curve.
+
+    Branch-free version (from rawrtree) of the curve the FlatGeobuf writers sort their
+    R-tree by; nearby positions on the curve are nearby cells.
+    """
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+    return (i1 << 1) | i0
+
+
+def _spread(value):
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    return (value | (value << 1)) & 0x55555555
+
+
+def zorder(x, y):
+    """Position of integer cell (x, y), 0..HILBERT_MAX each, along a 16-bit Z-order (Morton) curve.
+
+    Cheaper than hilbert() but with jumps at every power-of-two boundary.
+    """
+    return (_spread(y) << 1) | _spread(x)
+
+
+CURVES = {'hilbert': hilbert, 'zorder': zorder}
+
+
+def curve_key(lat, lon, bbox, curve=hilbert):
+    """Position of a point along a curve laid over the (south, west, north, east) box.
+
+    Points outside the box are clamped to its edge.
+    """
+    south, west, north, east = bbox
+    x = int(HILBERT_MAX * (lon - west) / ((east - west) or 1.0))
+    y = int(HILBERT_MAX * (lat - south) / ((north - south) or 1.0))
+    return curve(min(max(x, 0), HILBERT_MAX), min(max(y, 0), HILBERT_MAX))
+
+
+def curve_order(points, bbox=None, curve=hilbert):
+    """Indexes of (lat, lon) points sorted along a curve over bbox (default: their own box).
+
+    Consecutive points in this order are close together, which keeps lookups against a
+    database or a coordinate cache on warm pages.
+    """
+    if not points:
+        return []
+    bbox = bbox or bbox_of(points)
+    keys = [curve_key(lat, lon, bbox, curve) for lat, lon in points]
+    return sorted(range(len(points)), key=keys.__getitem__)
+
+
+class GridIndex:
+    """Uniform grid of bounding boxes, keyed by whatever the caller inserts."""
+
+    def __init__(self, cell=DEFAULT_CELL):
+        self.cell = cell
+        self.cells = {}
+        self.boxes = {}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _range(self, bbox):
+        south, west, north, east = bbox
+        return (range(math.floor(south / self.cell), math.floor(north / self.cell) + 1),
+                range(math.floor(west / self.cell), math.floor(east / self.cell) + 1))
+
+    def insert(self, key, bbox):
+        """Adds key with its (south, west, north, east) box; a point is a box with no extent."""
+        self.boxes[key] = bbox
+        rows, cols = self._range(bbox)
+        for row in rows:
+            for col in cols:
+                self.cells.setdefault((row, col), []).append(key)
+
+    def insert_point(self, key, lat, lon):
+        self.insert(key, (lat, lon, lat, lon))
+
+    def remove(self, key):
+        bbox = self.boxes.pop(key)
+        rows, cols = self._range(bbox)
+        for row in rows:
+            for col in cols:
+                bucket = self.cells[(row, col)]
+                bucket.remove(key)
+                if not bucket:
+                    del self.cells[(row, col)]
+
+    def at(self, lat, lon):
+        """Keys whose box contains the point."""
+        bucket = self.cells.get((math.floor(lat / self.cell), math.floor(lon / self.cell)), ())
+        found = []
+        for key in bucket:
+            south, west, north, east = self.boxes[key]
+            if south <= lat <= north and west <= lon <= east:
+                found.append(key)
+        return found
+
+    def within(self, bbox):
+        """Keys whose box intersects the (south, west, north, east) box."""
+        south, west, north, east = bbox
+        rows, cols = self._range(bbox)
+        if len(rows) * len(cols) > len(self.cells):
+            # a box larger than the occupied area: walk the occupied cells instead of the box
+            cells = [cell for cell in self.cells if cell[0] in rows and cell[1] in cols]
+        else:
+            cells = [(row, col) for row in rows for col in cols]
+        seen = set()
+        found = []
+        for cell in cells:
+            for key in self.cells.get(cell, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                k_south, k_west, k_north, k_east = self.boxes[key]
+                if k_south <= north and k_north >= south and k_west <= east and k_east >= west:
+                    found.append(key)
+        return found
+
+    def near(self, lat, lon, radius):
+        """Keys whose box lies within radius metres of the point (exact for points), nearest first."""
+        d_lat = math.degrees(radius / EARTH_RADIUS)
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        found = []
+        for key in self.within((lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)):
+            south, west, north, east = self.boxes[key]
+            nearest_lat = min(max(lat, south), north)
+            nearest_lon = min(max(lon, west), east)
+            metres = distance(lat, lon, nearest_lat, nearest_lon)
+            if metres <= radius:
+                found.append((metres, key))
+        found.sort(key=lambda pair: pair[0])
+        return [key for _, key in found]
@@ -0,0 +1,297 @@
+import csv
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import config
+import snapshot
+
+DEFAULT_DB = config.STORE_DB_PATH
+
+# Canonical enrichment fields and the column names the existing CSV outputs use for them
+FIELDS = ['street', 'huisnummer', 'postcode', 'city', 'country', 'province', 'gebruiksdoel', 'functie']
+CSV_ALIASES = {
+    'street': 'street', 'Street': 'street',
+    'huisnummer': 'huisnummer', 'Housenumber': 'huisnummer',
+    'postcode': 'postcode', 'Postal code': 'postcode',
+    'city': 'city', 'City': 'city',
+    'Country': 'country',
+    'Province': 'province',
+    'Gebruiksdoel': 'gebruiksdoel',
+    'Functie': 'functie',
+}
+LAT_COLUMNS = ('Latitude', 'Latidtude LAT')
+LON_COLUMNS = ('Longitude', 'Longtitude LNG')
+EMPTY_VALUES = ('', 'N/A', None)
+
+EXPORT_COLUMNS = ['Objectnummer', 'osm_type', 'street', 'huisnummer', 'postcode', 'city', 'Country',
+                  'Longitude', 'Latitude', 'maps_url', 'Province', 'Gebruiksdoel', 'Functie']
+EXPORT_NAMES = {'country': 'Country', 'province': 'Province', 'gebruiksdoel': 'Gebruiksdoel', 'functie': 'Functie'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS elements (
+    osm_type   TEXT    NOT NULL,
+    osm_id     INTEGER NOT NULL,
+    lat        REAL,
+    lon        REAL,
+    tags       TEXT,
+    source     TEXT,
+    first_seen TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (osm_type, osm_id)
+);
+CREATE INDEX IF NOT EXISTS elements_by_id ON elements (osm_id);
+CREATE TABLE IF NOT EXISTS fields (
+    osm_type   TEXT    NOT NULL,
+    osm_id     INTEGER NOT NULL,
+    field      TEXT    NOT NULL,
+    value      TEXT,
+    source     TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (osm_type, osm_id, field)
+);
+"""
+
+
+def utc_now():
+    """Returns the current UTC time in the same format Overpass uses for osm_base."""
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _file_time(path):
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def element_coords(element):
+    """Returns (lat, lon) of an Overpass element, using 'center' for ways and relations."""
+    lat = element.get('lat')
+    lon = element.get('lon')
+    if lat is None or lon is None:
+        center = element.get('center') or {}
+        lat, lon = center.get('lat'), center.get('lon')
+    return lat, lon
+
+
+class SolarStore:
+    """SQLite store of OSM solar elements and their enrichment fields, keyed on (osm_type, osm_id)."""
+
+    def __init__(self, path=DEFAULT_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def upsert_element(self, element, source, seen_at=None):
+        """Inserts or refreshes one Overpass element. Older data never replaces newer data.
+
+        An element whose tags and coordinates did not change keeps its updated_at, so
+        rollups.py only revisits what really changed.
+        """
+        seen_at = seen_at or utc_now()
+        lat, lon = element_coords(element)
+        tags = json.dumps(element.get('tags', {}), ensure_ascii=False, sort_keys=True)
+        self.conn.execute(
+            """INSERT INTO elements (osm_type, osm_id, lat, lon, tags, source, first_seen, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (osm_type, osm_id) DO UPDATE SET
+                   lat = excluded.lat, lon = excluded.lon, tags = excluded.tags,
+                   source = excluded.source, updated_at = excluded.updated_at
+               WHERE excluded.updated_at >= elements.updated_at
+                 AND (elements.tags IS NOT excluded.tags OR elements.lat IS NOT excluded.lat
+                      OR elements.lon IS NOT excluded.lon)""",
+            (element['type'], element['id'], lat, lon, tags, source, seen_at, seen_at))
+
+    def upsert_fields(self, osm_type, osm_id, values, source, updated_at=None):
+        """Records enrichment results for one element, keeping a source and timestamp per field.
+
+        Empty and "N/A" values are ignored so a failed lookup never erases a good one, and
+        a value that did not change keeps its source and updated_at.
+        """
+        updated_at = updated_at or utc_now()
+        rows = [(osm_type, osm_id, field, str(value), source, updated_at)
+                for field, value in values.items() if value not in EMPTY_VALUES]
+        self.conn.executemany(
+            """INSERT INTO fields (osm_type, osm_id, field, value, source, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (osm_type, osm_id, field) DO UPDATE SET
+                   value = excluded.value, source = excluded.source, updated_at = excluded.updated_at
+               WHERE excluded.updated_at >= fields.updated_at AND fields.value IS NOT excluded.value""",
+            rows)
+        return len(rows)
+
+    def get_fields(self, osm_type, osm_id):
+        """Returns {field: value} for one element."""
+        cursor = self.conn.execute(
+            "SELECT field, value FROM fields WHERE osm_type = ? AND osm_id = ?", (osm_type, osm_id))
+        return {row['field']: row['value'] for row in cursor}
+
+    def has_fields(self, osm_type, osm_id, fields=('street', 'postcode', 'city')):
+        """Returns True if all given fields are already known, so the element can be skipped."""
+        known = self.get_fields(osm_type, osm_id)
+        return all(known.get(field) not in EMPTY_VALUES for field in fields)
+
+    def resolve_type(self, osm_id, lat=None, lon=None):
+        """Finds the element type for a bare OSM id (as in the 'Objectnummer' column).
+
+        Node and way ids can collide, so if both exist the coordinates decide.
+        Returns None when the id is unknown or still ambiguous.
+        """
+        candidates = self.conn.execute(
+            "SELECT osm_type, lat, lon FROM elements WHERE osm_id = ?", (osm_id,)).fetchall()
+        if len(candidates) == 1:
+            return candidates[0]['osm_type']
+        if lat is not None and lon is not None:
+            matches = [row['osm_type'] for row in candidates
+                       if row['lat'] is not None and abs(row['lat'] - lat) < 1e-6 and abs(row['lon'] - lon) < 1e-6]
+            if len(matches) == 1:
+                return matches[0]
+        return None
+
+    def import_elements(self, path, source=None):
+        """Upserts every element of a snapshot or Overpass JSON file."""
+        header = snapshot.read_header(path)
+        seen_at = header.get('osm_base') or _file_time(path)
+        source = source or os.path.basename(path)
+        count = 0
+        with self.conn:
+            for element in snapshot.iter_elements(path):
+                self.upsert_element(element, source, seen_at)
+                count += 1
+        print(f"Imported {count} elements from {path} (osm_base {seen_at})")
+        return count
+
+    def import_csv(self, path, source, osm_type='auto'):
+        """Upserts the address fields of an existing output CSV.
+
+        osm_type is 'node', 'way' or 'auto'. With 'auto' the type comes from an
+        OSM_Way_ID column if present, otherwise from the elements already in the store.
+        """
+        updated_at = _file_time(path)
+        imported = unresolved = 0
+        with self.conn, open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                osm_id = int(row['Objectnummer'])
+                lat = _first_float(row, LAT_COLUMNS)
+                lon = _first_float(row, LON_COLUMNS)
+
+                element_type = osm_type
+                if element_type == 'auto':
+                    element_type = 'way' if row.get('OSM_Way_ID') else self.resolve_type(osm_id, lat, lon)
+                if element_type is None:
+                    unresolved += 1
+                    continue
+
+                self.conn.execute(
+                    """INSERT INTO elements (osm_type, osm_id, lat, lon, source, first_seen, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (osm_type, osm_id) DO NOTHING""",
+                    (element_type, osm_id, lat, lon, source, updated_at, updated_at))
+                values = {CSV_ALIASES[column]: value for column, value in row.items() if column in CSV_ALIASES}
+                self.upsert_fields(element_type, osm_id, values, source, updated_at)
+                imported += 1
+
+        print(f"Imported {imported} rows from {path} as source '{source}'")
+        if unresolved:
+            print(f"  {unresolved} rows skipped: OSM type unknown (import the matching Overpass snapshot first)")
+        return imported
+
+    def missing(self, fields):
+        """Yields (osm_type, osm_id, lat, lon) for elements lacking any of the given fields."""
+        placeholders = ', '.join('?' for _ in fields)
+        cursor = self.conn.execute(
+            f"""SELECT e.osm_type, e.osm_id, e.lat, e.lon FROM elements e
+                WHERE (SELECT COUNT(*) FROM fields f
+                       WHERE f.osm_type = e.osm_type AND f.osm_id = e.osm_id
+                         AND f.field IN ({placeholders})) < ?
+                ORDER BY e.osm_type, e.osm_id""",
+            (*fields, len(fields)))
+        for row in cursor:
+            yield row['osm_type'], row['osm_id'], row['lat'], row['lon']
+
+    def rows(self, with_sources=False):
+        """Yields the consolidated view: one dict per element with its newest known fields."""
+        cursor = self.conn.execute(
+            """SELECT e.osm_type, e.osm_id, e.lat, e.lon, f.field, f.value, f.source, f.updated_at
+               FROM elements e LEFT JOIN fields f ON f.osm_type = e.osm_type AND f.osm_id = e.osm_id
+               ORDER BY e.osm_type, e.osm_id""")
+        current = None
+        for record in cursor:
+            key = (record['osm_type'], record['osm_id'])
+            if current is None or current[0] != key:
+                if current is not None:
+                    yield current[1]
+                lat, lon = record['lat'], record['lon']
+                row = {column: '' for column in EXPORT_COLUMNS}
+                row.update({
+                    'Objectnummer': record['osm_id'],
+                    'osm_type': record['osm_type'],
+                    'Longitude': lon if lon is not None else '',
+                    'Latitude': lat if lat is not None else '',
+                    'maps_url': f"https://www.google.com/maps?q={lat},{lon}" if lat is not None else '',
+                })
+                current = (key, row)
+            if record['field']:
+                column = EXPORT_NAMES.get(record['field'], record['field'])
+                current[1][column] = record['value']
+                if with_sources:
+                    current[1][f"{column}_source"] = f"{record['source']}@{record['updated_at']}"
+        if current is not None:
+            yield current[1]
+
+    def export_csv(self, path, with_sources=False):
+        """Writes the consolidated view to a CSV file and returns the row count."""
+        columns = list(EXPORT_COLUMNS)
+        if with_sources:
+            columns += [f"{EXPORT_NAMES.get(field, field)}_source" for field in FIELDS]
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for row in self.rows(with_sources):
+                writer.writerow(row)
+                count += 1
+        print(f"Exported {count} rows to {path}")
+        return count
+
+
+def _first_float(row, columns):
+    for column in columns:
+        value = row.get(column)
+        if value not in EMPTY_VALUES:
+            return float(value)
+    return None
+
+
+if __name__ == "__main__":
+    usage = ("Usage:\n"
+             "  python store.py import-elements <snapshot.osnap|overpass.json> [source]\n"
+             "  python store.py import-csv <file.csv> <source> [node|way|auto]\n"
+             "  python store.py export <output.csv> [--with-sources]\n"
+             "Set SOLAR_STORE_DB to use a different database file.")
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(usage)
+        sys.exit(1)
+
+    with SolarStore() as solar_store:
+        if args[0] == 'import-elements':
+            solar_store.import_elements(args[1], args[2] if len(args) > 2 else None)
+        elif args[0] == 'import-csv' and len(args) > 2:
+            solar_store.import_csv(args[1], args[2], args[3] if len(args) > 3 else 'auto')
+        elif args[0] == 'export':
+            solar_store.export_csv(args[1], with_sources='--with-sources' in args)
+        else:
+            print(usage)
+            sys.exit(1)
@@ -0,0 +1,35 @@
+import copy
+import os
+import sys
+import pytest
+
+# The scripts import each other by module name (they are run from scripts/), so the
+# tests do the same
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+
+@pytest.fixture
+def mock_services():
+    """Starts the mock servers (settings maps service name to MockSettings) and points config.py at them."""
+    import config
+    import geocode
+    import mock_servers
+    saved = {name: copy.deepcopy(getattr(config, name)) for name in
+             ('OVERPASS_API_CONFIG', 'NOMINATIM_API_CONFIG', 'LOCATIONIQ_API_CONFIG', 'PDOK_API_CONFIG')}
+    intervals = {name: limiter.interval for name, limiter in geocode.LIMITERS.items()}
+    started = []
+
+    def start(settings=None):
+        servers = mock_servers.start_mock_servers(settings)
+        started.extend(servers.values())
+        mock_servers.point_config_at({name: server.url for name, server in servers.items()})
+        return servers
+
+    yield start
+    for server in started:
+        server.stop()
+    for name, value in saved.items():
+        getattr(config, name).clear()
+        getattr(config, name).update(value)
+    for name, interval in intervals.items():
+        geocode.LIMITERS[name].interval = interval
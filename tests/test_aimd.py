@@ -0,0 +1,71 @@
+import threading
+import pytest
+import aimd
+
+
+def _window(controller, latency=0.01, errors=0, window=10):
+    for i in range(window):
+        controller.observe(latency, i >= errors)
+
+
+def test_busy_slots_raise_the_limit():
+    controller = aimd.AimdController('nominatim', initial=2, maximum=3, window=10)
+    controller.acquire()
+    controller.acquire()
+    _window(controller)
+    assert controller.limit == 3
+    _window(controller)  # both slots are still taken: 3 allowed, 2 used
+    assert controller.limit == 3
+    controller.acquire()
+    _window(controller)
+    assert controller.limit == 3  # capped at maximum
+    assert [(old, new) for _, old, new, _ in controller.adjustments] == [(2, 3)]
+
+
+def test_errors_and_slow_responses_halve_the_limit():
+    controller = aimd.AimdController('nominatim', initial=8, window=10)
+    _window(controller, errors=2)
+    assert controller.limit == 4
+    assert controller.adjustments[-1][3] == 'error rate 20%'
+    # the baseline is the best p95 so far (0.01s); the tolerance is 2x
+    _window(controller, latency=0.015)
+    assert controller.limit == 4
+    _window(controller, latency=0.05)
+    assert controller.limit == 2
+    assert controller.baseline == pytest.approx(0.01 * 1.05 ** 2)  # drifts up 5% per window
+    controller = aimd.AimdController('nominatim', initial=8, window=10, latency_target=0.05)
+    _window(controller, latency=0.1)
+    assert controller.limit == 4
+
+
+def test_limit_never_drops_below_minimum():
+    controller = aimd.AimdController('nominatim', initial=1, window=10)
+    _window(controller, errors=10)
+    assert controller.limit == 1
+
+
+def test_http_hook_counts_429_and_5xx_as_errors():
+    controller = aimd.AimdController('nominatim', initial=8, window=10)
+    for status in [200] * 6 + [429, 503, None]:
+        controller.http_hook({'provider': 'nominatim', 'status': status, 'elapsed': 0.01})
+    controller.http_hook({'provider': 'pdok', 'status': 500, 'elapsed': 0.01})  # someone else's
+    assert controller.limit == 8
+    controller.http_hook({'provider': 'nominatim', 'status': 200, 'elapsed': 0.01})
+    assert controller.limit == 4
+
+
+def test_acquire_waits_for_a_free_slot():
+    controller = aimd.AimdController('nominatim', initial=1)
+    controller.acquire()
+    entered = threading.Event()
+
+    def worker():
+        with controller.slot():
+            entered.set()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not entered.wait(0.1)
+    controller.release()
+    assert entered.wait(5)
+    thread.join()
+    assert controller.in_flight == 0
@@ -0,0 +1,26 @@
+import types
+import benchmark
+
+# Nothing listens here; the strategies below stop before they send a request
+SERVERS = {name: types.SimpleNamespace(url='http://127.0.0.1:9')
+           for name in ('overpass', 'nominatim', 'locationiq', 'pdok')}
+
+
+def test_percentile():
+    assert benchmark.percentile([], 0.5) is None
+    assert benchmark.percentile([3, 1, 2], 0.5) == 2
+    assert benchmark.percentile(list(range(1, 101)), 0.9) == 90
+
+
+def test_strategy_error_is_reported():
+    result = benchmark.run_strategy('no-such-strategy', SERVERS, {'blocked_wait': 0})
+    assert result['rows'] == 0
+    assert result['error'] == "KeyError('no-such-strategy')"
+
+
+def test_dead_strategy_process_is_reported_as_failed():
+    # without blocked_wait the child fails before it can report anything
+    result = benchmark.run_strategy('fetch-streaming', SERVERS, {}, timeout=30)
+    assert result['rows'] == 0
+    assert result['error'] == 'process exited with code 1 without a result'
+    benchmark.report({'version': 'v', 'timestamp': 't', 'results': [result]}, None)
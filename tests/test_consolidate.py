@@ -0,0 +1,51 @@
+import consolidate
+import overpass
+
+
+def _square(way_id, south, west, size, tags=None):
+    corners = [(south, west), (south, west + size), (south + size, west + size), (south + size, west), (south, west)]
+    return {'type': 'way', 'id': way_id, 'tags': tags or {'building': 'yes'},
+            'center': {'lat': south + size / 2, 'lon': west + size / 2},
+            'geometry': [{'lat': lat, 'lon': lon} for lat, lon in corners]}
+
+
+def _panel(node_id, lat, lon):
+    return {'type': 'node', 'id': node_id, 'lat': lat, 'lon': lon, 'tags': {'generator:source': 'solar'}}
+
+
+def test_nodes_fold_into_the_smallest_building():
+    elements = [
+        _panel(1, 52.0005, 4.0005),  # in the annex, which lies inside the hall
+        _panel(2, 52.0008, 4.0008),  # in the hall only
+        _square(10, 52.0, 4.0, 0.001),
+        _square(11, 52.0004, 4.0004, 0.0002, tags={'building': 'shed', 'generator:source': 'solar'}),
+        _panel(3, 52.5, 4.5),  # in no building
+        _square(12, 52.2, 4.2, 0.001, tags={'generator:source': 'solar'}),  # a solar field, not a building
+    ]
+    records, stats = consolidate.consolidate(elements, fetch=False)
+    assert [(record['type'], record['id'], record['solar']) for record in records] == [
+        ('way', 10, {'panel_count': 1, 'node_ids': [2]}),
+        ('way', 11, {'panel_count': 2, 'node_ids': [1]}),  # its own tag counts as a panel
+        ('node', 3, {'panel_count': 1, 'node_ids': [3]}),
+        ('way', 12, {'panel_count': 1, 'node_ids': []}),
+    ]
+    assert stats == {'elements': 6, 'records': 4, 'merged_nodes': 2, 'buildings_with_panels': 2,
+                     'host_buildings_fetched': 0, 'nodes_without_building': 1}
+
+
+def test_host_buildings_are_fetched_for_loose_nodes(monkeypatch):
+    monkeypatch.setattr(overpass, 'attach_geometry', lambda elements, needs, url=None: None)
+    asked = []
+
+    def fetch_host_buildings(node_ids, url=None):
+        asked.append(node_ids)
+        return [_square(20, 52.0, 4.0, 0.001)]
+    monkeypatch.setattr(consolidate, 'fetch_host_buildings', fetch_host_buildings)
+
+    records, stats = consolidate.consolidate([_panel(1, 52.0005, 4.0005), _panel(2, 52.0006, 4.0006),
+                                              _panel(3, 53.0, 5.0)])
+    assert asked == [[1, 2, 3]]
+    # the fetched building takes the place of the first node merged into it
+    assert [(record['type'], record['id'], record['solar']['node_ids']) for record in records] == [
+        ('way', 20, [1, 2]), ('node', 3, [3])]
+    assert (stats['host_buildings_fetched'], stats['nodes_without_building']) == (1, 1)
@@ -0,0 +1,55 @@
+import pytest
+import geocode
+from deadletter import DeadLetters
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'store.sqlite')
+
+
+def test_add_resolve_and_stats(path):
+    with DeadLetters(path) as dead_letters:
+        dead_letters.add('node', 1, 52.6, 4.7, 'nominatim', 'timeout')
+        dead_letters.add('node', 2, 52.5, 4.8, 'locationiq', 'HTTP 503')
+        dead_letters.add('node', 1, 52.6, 4.7, 'locationiq', None, attempts=2)
+        assert dead_letters.pending() == [
+            {'osm_type': 'node', 'osm_id': 2, 'lat': 52.5, 'lon': 4.8, 'provider': 'locationiq',
+             'reason': 'HTTP 503', 'attempts': 1},
+            {'osm_type': 'node', 'osm_id': 1, 'lat': 52.6, 'lon': 4.7, 'provider': 'locationiq',
+             'reason': 'no address', 'attempts': 3},
+        ]
+        assert [item['osm_id'] for item in dead_letters.pending(max_attempts=3)] == [2]
+        dead_letters.resolve('node', 2)
+        assert dead_letters.stats() == {'open': 1, 'resolved': 1, 'by_reason': {'no address': 1},
+                                        'by_provider': {'locationiq': 1}}
+
+
+def test_retry_writes_what_resolves(path, monkeypatch):
+    def reverse(lat, lon):
+        return {'road': 'Dam', 'house_number': '1', 'postcode': '1012 JS', 'city': 'Amsterdam'} if lat > 52.5 else None
+    monkeypatch.setitem(geocode.PROVIDERS, 'pdok', reverse)
+    with DeadLetters(path) as dead_letters:
+        dead_letters.add('node', 1, 52.6, 4.7, 'nominatim', 'timeout')
+        dead_letters.add('way', 2, 52.4, 4.8, 'nominatim', 'timeout')
+        assert dead_letters.retry('pdok', workers=2) == (1, 1)
+        assert dead_letters.store.get_fields('node', 1)['street'] == 'Dam'
+        assert dead_letters.conn.execute("SELECT source FROM elements").fetchone()['source'] == 'deadletter'
+        assert dead_letters.pending() == [{'osm_type': 'way', 'osm_id': 2, 'lat': 52.4, 'lon': 4.8,
+                                           'provider': 'pdok', 'reason': 'no address', 'attempts': 2}]
+
+
+def test_import_failed_jobs(path):
+    with DeadLetters(path) as dead_letters:
+        assert dead_letters.import_jobs() == 0  # no job table yet
+    with JobQueue(path, max_attempts=1) as jobs:
+        jobs.enqueue([('node', 1, 52.6, 4.7), ('node', 2, 52.5, 4.8)])
+        token, batch = jobs.lease('a')
+        jobs.complete(token, [(job, None, 'HTTP 500') if job['osm_id'] == 1 else (job, {'street': 'Dam'}, None)
+                              for job in batch], 'nominatim')
+    with DeadLetters(path) as dead_letters:
+        assert dead_letters.import_jobs() == 1
+        assert dead_letters.import_jobs() == 0
+        assert [(item['osm_id'], item['provider'], item['reason']) for item in dead_letters.pending()] == [
+            (1, 'job_queue', 'HTTP 500')]
@@ -0,0 +1,86 @@
+import csv
+import json
+import zlib
+import pytest
+import density
+import rdnew
+
+np = pytest.importorskip('numpy')
+
+DAM = (52.3730, 4.8932)
+DAMRAK = (52.3734, 4.8936)
+HEERHUGOWAARD = (52.6700, 4.8400)
+PARIS = (48.8566, 2.3522)
+
+
+def test_grid_extent_is_snapped_to_the_coarsest_cell():
+    x0, y_top, cols, rows = density.grid_extent()
+    coarsest = density.BASE_CELL * 2 ** (density.LEVELS - 1)
+    assert x0 % coarsest == 0 and y_top % coarsest == 0
+    assert cols % 2 ** (density.LEVELS - 1) == 0 and rows % 2 ** (density.LEVELS - 1) == 0
+
+
+def test_build():
+    lat, lon = zip(DAM, DAMRAK, HEERHUGOWAARD, PARIS)
+    grids, meta = density.build(np.array(lat), np.array(lon), np.array([1, 2, 12, 1], dtype=np.uint32),
+                                np.array([0.0, 0.0, 250.0, 0.0]))
+    assert (meta['points'], meta['outside'], meta['installations'], meta['roof_area']) == (4, 1, 15, 250.0)
+    for size in meta['cell_sizes']:
+        assert grids[f'count_{size}'].sum() == 15
+        assert grids[f'roof_area_{size}'].sum() == 250.0
+    assert grids['count_100'].dtype == np.uint32
+    assert grids['count_100'].shape == tuple(meta['shape'])
+    assert grids['count_3200'].shape == (meta['shape'][0] // 32, meta['shape'][1] // 32)
+
+    # the Heerhugowaard roof lands in the cell its RD coordinate falls in
+    x, y = rdnew.to_rd(*HEERHUGOWAARD)
+    row, col = int((meta['y_top'] - y) // 100), int((x - meta['x0']) // 100)
+    assert grids['count_100'][row, col] == 12
+    assert grids['roof_area_100'][row, col] == 250.0
+
+
+def test_read_points(tmp_path):
+    csv_path = tmp_path / 'pipeline.csv'
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Objectnummer', 'Latitude', 'Longitude', 'panel_count'])
+        writer.writerows([['1', *DAM, '3'], ['2', *DAMRAK, ''], ['3', '', '', '1']])
+    lat, lon, counts, areas = density.read_points(str(csv_path))
+    assert (lat.tolist(), counts.tolist(), areas.tolist()) == ([DAM[0], DAMRAK[0]], [3, 1], [0.0, 0.0])
+
+    square = [{'lat': 52.0, 'lon': 4.0}, {'lat': 52.0, 'lon': 4.001}, {'lat': 52.001, 'lon': 4.001},
+              {'lat': 52.001, 'lon': 4.0}, {'lat': 52.0, 'lon': 4.0}]
+    json_path = tmp_path / 'consolidated.json'
+    json_path.write_text(json.dumps({'elements': [
+        {'type': 'way', 'id': 1, 'center': {'lat': 52.0005, 'lon': 4.0005}, 'geometry': square,
+         'solar': {'panel_count': 4, 'node_ids': [5, 6, 7, 8]}},
+        {'type': 'node', 'id': 9, 'lat': DAM[0], 'lon': DAM[1]},
+    ]}), encoding='utf-8')
+    lat, lon, counts, areas = density.read_points(str(json_path))
+    assert counts.tolist() == [4, 1]
+    assert areas[0] == pytest.approx(68.6 * 111.2, rel=0.01)  # ~69 m x 111 m
+    assert areas[1] == 0.0
+
+
+def test_tiles_and_heatmap(tmp_path):
+    grids, meta = density.build(np.array([DAM[0]]), np.array([DAM[1]]), np.array([7], dtype=np.uint32),
+                                np.array([120.0]), levels=2)
+    written = density.write_tiles(grids, meta, str(tmp_path / 'tiles'), tile_size=64)
+    assert written == 2  # one non-empty tile per level
+    index = json.loads((tmp_path / 'tiles' / 'index.json').read_text())
+    assert index['levels']['100']['dtypes'] == {'count': '<u2', 'roof_area': '<f4'}
+    name = index['levels']['100']['tiles'][0]
+    tile_row, tile_col = map(int, name.split('_'))
+    raw = zlib.decompress((tmp_path / 'tiles' / '100m' / 'count' / f"{name}.bin").read_bytes())
+    tile = np.frombuffer(raw, dtype='<u2').reshape(64, 64)
+    window = grids['count_100'][tile_row * 64:(tile_row + 1) * 64, tile_col * 64:(tile_col + 1) * 64]
+    assert tile.sum() == 7
+    assert (tile[:window.shape[0], :window.shape[1]] == window).all()
+
+    density.write_heatmap(grids['count_200'], str(tmp_path / 'heat.pgm'))
+    data = (tmp_path / 'heat.pgm').read_bytes()
+    rows, cols = grids['count_200'].shape
+    header = f"P5\n{cols} {rows}\n255\n".encode('ascii')
+    assert data.startswith(header)
+    pixels = np.frombuffer(data[len(header):], dtype=np.uint8)
+    assert (pixels.max(), len(pixels)) == (255, rows * cols)
@@ -0,0 +1,78 @@
+import random
+import pytest
+import flatgeobuf
+
+COLUMNS = [('osm_type', flatgeobuf.STRING), ('osm_id', flatgeobuf.LONG), ('panel_count', flatgeobuf.INT),
+           ('area', flatgeobuf.DOUBLE)]
+
+
+def _features(count, seed=1):
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        x, y = rng.uniform(4.5, 5.3), rng.uniform(52.2, 53.2)
+        if i % 3:
+            features.append((flatgeobuf.POINT, [(x, y)], {'osm_type': 'node', 'osm_id': i, 'panel_count': i % 7}))
+        else:
+            ring = [(x, y), (x + 0.001, y), (x + 0.001, y + 0.0005), (x, y + 0.0005), (x, y)]
+            features.append((flatgeobuf.POLYGON, ring, {'osm_type': 'way', 'osm_id': i, 'area': 120.5,
+                                                        'panel_count': 0}))
+    return features
+
+
+def _box(points):
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+@pytest.mark.parametrize('node_size', [flatgeobuf.DEFAULT_NODE_SIZE, 2, 0])
+def test_bbox_query_matches_brute_force(tmp_path, node_size):
+    features = _features(3000)
+    path = str(tmp_path / 'solar.fgb')
+    assert flatgeobuf.write(path, features, COLUMNS, name='solar', node_size=node_size) == 3000
+
+    query = (4.8, 52.5, 4.9, 52.6)
+    expected = {values['osm_id'] for _, points, values in features
+                if not (_box(points)[0] > query[2] or _box(points)[1] > query[3]
+                        or _box(points)[2] < query[0] or _box(points)[3] < query[1])}
+    with flatgeobuf.FlatGeobuf(path) as fgb:
+        assert (fgb.name, fgb.count, fgb.crs_code, fgb.node_size) == ('solar', 3000, 4326, node_size)
+        assert fgb.columns == COLUMNS
+        found = [feature['properties']['osm_id'] for feature in fgb.query(*query)]
+        assert sorted(found) == sorted(expected)
+        assert expected
+
+
+def test_features_round_trip(tmp_path):
+    features = _features(50)
+    path = str(tmp_path / 'solar.fgb')
+    flatgeobuf.write(path, features, COLUMNS)
+    with flatgeobuf.FlatGeobuf(path) as fgb:
+        read = {feature['properties']['osm_id']: feature for feature in fgb.scan()}
+    assert len(read) == 50
+    for geometry_type, points, values in features:
+        feature = read[values['osm_id']]
+        assert feature['properties'] == values
+        if geometry_type == flatgeobuf.POINT:
+            assert feature['geometry'] == {'type': 'Point', 'coordinates': list(points[0])}
+        else:
+            assert feature['geometry'] == {'type': 'Polygon', 'coordinates': [[list(p) for p in points]]}
+
+
+@pytest.mark.parametrize('count', [0, 1, 17])
+def test_small_files(tmp_path, count):
+    path = str(tmp_path / 'solar.fgb')
+    flatgeobuf.write(path, _features(count), COLUMNS, crs_code=28992)
+    with flatgeobuf.FlatGeobuf(path) as fgb:
+        assert fgb.count == count
+        assert fgb.crs_code == 28992
+        assert len(list(fgb.query(-180, -90, 180, 90))) == count
+        assert len(list(fgb.scan())) == count
+        assert fgb.node_size == (flatgeobuf.DEFAULT_NODE_SIZE if count else 0)
+
+
+def test_level_bounds():
+    assert flatgeobuf.level_bounds(1, 16) == [(0, 1)]
+    # 100 leaves, 7 parents, 1 root; leaves last in the file
+    assert flatgeobuf.level_bounds(100, 16) == [(8, 108), (1, 8), (0, 1)]
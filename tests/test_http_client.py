@@ -0,0 +1,41 @@
+import pytest
+import requests
+import config
+import http_client
+from mock_servers import MockSettings
+
+
+@pytest.fixture
+def events():
+    recorded = []
+    hook = http_client.add_hook(recorded.append)
+    yield recorded
+    http_client.remove_hook(hook)
+
+
+def test_requests_share_one_session_per_host(mock_services, events):
+    servers = mock_services({'nominatim': MockSettings(rate_limit=1)})
+    url = f"{servers['nominatim'].url}/reverse"
+    first = http_client.get('nominatim', url, params={'lat': 52.67, 'lon': 4.84, 'format': 'jsonv2'})
+    second = http_client.get('nominatim', url, params={'lat': 52.37, 'lon': 4.89, 'format': 'jsonv2'})
+    assert (first.status_code, second.status_code) == (200, 429)
+    assert http_client.session_for(url) is http_client.session_for(f"{servers['nominatim'].url}/lookup")
+    assert http_client.session_for(url) is not http_client.session_for(servers['pdok'].url)
+
+    assert [(event['provider'], event['method'], event['status']) for event in events] == [
+        ('nominatim', 'GET', 200), ('nominatim', 'GET', 429)]
+    assert events[0]['host'] == servers['nominatim'].url.split('//')[1]
+    assert events[0]['bytes'] == len(first.content)
+    assert events[0]['error'] is None
+
+
+def test_errors_reach_the_hooks(events):
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.post('overpass', 'http://127.0.0.1:9/api/interpreter', data={'data': ''}, timeout=5)
+    assert events[0]['status'] is None
+    assert isinstance(events[0]['error'], requests.exceptions.ConnectionError)
+
+
+def test_timeout_for():
+    assert http_client.timeout_for('pdok') == config.PDOK_API_CONFIG['timeout']
+    assert http_client.timeout_for('other') == http_client.DEFAULT_TIMEOUT
@@ -0,0 +1,104 @@
+import time
+import pytest
+import job_queue
+from job_queue import JobQueue
+
+JOBS = [('node', osm_id, 52.3 + osm_id / 1000, 4.8) for osm_id in range(1, 11)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'store.sqlite')
+
+
+def test_lease_hands_out_each_job_once(path):
+    with JobQueue(path) as queue:
+        assert queue.enqueue(JOBS) == 10
+        assert queue.enqueue(JOBS) == 0
+        token_a, batch_a = queue.lease('a', size=6)
+        token_b, batch_b = queue.lease('b', size=6)
+        _, batch_c = queue.lease('c', size=6)
+        keys_a = {(job['osm_type'], job['osm_id']) for job in batch_a}
+        keys_b = {(job['osm_type'], job['osm_id']) for job in batch_b}
+        assert (len(keys_a), len(keys_b), batch_c) == (6, 4, [])
+        assert not keys_a & keys_b
+        assert all(job['attempts'] == 1 for job in batch_a)
+        assert queue.stats()['leased'] == 10
+
+
+def test_expired_lease_is_handed_out_again_and_old_token_rejected(path):
+    with JobQueue(path, lease_seconds=0.05) as queue:
+        queue.enqueue(JOBS[:3])
+        old_token, batch = queue.lease('crashed')
+        assert len(batch) == 3
+        time.sleep(0.1)
+        assert queue.stats()['expired'] == 3
+        new_token, again = queue.lease('b')
+        assert sorted(job['osm_id'] for job in again) == [1, 2, 3]
+        assert all(job['attempts'] == 2 for job in again)
+
+        fields = {'street': 'Dijk van Kyoto'}
+        assert queue.complete(old_token, [(job, fields, None) for job in batch], 'nominatim') == 0
+        assert queue.complete(new_token, [(job, fields, None) for job in again], 'nominatim') == 3
+        assert queue.stats()['done'] == 3
+        assert queue.store.get_fields('node', 1) == fields
+
+
+def test_heartbeat_keeps_the_lease(path):
+    with JobQueue(path, lease_seconds=0.2) as queue:
+        queue.enqueue(JOBS[:2])
+        token, _ = queue.lease('a')
+        for _ in range(3):
+            time.sleep(0.1)
+            assert queue.heartbeat(token) == 2
+        assert queue.lease('b')[1] == []
+        assert queue.heartbeat('unknown') == 0
+
+
+def test_failures_retry_until_max_attempts(path):
+    with JobQueue(path, max_attempts=2) as queue:
+        queue.enqueue(JOBS[:1])
+        token, batch = queue.lease('a')
+        assert queue.complete(token, [(batch[0], None, 'HTTP 503')], 'nominatim') == 1
+        assert queue.stats()['pending'] == 1
+        token, batch = queue.lease('a')
+        queue.complete(token, [(batch[0], None, 'HTTP 503')], 'nominatim')
+        assert queue.stats()['failed'] == 1
+
+
+def test_release_does_not_count_the_attempt(path):
+    with JobQueue(path) as queue:
+        queue.enqueue(JOBS[:2])
+        token, _ = queue.lease('a')
+        assert queue.release(token) == 2
+        _, batch = queue.lease('a')
+        assert [job['attempts'] for job in batch] == [1, 1]
+
+
+def test_lease_order_priority_first(path):
+    with JobQueue(path) as queue:
+        queue.enqueue(JOBS, priorities={('node', 9): 0, **{('node', i): 3 for i in range(1, 9)}, ('node', 10): 1})
+        _, batch = queue.lease('a', size=3)
+        assert [job['osm_id'] for job in batch][:2] == [9, 10]
+
+
+def test_rank(path):
+    with JobQueue(path) as queue:
+        store = queue.store
+        store.upsert_element({'type': 'way', 'id': 100, 'center': {'lat': 52.5, 'lon': 4.7},
+                              'tags': {'building': 'yes', 'addr:street': 'Dam'}}, 'overpass')
+        store.upsert_fields('way', 100, {'node_ids': '1;2'}, 'osm')
+        # a standalone node lists its own id, which does not make it covered
+        store.upsert_element({'type': 'node', 'id': 3, 'lat': 52.0, 'lon': 4.0, 'tags': {}}, 'overpass')
+        store.upsert_fields('node', 3, {'node_ids': '3'}, 'osm')
+        store.upsert_element({'type': 'node', 'id': 4, 'lat': 52.50003, 'lon': 4.7, 'tags': {}}, 'overpass')
+        store.upsert_element({'type': 'node', 'id': 5, 'lat': 52.1, 'lon': 4.1, 'tags': {
+            'addr:street': 'Dam', 'addr:housenumber': '1', 'addr:postcode': '1012 JS', 'addr:city': 'Amsterdam'}},
+            'overpass')
+        assert job_queue.rank(queue.conn, [('node', 1), ('node', 3), ('node', 4), ('node', 5), ('way', 100)]) == {
+            ('node', 1): job_queue.PRIORITY_COVERED,
+            ('node', 3): job_queue.PRIORITY_NO_ADDRESS,
+            ('node', 4): job_queue.PRIORITY_COVERED,  # 3 m from the building centre
+            ('node', 5): job_queue.PRIORITY_COMPLETE,
+            ('way', 100): job_queue.PRIORITY_PARTIAL,
+        }
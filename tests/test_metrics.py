@@ -0,0 +1,53 @@
+import json
+import metrics
+
+
+def test_histogram():
+    histogram = metrics.Histogram(buckets=(0.1, 1.0, 10.0))
+    for value in (0.05, 0.5, 0.5, 5.0, 50.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 1), (1.0, 3), (10.0, 4)]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.99) == float('inf')
+    assert metrics.Histogram().quantile(0.5) is None
+
+
+def test_registry_and_outputs(tmp_path):
+    registry = metrics.Metrics()
+    registry.http_hook({'provider': 'nominatim', 'status': 200, 'elapsed': 0.02, 'bytes': 512})
+    registry.http_hook({'provider': 'nominatim', 'status': None, 'elapsed': 1.5, 'bytes': None})
+    registry.cache('store', True)
+    registry.cache('store', True)
+    registry.cache('store', False)
+    registry.inc('rows_total', 3, source='osm')
+    registry.add_collector(lambda r: r.set('queue_depth', 7, queue='export'))
+    with registry.timer('stage_item_seconds', stage='export'):
+        pass
+
+    data = registry.to_dict()
+    counters = {(c['name'], tuple(sorted(c['labels'].items()))): c['value'] for c in data['counters']}
+    assert counters[('http_requests_total', (('provider', 'nominatim'), ('status', '200')))] == 1
+    assert counters[('http_requests_total', (('provider', 'nominatim'), ('status', 'error')))] == 1
+    assert counters[('http_response_bytes_total', (('provider', 'nominatim'),))] == 512
+    gauges = {(g['name'], tuple(sorted(g['labels'].items()))): g['value'] for g in data['gauges']}
+    assert gauges[('cache_hit_ratio', (('cache', 'store'),))] == 0.6667
+    assert gauges[('queue_depth', (('queue', 'export'),))] == 7
+    latency = next(h for h in data['histograms'] if h['name'] == 'http_request_seconds')
+    assert (latency['count'], latency['p50'], latency['p99']) == (2, 0.025, 2.5)
+
+    text = registry.to_prometheus()
+    assert '# TYPE http_requests_total counter' in text
+    assert 'http_requests_total{provider="nominatim",status="200"} 1' in text
+    assert 'http_request_seconds_bucket{provider="nominatim",le="+Inf"} 2' in text
+    assert text.count('# TYPE http_request_seconds histogram') == 1
+
+    registry.write(str(tmp_path / 'run'))
+    assert json.loads((tmp_path / 'run.metrics.json').read_text())['counters']
+    assert (tmp_path / 'run.metrics.prom').read_text().startswith('# HELP')
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['run.metrics.json', 'run.metrics.prom']
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Metrics()
+    registry.inc('rows_total', source='say "hi"\n')
+    assert 'rows_total{source="say \\"hi\\"\\n"} 1' in registry.to_prometheus()
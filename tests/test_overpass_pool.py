@@ -0,0 +1,87 @@
+import threading
+import pytest
+import requests
+import overpass
+import overpass_pool
+import overpass_status
+
+OLD = {'osm3s': {'timestamp_osm_base': '2025-05-16T01:00:00Z'}}
+NEW = {'osm3s': {'timestamp_osm_base': '2025-05-16T03:00:00Z'}}
+
+
+@pytest.fixture(autouse=True)
+def unlimited_status(monkeypatch):
+    monkeypatch.setattr(overpass_status, 'fetch_status',
+                        lambda url: {'rate_limit': 0, 'available': 0, 'waits': [], 'running': 0})
+    monkeypatch.setattr(overpass_status, '_gates', {})
+
+
+def _pool(fetch, endpoints, **kwargs):
+    pool = overpass_pool.OverpassPool([{'url': f"http://{name}/api/interpreter", 'weight': weight, 'max_parallel': slots}
+                                       for name, weight, slots in endpoints], **kwargs)
+    calls = []
+    lock = threading.Lock()
+
+    def fake_fetch(attempt, query):
+        name = attempt.endpoint.url.split('/')[2]
+        with lock:
+            calls.append((name, attempt.tile, attempt.hedge))
+        return fetch(name, attempt, query)
+    pool._fetch = fake_fetch
+    return pool, calls
+
+
+def _too_many_requests(name, attempt, query):
+    response = requests.Response()
+    response.status_code = 429
+    raise requests.HTTPError('429 Too Many Requests', response=response)
+
+
+def test_rate_limited_tile_gives_up(monkeypatch):
+    monkeypatch.setattr(overpass_pool.time, 'sleep', lambda seconds: None)
+    pool, calls = _pool(_too_many_requests, [('a', 1, 1), ('b', 1, 1)], hedge_after=0, max_attempts=2,
+                        max_rate_limited=3)
+    with pytest.raises(overpass.OverpassError, match='every attempt'):
+        pool.fetch_tiles({'t1': 'q'})
+    # two attempts, three refunded 429s; the hedge neither takes nor gets back an attempt
+    assert len([call for call in calls if not call[2]]) == 5
+    assert len([call for call in calls if call[2]]) == 1
+
+
+def test_slow_tile_is_hedged():
+    def fetch(name, attempt, query):
+        if name == 'slow':
+            attempt.cancel.wait(5)
+            return None
+        return [{'type': 'node', 'id': 1}], NEW
+    pool, calls = _pool(fetch, [('slow', 10, 1), ('fast', 1, 1)], hedge_after=0.1)
+    results = pool.fetch_tiles({'t1': 'q'})
+    assert results['t1'][2].url == 'http://fast/api/interpreter'
+    assert calls == [('slow', 't1', False), ('fast', 't1', True)]
+    assert (pool.stats['hedged'], pool.stats['hedge_wins']) == (1, 1)
+
+
+def test_lagging_tile_is_fetched_again():
+    def fetch(name, attempt, query):
+        return [{'type': 'way', 'id': 5}, {'type': 'node', 'id': int(attempt.tile[1])}], (OLD if name == 'old' else NEW)
+    pool, calls = _pool(fetch, [('old', 10, 1), ('new', 1, 1)], hedge_after=60)
+    elements, meta = pool.fetch(lambda tile: 'q', ['t1', 't2'])
+    assert [(e['type'], e['id']) for e in elements] == [('node', 1), ('node', 2), ('way', 5)]
+    assert meta['osm3s'] == NEW['osm3s'] and meta['tiles'] == 2
+    assert pool.stats['refetched_stale'] == 1
+    assert calls[-1] == ('new', 't1', False)
+
+
+def test_skew_that_persists_fails():
+    def fetch(name, attempt, query):
+        return [], (NEW if attempt.tile == 't2' else OLD)
+    pool, _ = _pool(fetch, [('a', 1, 2)], hedge_after=60)
+    with pytest.raises(overpass.OverpassError, match='not merging'):
+        pool.fetch(lambda tile: 'q', ['t1', 't2'])
+
+
+def test_tiles():
+    assert overpass_pool.tiles((52.0, 4.0, 53.0, 5.0), 2, 2) == [
+        (52.0, 4.0, 52.5, 4.5), (52.0, 4.5, 52.5, 5.0), (52.5, 4.0, 53.0, 4.5), (52.5, 4.5, 53.0, 5.0)]
+    assert overpass_pool.parse_grid('3x2') == (3, 2)
+    assert overpass_pool.parse_grid('4') == (4, 4)
@@ -0,0 +1,52 @@
+import re
+import pytest
+import overpass
+from overpass_query import QuerySpec, Filter, SOLAR
+
+
+def _outs(query):
+    return re.findall(r'\bout [^;]*;', query)
+
+
+def test_unlimited_query_splits_nodes_and_ways():
+    query = SOLAR.build(timeout=60)
+    assert query.startswith('[out:json][timeout:60];')
+    assert '  way["generator:source"="solar"](area.searchArea);' in query
+    assert _outs(query) == ['out body qt;', 'out tags center qt;']
+
+
+def test_limit_gives_one_output_statement():
+    for query in (SOLAR.build(limit=1000), overpass.solar_query(1000)):
+        assert _outs(query) == ['out body center qt 1000;']
+
+
+@pytest.mark.parametrize('needs, limited', [
+    ((), 'out ids qt 5;'),
+    (('center',), 'out skel center qt 5;'),
+    (('tags',), 'out tags qt 5;'),
+    (('geometry', 'tags'), 'out body center qt 5;'),
+])
+def test_limit_per_needs(needs, limited):
+    spec = QuerySpec([Filter(('node', 'way'), {'generator:source': 'solar'})], needs=needs)
+    assert _outs(spec.build(limit=5)) == [limited]
+
+
+def test_same_mode_uses_one_statement():
+    spec = QuerySpec([Filter(('node', 'way'), {'power': 'generator'})], needs=('tags',))
+    assert _outs(spec.build()) == ['out tags qt;']
+
+
+def test_output_modes():
+    spec = QuerySpec([Filter(('way',), {'building': None})], needs=('geometry',))
+    assert spec.output_modes() == ('skel', 'ids center')
+    with pytest.raises(ValueError):
+        QuerySpec([], needs=('nodes',))
+
+
+def test_filters_and_bbox():
+    spec = QuerySpec([Filter(('way',), {'building': None, 'roof:material': ('solar_panels', 'glass'),
+                                        'name': 'a "b"'})], area_id=None)
+    query = spec.build(bbox=(52.0, 4.5, 53.0, 5.5))
+    assert '[bbox:52.0,4.5,53.0,5.5]' in query
+    assert 'area' not in query
+    assert '  way["building"]["roof:material"~"^(solar_panels|glass)$"]["name"="a \\"b\\""];' in query
@@ -0,0 +1,50 @@
+import overpass_status
+from mock_servers import MockSettings
+
+BUSY = """Connected as: 1234567
+Current time: 2025-05-16T03:00:00Z
+Rate limit: 2
+Slot available after: 2025-05-16T03:00:12Z, in 12 seconds.
+Slot available after: 2025-05-16T03:00:05Z, in 5 seconds.
+Currently running queries (pid, space limit, time limit, start time):
+4242\t536870912\t180\t2025-05-16T02:59:50Z
+4243\t536870912\t180\t2025-05-16T02:59:55Z
+"""
+
+
+def test_parse_status():
+    assert overpass_status.parse_status(BUSY) == {'rate_limit': 2, 'available': 0, 'waits': [5, 12], 'running': 2}
+    free = "Connected as: 1\nRate limit: 2\n1 slots available now.\nCurrently running queries (pid):\n"
+    assert overpass_status.parse_status(free) == {'rate_limit': 2, 'available': 1, 'waits': [], 'running': 0}
+    assert overpass_status.parse_status("Rate limit: 0\n")['rate_limit'] == 0
+
+
+def test_status_url():
+    assert overpass_status.status_url('https://overpass-api.de/api/interpreter') == 'https://overpass-api.de/api/status'
+    assert overpass_status.status_url('http://10.0.0.5:12345/api/interpreter/?data=x') == 'http://10.0.0.5:12345/api/status'
+
+
+def test_gate_follows_the_status_page(mock_services):
+    settings = MockSettings(slots=2)
+    servers = mock_services({'overpass': settings})
+    gate = overpass_status.SlotGate(f"{servers['overpass'].url}/api/interpreter")
+    assert gate.rate_limit() == 2
+    assert gate.has_slot()
+    assert gate.acquire() < 1
+    gate.reserve()
+    assert not gate.has_slot()  # both free slots reserved since the page was read
+
+    settings.running = 2  # the server is busy with our two queries
+    gate.release()
+    assert not gate.has_slot()
+    assert gate.wait_time() > 0
+    settings.running = 1
+    gate.release()
+    assert gate.has_slot()
+
+
+def test_missing_status_page_means_no_quota():
+    gate = overpass_status.SlotGate('http://127.0.0.1:9/api/interpreter')
+    assert gate.rate_limit() == 0
+    assert gate.has_slot()
+    assert gate.acquire() < 1
@@ -0,0 +1,104 @@
+import csv
+import json
+import os
+import config
+import deadletter
+import pipeline
+import spatial
+
+
+def _rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _run(tmp_path, **options):
+    options.setdefault('input_path', None)
+    run = pipeline.Pipeline(output_path=str(tmp_path / 'pipeline.csv'), store_path=str(tmp_path / 'store.sqlite'),
+                            metrics_interval=0, **options)
+    return run, run.run()
+
+
+def test_output_replaced_at_the_end(tmp_path, mock_services):
+    mock_services()
+    (tmp_path / 'pipeline.csv').write_text('previous run\n', encoding='utf-8')
+    _, counts = _run(tmp_path, workers=2, limit=50)
+    assert counts['fetched'] == 50
+    assert counts['exported'] == 50
+    assert len(_rows(tmp_path / 'pipeline.csv')) == 50
+    assert not os.path.exists(tmp_path / 'pipeline.csv.tmp')
+
+
+def test_request_budget_geocodes_the_best_items_first(tmp_path):
+    path = tmp_path / 'input.json'
+    elements = [
+        {'type': 'node', 'id': 1, 'lat': 52.50003, 'lon': 4.7, 'tags': {'generator:source': 'solar'}},
+        {'type': 'node', 'id': 2, 'lat': 52.6, 'lon': 4.8, 'tags': {'addr:street': 'Dam'}},
+        {'type': 'way', 'id': 3, 'center': {'lat': 52.5, 'lon': 4.7}, 'tags': {'building': 'yes'}},
+        {'type': 'node', 'id': 4, 'lat': 52.7, 'lon': 4.9, 'tags': {}},
+    ]
+    path.write_text(json.dumps({'elements': elements}), encoding='utf-8')
+    asked = []
+
+    def geocoder(lat, lon):
+        asked.append((lat, lon))
+        return {'road': 'Dam', 'house_number': '1', 'postcode': '1012 JS', 'city': 'Amsterdam'}
+    run = pipeline.Pipeline(input_path=str(path), output_path=str(tmp_path / 'pipeline.csv'),
+                            store_path=str(tmp_path / 'store.sqlite'), metrics_interval=0, workers=1, max_requests=3)
+    run.geocoder = geocoder
+    counts = run.run()
+    # no address tags first (in input order), then partial tags; the covered node is left
+    assert asked == [(52.5, 4.7), (52.7, 4.9), (52.6, 4.8)]
+    assert (counts['geocoded'], counts['deferred'], counts['exported']) == (3, 1, 4)
+    assert run.stopped_by == 'request budget'
+    assert [row['Objectnummer'] for row in _rows(tmp_path / 'pipeline.csv')] == ['1', '2', '3', '4']
+
+    # the next run only geocodes what is still missing
+    asked.clear()
+    run = pipeline.Pipeline(input_path=str(path), output_path=str(tmp_path / 'pipeline.csv'),
+                            store_path=str(tmp_path / 'store.sqlite'), metrics_interval=0, workers=1, max_requests=3)
+    run.geocoder = geocoder
+    assert run.run()['cached'] == 3
+    assert asked == [(52.50003, 4.7)]
+
+
+def test_failed_geocodes_become_dead_letters(tmp_path):
+    path = tmp_path / 'input.json'
+    path.write_text(json.dumps({'elements': [
+        {'type': 'node', 'id': 1, 'lat': 52.6, 'lon': 4.7, 'tags': {'addr:street': 'Dam'}},
+        {'type': 'node', 'id': 2, 'lat': 52.5, 'lon': 4.8, 'tags': {}},
+    ]}), encoding='utf-8')
+    run = pipeline.Pipeline(input_path=str(path), output_path=str(tmp_path / 'pipeline.csv'),
+                            store_path=str(tmp_path / 'store.sqlite'), metrics_interval=0, workers=1)
+    run.geocoder = lambda lat, lon: None
+    counts = run.run()
+    assert (counts['failed'], counts['exported']) == (2, 2)
+    # the rows are still written, with what their tags give
+    assert [row['street'] for row in _rows(tmp_path / 'pipeline.csv')] == ['Dam', '']
+    with deadletter.DeadLetters(str(tmp_path / 'store.sqlite')) as dead_letters:
+        assert [(item['osm_id'], item['provider']) for item in dead_letters.pending()] == [
+            (1, 'nominatim'), (2, 'nominatim')]
+
+
+def test_order_dispatches_along_the_curve_and_keeps_the_csv_order(tmp_path):
+    # a 4x4 grid in reading order, which a Hilbert curve does not follow
+    points = [(52.2 + row * 0.25, 4.5 + col * 0.2) for row in range(4) for col in range(4)]
+    path = tmp_path / 'input.json'
+    path.write_text(json.dumps({'elements': [{'type': 'node', 'id': index + 1, 'lat': lat, 'lon': lon, 'tags': {}}
+                                             for index, (lat, lon) in enumerate(points)]}), encoding='utf-8')
+    asked = []
+
+    def geocoder(lat, lon):
+        asked.append((lat, lon))
+        return {'road': f"Straat {len(asked)}", 'house_number': '1', 'postcode': '1000 AA', 'city': 'Amsterdam'}
+    run = pipeline.Pipeline(input_path=str(path), output_path=str(tmp_path / 'pipeline.csv'),
+                            store_path=str(tmp_path / 'store.sqlite'), metrics_interval=0, workers=1,
+                            order='hilbert')
+    run.geocoder = geocoder
+    assert run.run()['geocoded'] == 16
+    expected = [points[index] for index in spatial.curve_order(points, config.NORTH_HOLLAND_BBOX)]
+    assert asked == expected != points
+    rows = _rows(tmp_path / 'pipeline.csv')
+    assert [row['Objectnummer'] for row in rows] == [str(index + 1) for index in range(16)]
+    # each row carries the answer to its own point
+    assert all(row['street'] == f"Straat {expected.index(point) + 1}" for row, point in zip(rows, points))
@@ -0,0 +1,91 @@
+import csv
+import json
+import threading
+import urllib.request
+import urllib.error
+import pytest
+import query_service
+from http.server import ThreadingHTTPServer
+
+ROWS = [
+    {'Objectnummer': '1', 'street': 'Dijk van Kyoto', 'huisnummer': '7', 'postcode': '1705 RC',
+     'city': 'Heerhugowaard', 'Latitude': '52.6700', 'Longitude': '4.8400'},
+    {'Objectnummer': '2', 'street': 'Dam', 'huisnummer': '1', 'postcode': '1012 JS',
+     'city': 'Amsterdam', 'Latitude': '52.3730', 'Longitude': '4.8932'},
+    {'Objectnummer': '3', 'street': 'Damrak', 'huisnummer': '2', 'postcode': '1012 LG',
+     'city': 'Amsterdam', 'Latitude': '52.3760', 'Longitude': '4.8960'},
+    {'Objectnummer': '4', 'street': '', 'huisnummer': '', 'postcode': 'N/A',
+     'city': '', 'Latitude': '', 'Longitude': ''},
+]
+
+
+@pytest.fixture
+def service(tmp_path):
+    path = tmp_path / 'pipeline.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(ROWS[0]))
+        writer.writeheader()
+        writer.writerows(ROWS)
+    return query_service.QueryService(str(path))
+
+
+def _ids(response):
+    status, _, body = response
+    assert status == 200
+    return [row['Objectnummer'] for row in json.loads(body)['rows']]
+
+
+def test_queries(service):
+    assert _ids(service.answer('/bbox', {'bbox': '52.37,4.88,52.38,4.90'})) == ['2', '3']
+    assert _ids(service.answer('/radius', {'lat': '52.3730', 'lon': '4.8932', 'r': '500'})) == ['2', '3']
+    assert _ids(service.answer('/search', {'postcode': '1012js'})) == ['2']
+    assert _ids(service.answer('/search', {'city': 'AMSTERDAM', 'street': 'damrak'})) == ['3']
+    assert _ids(service.answer('/search', {'city': 'Amsterdam', 'limit': '1'})) == ['2']
+    status, content_type, body = service.answer('/search', {'objectnummer': '1', 'format': 'csv'})
+    assert (status, content_type) == (200, 'text/csv')
+    assert body.decode('utf-8').splitlines()[1].startswith('1,Dijk van Kyoto,7')
+    assert service.answer('/nothing', {})[0] == 404
+
+
+def test_cache(service):
+    service.answer('/search', {'postcode': '1705 RC'})
+    service.answer('/search', {'postcode': '1705 RC'})
+    cache = service.current[1]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('path, params', [
+    ('/search', {'city': 'Amsterdam', 'limit': 'abc'}),
+    ('/search', {'city': 'Amsterdam', 'limit': '-1'}),
+    ('/search', {}),
+    ('/bbox', {'bbox': '52,4,53'}),
+    ('/bbox', {'bbox': '53,4,52,5'}),
+    ('/bbox', {'bbox': 'nan,4,53,5'}),
+    ('/bbox', {'bbox': '-91,4,53,5'}),
+    ('/radius', {'lat': '52.3', 'lon': '4.8', 'r': '1e7'}),
+    ('/radius', {'lat': '52.3', 'lon': '4.8', 'r': '-1'}),
+    ('/radius', {'lat': '52.3'}),
+])
+def test_bad_queries(service, path, params):
+    assert service.answer(path, params)[0] == 400
+
+
+def test_world_sized_box_is_clamped_to_the_data(service):
+    assert _ids(service.answer('/bbox', {'bbox': '-90,-180,90,180'})) == ['1', '2', '3']
+    assert _ids(service.answer('/bbox', {'bbox': '-90,-180,-80,-170'})) == []
+
+
+def test_http(service):
+    handler = type('QueryHandler', (query_service.Handler,), {'service': service})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/search?postcode=1705RC") as response:
+            assert json.loads(response.read())['count'] == 1
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/search?city=Amsterdam&limit=abc")
+        assert error.value.code == 400
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,39 @@
+import pytest
+import rdnew
+
+# (lat, lon), (x, y), tolerance in metres against the official RDNAPTRANS values
+REFERENCE_POINTS = [
+    ((52.15517440, 5.38720621), (155000.0, 463000.0), 0.001),  # Amersfoort, origin of RD
+    ((52.3745325, 4.8835256), (120700.723, 487525.501), 0.25),  # Westertoren, Amsterdam
+]
+
+
+@pytest.mark.parametrize('wgs84, rd, tolerance', REFERENCE_POINTS)
+def test_reference_points(wgs84, rd, tolerance):
+    x, y = rdnew.to_rd(*wgs84)
+    assert rdnew.distance(x, y, *rd) <= tolerance
+    lat, lon = rdnew.to_wgs84(*rd)
+    assert rdnew.distance(*rdnew.to_rd(lat, lon), *rd) <= 0.004
+    assert abs(lat - wgs84[0]) < 3e-6 and abs(lon - wgs84[1]) < 3e-6
+
+
+def test_round_trip_within_a_centimetre():
+    x_min, y_min, x_max, y_max = (int(value) for value in rdnew.BOUNDS)
+    for x in range(x_min, x_max + 1, 10000):
+        for y in range(y_min, y_max + 1, 10000):
+            assert rdnew.distance(*rdnew.to_rd(*rdnew.to_wgs84(x, y)), x, y) < 0.01
+
+
+def test_in_bounds():
+    assert rdnew.in_bounds(155000.0, 463000.0)
+    assert not rdnew.in_bounds(400000.0, 463000.0)
+
+
+def test_arrays_match_scalars():
+    np = pytest.importorskip('numpy')
+    lats = [52.15517440, 52.3745325, 53.2]
+    lons = [5.38720621, 4.8835256, 6.56]
+    xs, ys = rdnew.to_rd(np.array(lats), np.array(lons))
+    for lat, lon, x, y in zip(lats, lons, xs, ys):
+        assert (x, y) == pytest.approx(rdnew.to_rd(lat, lon), abs=1e-6)
+    assert rdnew.in_bounds(xs, ys).all()
@@ -0,0 +1,78 @@
+import csv
+import geocode
+import overpass
+import reenrich
+from store import SolarStore
+
+HEADER = ['Objectnummer', 'osm_type', 'street', 'huisnummer', 'postcode', 'city', 'Longitude', 'Latitude']
+ROWS = [
+    ['1', 'way', 'Dam', '', '1012 JS', 'Amsterdam', '4.8932', '52.3730'],
+    ['2', 'way', 'Damrak', 'N/A', '', 'Amsterdam', '4.8960', '52.3760'],
+    ['3', 'node', 'Dijk van Kyoto', '7', '1705 RC', 'Heerhugowaard', '4.8400', '52.6700'],
+    ['4', 'node', '', '', '', '', '4.6400', '52.3800'],
+]
+FOOTPRINT = [(52.3759, 4.8959), (52.3759, 4.8961), (52.3761, 4.8961), (52.3761, 4.8959), (52.3759, 4.8959)]
+
+
+def _write(path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(ROWS)
+
+
+def _rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))[1:]
+
+
+def _fake_geocoders(monkeypatch, asked):
+    def lookup(keys):
+        asked.append(('lookup', sorted(keys)))
+        return {('way', 1): {'road': 'Dam', 'house_number': '1', 'postcode': '1012JS'},
+                ('way', 2): {'road': 'Nieuwendijk', 'house_number': '9', 'postcode': '1012 MK'}}  # wrong street
+
+    def reverse(lat, lon, zoom=None):
+        asked.append(('reverse', round(lat, 4), round(lon, 4), zoom))
+        if round(lat, 3) == 52.376:
+            return {'road': 'Damrak', 'house_number': '2', 'postcode': '1012 LG'}
+        return {'road': 'Grote Markt', 'house_number': '3', 'postcode': '2011 RD', 'city': 'Haarlem'}
+    monkeypatch.setattr(geocode, 'lookup_nominatim', lookup)
+    monkeypatch.setattr(overpass, 'fetch_geometries', lambda way_ids: {2: FOOTPRINT})
+    monkeypatch.setitem(geocode.PROVIDERS, 'locationiq', reverse)
+
+
+def test_gaps_are_filled_strategy_by_strategy(tmp_path, monkeypatch):
+    path = str(tmp_path / 'solar.csv')
+    store_path = str(tmp_path / 'store.sqlite')
+    _write(path)
+    asked = []
+    _fake_geocoders(monkeypatch, asked)
+
+    stats = reenrich.reenrich(path, provider='locationiq', store_path=store_path)
+    assert asked == [('lookup', [('node', 4), ('way', 1), ('way', 2)]),
+                     ('reverse', 52.376, 4.896, 18),  # inside the footprint of way 2
+                     ('reverse', 52.38, 4.64, 18)]  # node 4 at its CSV coordinate
+    assert stats == {'rows': 4, 'gap_rows': 3, 'missing_before': 7, 'lookup': 1, 'footprint': 2, 'zoom18': 4,
+                     'missing_after': 0}
+    assert _rows(path) == [
+        ['1', 'way', 'Dam', '1', '1012 JS', 'Amsterdam', '4.8932', '52.3730'],
+        ['2', 'way', 'Damrak', '2', '1012 LG', 'Amsterdam', '4.8960', '52.3760'],
+        ROWS[2],
+        ['4', 'node', 'Grote Markt', '3', '2011 RD', 'Haarlem', '4.6400', '52.3800'],
+    ]
+    with SolarStore(store_path) as solar_store:
+        assert solar_store.get_fields('way', 2) == {'huisnummer': '2', 'postcode': '1012 LG'}
+        source = solar_store.conn.execute("SELECT source FROM fields WHERE osm_id = 1").fetchone()['source']
+        assert source == 'nominatim-lookup'
+
+
+def test_dry_run_leaves_the_file_alone(tmp_path, monkeypatch):
+    path = str(tmp_path / 'solar.csv')
+    _write(path)
+    _fake_geocoders(monkeypatch, [])
+    stats = reenrich.reenrich(path, fields=['huisnummer'], strategies=['lookup', 'zoom18'], provider='nominatim',
+                              store_path=str(tmp_path / 'store.sqlite'), dry_run=True)
+    # zoom18 is skipped for nominatim, which already answers at building level
+    assert (stats['missing_before'], stats['lookup'], stats['zoom18'], stats['missing_after']) == (3, 1, 0, 2)
+    assert _rows(path) == ROWS
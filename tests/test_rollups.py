@@ -0,0 +1,70 @@
+import pytest
+import rollups
+from store import SolarStore
+
+BUILDING = {'type': 'way', 'id': 10, 'center': {'lat': 52.67, 'lon': 4.84}, 'tags': {'building': 'house'}}
+MERGED_NODE = {'type': 'node', 'id': 11, 'lat': 52.6701, 'lon': 4.8401, 'tags': {'generator:source': 'solar'}}
+LONE_NODE = {'type': 'node', 'id': 12, 'lat': 52.37, 'lon': 4.89, 'tags': {'generator:source': 'solar'}}
+FIELDS = {
+    ('way', 10): {'city': 'Heerhugowaard', 'postcode': '1705 RC', 'province': 'Noord-Holland', 'node_ids': '11'},
+    ('node', 11): {'city': 'Heerhugowaard', 'postcode': '1705 RC', 'province': 'Noord-Holland'},
+    ('node', 12): {'city': 'Amsterdam', 'postcode': '1012 JS', 'province': 'Noord-Holland', 'node_ids': '12'},
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'store.sqlite')
+    with SolarStore(path) as solar_store, solar_store.conn:
+        for element in (BUILDING, MERGED_NODE, LONE_NODE):
+            solar_store.upsert_element(element, 'overpass', '2026-10-01T00:00:00Z')
+            solar_store.upsert_fields(element['type'], element['id'], FIELDS[(element['type'], element['id'])],
+                                      'nominatim', '2026-10-01T00:00:00Z')
+    return path
+
+
+def _totals(r, level):
+    return {total['region']: total['buildings'] for total in r.totals(level)}
+
+
+def test_build_counts_merged_nodes_once(path):
+    with rollups.Rollups(path) as r:
+        assert r.build(areas={('way', 10): 80.0}) == 2
+        assert _totals(r, 'gemeente') == {'Heerhugowaard': 1, 'Amsterdam': 1}
+        assert _totals(r, 'pc4') == {'1705': 1, '1012': 1}
+        assert r.totals('province') == [{'region': 'Noord-Holland', 'buildings': 2, 'with_area': 1,
+                                         'roof_area': 80.0, 'types': {'house': 1, 'unknown': 1}}]
+
+
+def test_refresh_after_an_unchanged_export_touches_nothing(path):
+    with rollups.Rollups(path) as r:
+        r.build()
+        r.conn.execute("UPDATE rollup_meta SET value = '2026-10-02T00:00:00Z'")
+        # a pipeline run that exports the same data again
+        with r.conn:
+            for element in (BUILDING, MERGED_NODE, LONE_NODE):
+                key = (element['type'], element['id'])
+                r.store.upsert_element(element, 'overpass', '2026-10-03T00:00:00Z')
+                r.store.upsert_fields(*key, FIELDS[key], 'nominatim', '2026-10-03T00:00:00Z')
+        assert r.touched_since('2026-10-02T00:00:00Z') == set()
+        assert r.refresh() == (0, 0)
+
+
+def test_refresh_moves_changed_and_drops_removed(path):
+    with rollups.Rollups(path) as r:
+        r.build()
+        r.conn.execute("UPDATE rollup_meta SET value = '2026-10-02T00:00:00Z'")
+        with r.conn:
+            r.store.upsert_fields('node', 12, {'city': 'Haarlem', 'postcode': '2011 AB'}, 'pdok', '2026-10-03T00:00:00Z')
+        assert r.refresh() == (1, 0)
+        assert _totals(r, 'gemeente') == {'Heerhugowaard': 1, 'Haarlem': 1}
+        # the building is gone: its merged node counts on its own again
+        assert r.update(removed=[('way', 10)]) == (1, 1)
+        assert _totals(r, 'gemeente') == {'Heerhugowaard': 1, 'Haarlem': 1}
+        assert r.query('pc4', '1705')[0]['building_type'] == ''
+
+
+def test_read_diff(tmp_path):
+    for kind, ids in (('added', [1]), ('tags', [2, 3]), ('removed', [3])):
+        (tmp_path / f"d.{kind}.csv").write_text('osm_type,osm_id,lat,lon\n' + ''.join(f"way,{i},,\n" for i in ids))
+    assert rollups.read_diff(str(tmp_path / 'd')) == ({('way', 1), ('way', 2)}, {('way', 3)})
@@ -0,0 +1,48 @@
+import json
+import snapshot
+
+ELEMENTS = [
+    {'type': 'node', 'id': 1, 'lat': 52.3745325, 'lon': 4.8835256,
+     'tags': {'generator:source': 'solar', 'name': 'Westertoren é'}},
+    {'type': 'way', 'id': 2, 'center': {'lat': 52.6, 'lon': 4.75}, 'nodes': [10, 11, 12, 10],
+     'tags': {'building': 'yes', 'generator:source': 'solar'}},
+    {'type': 'relation', 'id': 3, 'center': {'lat': 52.5, 'lon': 4.9},
+     'members': [{'type': 'way', 'ref': 2, 'role': 'outer'}], 'tags': {'type': 'multipolygon'}},
+    # not representable as 1e-7 fixed point, kept in the JSON remainder instead
+    {'type': 'node', 'id': 4, 'lat': 52.123456789, 'lon': 4.1},
+    {'type': 'way', 'id': 5, 'geometry': [{'lat': 52.0, 'lon': 4.0}, {'lat': 52.1, 'lon': 4.1}]},
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'solar.osnap')
+    data = {'version': 0.6, 'generator': 'test', 'osm3s': {'timestamp_osm_base': '2026-10-01T00:00:00Z'},
+            'elements': ELEMENTS}
+    assert snapshot.save_snapshot(data, path, query='[out:json];node;out;', codec=snapshot.CODEC_GZIP) == 5
+
+    assert snapshot.is_snapshot(path)
+    assert snapshot.load_elements(path) == ELEMENTS
+    header = snapshot.read_header(path)
+    assert header['count'] == 5
+    assert header['codec'] == 'gzip'
+    assert header['osm_base'] == '2026-10-01T00:00:00Z'
+    assert header['query_hash'] == snapshot.query_hash('[out:json];node;out;')
+    assert snapshot.to_overpass_json(path)['osm3s'] == data['osm3s']
+
+
+def test_reads_overpass_json(tmp_path):
+    path = tmp_path / 'solar.json'
+    path.write_text(json.dumps({'elements': ELEMENTS}), encoding='utf-8')
+    assert not snapshot.is_snapshot(str(path))
+    assert snapshot.load_elements(str(path)) == ELEMENTS
+    assert snapshot.read_header(str(path))['count'] == 5
+
+
+
+def test_input_path_falls_back_to_the_json_dump(tmp_path):
+    path = str(tmp_path / 'solar.osnap')
+    assert snapshot.input_path(path) == path
+    (tmp_path / 'solar.json').write_text('{"elements": []}', encoding='utf-8')
+    assert snapshot.input_path(path) == str(tmp_path / 'solar.json')
+    snapshot.save_snapshot({'elements': ELEMENTS}, path, codec=snapshot.CODEC_GZIP)
+    assert snapshot.input_path(path) == path
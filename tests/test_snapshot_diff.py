@@ -0,0 +1,41 @@
+import csv
+import snapshot
+import snapshot_diff
+
+
+def _save(path, elements):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot.save_snapshot({'elements': elements}, str(path), codec=snapshot.CODEC_GZIP)
+    return str(path)
+
+
+def _ids(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return sorted(int(row['osm_id']) for row in csv.DictReader(f))
+
+
+def test_diff_with_spilled_runs_of_same_named_snapshots(tmp_path):
+    # Both snapshots are called solar.osnap and spill several runs into the same directory,
+    # each larger than the block _read_run reads at once
+    old = [{'type': 'node', 'id': i, 'lat': 52.0 + i * 1e-5, 'lon': 4.8, 'tags': {'a': '1'}} for i in range(30000)]
+    new = [dict(e, tags={'a': '2'}) if e['id'] % 2 == 0 else e for e in old if e['id'] != 5]
+    new[10] = dict(new[10], lat=53.0)  # id 11
+    new.append({'type': 'way', 'id': 1, 'center': {'lat': 52.5, 'lon': 4.9}, 'tags': {}})
+    old_path = _save(tmp_path / '2026-09' / 'solar.osnap', old)
+    new_path = _save(tmp_path / '2026-10' / 'solar.osnap', new)
+
+    prefix = str(tmp_path / 'out' / 'diff')
+    summary = snapshot_diff.diff(old_path, new_path, prefix, chunk_size=10000)
+    assert summary['counts'] == {'added': 1, 'removed': 1, 'tags': 15000, 'moved': 1}
+    assert _ids(f"{prefix}.removed.csv") == [5]
+    assert _ids(f"{prefix}.moved.csv") == [11]
+    assert _ids(f"{prefix}.added.csv") == [1]
+    assert len(snapshot.load_elements(f"{prefix}.geocode.osnap")) == 15002
+
+
+def test_sorted_records_matches_in_memory_sort(tmp_path):
+    elements = [{'type': ('node', 'way')[i % 2], 'id': (i * 7919) % 5003, 'lat': 52.0, 'lon': 4.0}
+                for i in range(5003)]
+    path = _save(tmp_path / 'a.osnap', elements)
+    external = list(snapshot_diff.sorted_records(path, str(tmp_path), chunk_size=500))
+    assert external == sorted(snapshot_diff.record(element) for element in elements)
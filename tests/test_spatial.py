@@ -0,0 +1,45 @@
+import time
+import spatial
+
+
+def test_grid_index_queries():
+    index = spatial.GridIndex()
+    index.insert_point('dam', 52.3730, 4.8932)
+    index.insert_point('damrak', 52.3760, 4.8960)
+    index.insert('building', (52.3700, 4.8900, 52.3740, 4.8950))
+    assert sorted(index.within((52.372, 4.892, 52.374, 4.894))) == ['building', 'dam']
+    assert index.at(52.371, 4.891) == ['building']
+    assert index.near(52.3730, 4.8932, 400) == ['dam', 'building', 'damrak']
+    index.remove('building')
+    assert index.at(52.371, 4.891) == []
+    assert len(index) == 2
+
+
+def test_huge_box_walks_only_occupied_cells():
+    index = spatial.GridIndex()
+    index.insert_point(1, 52.5, 4.8)
+    started = time.monotonic()
+    assert index.within((-90, -180, 90, 180)) == [1]
+    assert index.near(52.5, 4.8, 1e7) == [1]
+    assert time.monotonic() - started < 1
+
+
+def test_hilbert_order_steps_to_a_neighbouring_cell():
+    points = [(52.0 + (row + 0.5) / 8, 4.0 + (col + 0.5) / 8) for row in range(8) for col in range(8)]
+    order = spatial.curve_order(points, (52.0, 4.0, 53.0, 5.0))
+    assert sorted(order) == list(range(64))
+    cells = [divmod(index, 8) for index in order]
+    assert all(abs(r1 - r2) + abs(c1 - c2) == 1 for (r1, c1), (r2, c2) in zip(cells, cells[1:]))
+
+
+def test_zorder_interleaves_bits():
+    assert [spatial.zorder(x, y) for x, y in ((1, 0), (0, 1), (1, 1), (2, 0), (3, 3))] == [1, 2, 3, 4, 15]
+    assert spatial.zorder(spatial.HILBERT_MAX, spatial.HILBERT_MAX) == (1 << 32) - 1
+
+
+def test_curve_key_and_order_edge_cases():
+    bbox = (52.0, 4.0, 53.0, 5.0)
+    assert spatial.curve_key(60.0, 10.0, bbox) == spatial.curve_key(53.0, 5.0, bbox)  # clamped
+    assert spatial.curve_order([]) == []
+    assert spatial.curve_order([(52.5, 4.5)]) == [0]
+    assert spatial.curve_order([(52.0, 4.0), (52.0, 4.0)], curve=spatial.zorder) == [0, 1]
@@ -0,0 +1,57 @@
+import pytest
+from store import SolarStore
+
+
+@pytest.fixture
+def solar_store(tmp_path):
+    with SolarStore(str(tmp_path / 'store.sqlite')) as s:
+        yield s
+
+
+def _element(solar_store, osm_type, osm_id):
+    return solar_store.conn.execute("SELECT * FROM elements WHERE osm_type = ? AND osm_id = ?",
+                                    (osm_type, osm_id)).fetchone()
+
+
+def test_upsert_element_keeps_newest(solar_store):
+    way = {'type': 'way', 'id': 7, 'center': {'lat': 52.6, 'lon': 4.7}, 'tags': {'building': 'yes'}}
+    solar_store.upsert_element(way, 'a', '2026-10-02T00:00:00Z')
+    solar_store.upsert_element(dict(way, center={'lat': 50.0, 'lon': 3.0}), 'b', '2026-10-01T00:00:00Z')
+    row = _element(solar_store, 'way', 7)
+    assert (row['lat'], row['lon'], row['source']) == (52.6, 4.7, 'a')
+    assert row['first_seen'] == '2026-10-02T00:00:00Z'
+
+    solar_store.upsert_element(dict(way, tags={'building': 'house'}), 'c', '2026-10-03T00:00:00Z')
+    row = _element(solar_store, 'way', 7)
+    assert row['source'] == 'c'
+    assert row['tags'] == '{"building": "house"}'
+    assert row['first_seen'] == '2026-10-02T00:00:00Z'
+
+
+def test_upsert_fields_merges_per_field(solar_store):
+    solar_store.upsert_fields('node', 1, {'street': 'Dijk van Kyoto', 'postcode': '1705 RC'}, 'nominatim',
+                              '2026-10-02T00:00:00Z')
+    # empty and N/A never erase a value, older results never replace newer ones
+    written = solar_store.upsert_fields('node', 1, {'street': 'N/A', 'postcode': '', 'city': 'Heerhugowaard'},
+                                        'locationiq', '2026-10-03T00:00:00Z')
+    assert written == 1
+    solar_store.upsert_fields('node', 1, {'postcode': '9999 ZZ'}, 'old', '2026-10-01T00:00:00Z')
+    assert solar_store.get_fields('node', 1) == {'street': 'Dijk van Kyoto', 'postcode': '1705 RC',
+                                                 'city': 'Heerhugowaard'}
+
+    # an unchanged value keeps its source and stamp
+    solar_store.upsert_fields('node', 1, {'huisnummer': 7, 'street': 'Dijk van Kyoto'}, 'pdok', '2026-10-04T00:00:00Z')
+    sources = dict(solar_store.conn.execute("SELECT field, source FROM fields WHERE osm_id = 1").fetchall())
+    assert sources == {'street': 'nominatim', 'postcode': 'nominatim', 'city': 'locationiq', 'huisnummer': 'pdok'}
+    assert solar_store.get_fields('node', 1)['huisnummer'] == '7'
+    assert solar_store.has_fields('node', 1)
+    assert not solar_store.has_fields('node', 2)
+
+
+def test_unchanged_element_keeps_its_stamp(solar_store):
+    node = {'type': 'node', 'id': 1, 'lat': 52.6, 'lon': 4.7, 'tags': {'generator:source': 'solar'}}
+    solar_store.upsert_element(node, 'overpass', '2026-10-01T00:00:00Z')
+    solar_store.upsert_element(dict(node), 'overpass', '2026-10-02T00:00:00Z')
+    assert _element(solar_store, 'node', 1)['updated_at'] == '2026-10-01T00:00:00Z'
+    solar_store.upsert_element(dict(node, lat=52.7), 'overpass', '2026-10-03T00:00:00Z')
+    assert _element(solar_store, 'node', 1)['updated_at'] == '2026-10-03T00:00:00Z'